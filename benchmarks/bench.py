@@ -0,0 +1,270 @@
+"""
+vgmmb 基准测试：在合成数据集上测 lookup / normalize / compact / validate / Excel 同步的吞吐。
+
+  # 生成 1k / 10k / 100k 规模的快照并全部测一遍，结果写成 JSON
+  python -m benchmarks.bench run --scale 1000 10000 100000 --out bench-results.json
+
+  # 与另一次提交的结果对比（打印每项的耗时比）
+  python -m benchmarks.bench compare old.json bench-results.json
+
+  # 把合成数据装进一个空的本地 Postgres（MB_* 环境变量指定连接），再对它跑
+  MB_DBNAME=vgmmb_bench python -m benchmarks.bench load-postgres --scale 10000
+  MB_DBNAME=vgmmb_bench python -m benchmarks.bench run --backend postgres --scale 10000
+
+  # 核对库内排序（SQL_MAIN_BULK）与 Python 端 _best_release 对全部候选的选择是否一致
+  MB_DBNAME=vgmmb_bench python -m benchmarks.bench parity --sample 2000
+"""
+import argparse
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from vgmmb.backend import open_backend
+from vgmmb.catalog import compact_catalog_numbers
+from vgmmb.io import resolve_pkg_file, write_json
+from vgmmb.normalizer import NormalizationContext, normalize_record
+from vgmmb.pipeline import safe_basename
+from vgmmb.schema import load_schema, validate
+
+from .synth import SynthDataset, load_postgres, load_snapshot
+
+def _percentile(sorted_xs, p):
+    if not sorted_xs:
+        return None
+    return sorted_xs[min(len(sorted_xs) - 1, max(0, -(-len(sorted_xs) * p // 100) - 1))]
+
+def _result(name, scale, n, total, samples=None, **extra) -> dict:
+    r = {"name": name, "scale": scale, "n": n, "seconds": round(total, 6),
+         "ops_per_sec": round(n / total, 1) if total > 0 else None}
+    if samples:
+        xs = sorted(samples)
+        r.update({f"p{p}_ms": round(_percentile(xs, p) * 1e3, 4) for p in (50, 95, 99)})
+    r.update(extra)
+    return r
+
+def _timed_each(fn, items):
+    samples = []
+    out = []
+    started = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        out.append(fn(item))
+        samples.append(time.perf_counter() - t0)
+    return out, time.perf_counter() - started, samples
+
+def _backend_for(args, scale: int, workdir: Path):
+    if args.backend == "postgres":
+        return open_backend("postgres")
+    path = workdir / f"synth-{scale}-s{args.seed}.sqlite"
+    if not path.exists():
+        t0 = time.perf_counter()
+        load_snapshot(SynthDataset(scale, seed=args.seed), path)
+        print(f"[BENCH] built {path.name} in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return open_backend(f"snapshot:{path}")
+
+def _single_lookup(backend):
+    if backend.name == "postgres":
+        from vgmmb.queries import query_by_catalog
+        return lambda cat: query_by_catalog(cat, with_cover=True)
+    return lambda cat: backend.query_by_catalogs([cat], with_cover=True)[cat]
+
+def bench_scale(args, scale: int, workdir: Path) -> list[dict]:
+    rng = random.Random(args.seed)
+    backend = _backend_for(args, scale, workdir)
+    results = []
+    try:
+        catalogs = sorted(set(backend.iter_catalog_numbers()))
+        sample = rng.sample(catalogs, min(args.lookups, len(catalogs)))
+
+        # —— lookup：逐条 / 整块 ——
+        _, total, samples = _timed_each(_single_lookup(backend), sample)
+        results.append(_result("query_by_catalog", scale, len(sample), total, samples, backend=backend.name))
+        t0 = time.perf_counter()
+        found = backend.query_by_catalogs(sample, with_cover=True)
+        results.append(_result("query_by_catalogs", scale, len(sample), time.perf_counter() - t0,
+                               backend=backend.name))
+
+        # —— normalize / validate ——
+        ctx = NormalizationContext(label_alias_path=resolve_pkg_file("data/label_alias.json"))
+        hits = [found[c] for c in sample if found[c][0]]
+        records, total, samples = _timed_each(
+            lambda f: normalize_record(f[0], f[1], f[2], ctx, cover=f[3]), hits)
+        results.append(_result("normalize_record", scale, len(hits), total, samples))
+
+        schema = load_schema(Path(resolve_pkg_file("data/schemas/mb-album-v1.json")))
+        _, total, samples = _timed_each(lambda rec: validate(rec, schema), records)
+        results.append(_result("validate", scale, len(records), total, samples))
+
+        # —— compact：每条 release 的品番表 + 一张随机抽取的长表（大多不连续，考验最坏情况） ——
+        lists = [f[0]["catalog_numbers"] or [] for f in hits]
+        _, total, samples = _timed_each(compact_catalog_numbers, lists)
+        results.append(_result("compact_catalog_numbers", scale, len(lists), total, samples))
+        long_list = rng.sample(catalogs, min(args.compact_max, len(catalogs)))
+        t0 = time.perf_counter()
+        compact_catalog_numbers(long_list)
+        results.append(_result("compact_catalog_numbers_long", scale, len(long_list), time.perf_counter() - t0))
+
+        results.extend(_bench_excel(args, scale, workdir, backend, catalogs, rng, ctx))
+    finally:
+        backend.close()
+    return results
+
+def _bench_excel(args, scale, workdir, backend, catalogs, rng, ctx) -> list[dict]:
+    from vgmmb.excel_sync import update_excel
+
+    # 采购表：scale 行，约 80% 命中（含重复购买），其余为不存在的品番
+    rows = [rng.choice(catalogs) if rng.random() < 0.8 else f"ZZZZ-{rng.randrange(10**6):06d}"
+            for _ in range(scale)]
+    json_dir = workdir / f"json-{scale}"
+    if json_dir.exists():
+        shutil.rmtree(json_dir)
+    unique = sorted(set(rows))
+    found = backend.query_by_catalogs(unique)
+    for cat in unique:
+        best, artists, tracks, cover = found[cat]
+        if best:
+            write_json(normalize_record(best, artists, tracks, ctx, cover=cover),
+                       json_dir / f"{safe_basename(cat)}.json")
+    xlsx = workdir / f"sheet-{scale}.xlsx"
+    pd.DataFrame({"采购时间": range(len(rows)), "catelog": rows, "产品名称": None, "版本": None,
+                  "版本详情": None, "歌手": None, "Barcode": None}).to_excel(xlsx, sheet_name="采购统计", index=False)
+
+    results = []
+    t0 = time.perf_counter()
+    df, _miss = update_excel(xlsx, json_dir=json_dir, mode="fill-only", commit=False)
+    results.append(_result("update_excel", scale, len(df), time.perf_counter() - t0,
+                           cells=int(df.attrs.get("updated", 0))))
+    t0 = time.perf_counter()
+    update_excel(xlsx, json_dir=json_dir, mode="fill-only", commit=True)
+    results.append(_result("update_excel_commit", scale, len(df), time.perf_counter() - t0))
+    return results
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def cmd_run(args):
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="vgmmb-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    results = []
+    for scale in args.scale:
+        print(f"[BENCH] scale={scale}", file=sys.stderr)
+        for r in bench_scale(args, scale, workdir):
+            print(f"[BENCH] {r['name']:<30} n={r['n']:<7} {r['seconds']:>9.3f}s "
+                  f"{r['ops_per_sec'] or 0:>12.1f}/s", file=sys.stderr)
+            results.append(r)
+    doc = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "backend": args.backend,
+            "seed": args.seed,
+            "lookups": args.lookups,
+        },
+        "results": results,
+    }
+    Path(args.out).write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[BENCH] results saved to: {args.out}", file=sys.stderr)
+
+def cmd_compare(args):
+    def load(p):
+        doc = json.loads(Path(p).read_text(encoding="utf-8"))
+        return doc["meta"], {(r["name"], r["scale"]): r for r in doc["results"]}
+    meta_a, a = load(args.base)
+    meta_b, b = load(args.head)
+    print(f"{'benchmark':<30} {'scale':>7} {meta_a.get('git_rev') or 'base':>10} "
+          f"{meta_b.get('git_rev') or 'head':>10} {'ratio':>7}")
+    for key in sorted(a.keys() & b.keys(), key=lambda k: (k[1], k[0])):
+        ta, tb = a[key]["seconds"], b[key]["seconds"]
+        ratio = tb / ta if ta else float("nan")
+        print(f"{key[0]:<30} {key[1]:>7} {ta:>10.3f} {tb:>10.3f} {ratio:>7.2f}")
+
+def cmd_load_postgres(args):
+    from vgmmb.db import connect
+    conn = connect()
+    try:
+        t0 = time.perf_counter()
+        load_postgres(SynthDataset(args.scale, seed=args.seed), conn)
+        print(f"[BENCH] loaded {args.scale} releases in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    finally:
+        conn.close()
+
+def cmd_parity(args):
+    from vgmmb.db import connect, dict_cursor
+    from vgmmb.queries import SQL_MAIN_BULK, SQL_MAIN_CANDIDATES_BULK, _best_release
+
+    conn = connect()
+    try:
+        cur = dict_cursor(conn)
+        cur.execute("SELECT DISTINCT catalog_number FROM musicbrainz.release_label "
+                    "WHERE catalog_number IS NOT NULL")
+        catalogs = sorted(r["catalog_number"] for r in cur.fetchall())
+        sample = random.Random(args.seed).sample(catalogs, min(args.sample, len(catalogs)))
+
+        cur.execute(SQL_MAIN_CANDIDATES_BULK, (sample,))
+        candidates = {}
+        for row in cur.fetchall():
+            candidates.setdefault(row.pop("query_catalog"), []).append(row)
+        cur.execute(SQL_MAIN_BULK, (sample,))
+        ranked = {row.pop("query_catalog"): row for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+    mismatches = 0
+    for cat in sample:
+        want = _best_release(candidates[cat]) if cat in candidates else None
+        got = ranked.get(cat)
+        if want != got:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"[PARITY] {cat}: python={want and want['release_id']} "
+                      f"sql={got and got['release_id']}", file=sys.stderr)
+    multi = sum(1 for rows in candidates.values() if len(rows) > 1)
+    print(f"[PARITY] catalogs={len(sample)} with_multiple_candidates={multi} mismatches={mismatches}",
+          file=sys.stderr)
+    if mismatches:
+        sys.exit(1)
+
+def main():
+    p = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="Run the benchmarks and write JSON results")
+    p_run.add_argument("--scale", type=int, nargs="+", default=[1000, 10000, 100000],
+                       help="Dataset sizes (number of releases)")
+    p_run.add_argument("--backend", choices=["snapshot", "postgres"], default="snapshot",
+                       help="snapshot: synthetic SQLite built per scale; postgres: the DB in MB_* env")
+    p_run.add_argument("--seed", type=int, default=1)
+    p_run.add_argument("--lookups", type=int, default=2000, help="Catalogs sampled for lookup benchmarks")
+    p_run.add_argument("--compact-max", type=int, default=20000,
+                       help="Size cap for the long compact_catalog_numbers input")
+    p_run.add_argument("--workdir", default=None, help="Where datasets and sheets are kept (reused across runs)")
+    p_run.add_argument("--out", default="bench-results.json")
+    p_cmp = sub.add_parser("compare", help="Compare two result files")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("head")
+    p_load = sub.add_parser("load-postgres", help="Load a synthetic dataset into an EMPTY Postgres database")
+    p_load.add_argument("--scale", type=int, required=True)
+    p_load.add_argument("--seed", type=int, default=1)
+    p_par = sub.add_parser("parity", help="Check SQL-side ranking against _best_release (Postgres)")
+    p_par.add_argument("--sample", type=int, default=2000, help="Catalogs sampled from release_label")
+    p_par.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    {"run": cmd_run, "compare": cmd_compare, "load-postgres": cmd_load_postgres,
+     "parity": cmd_parity}[args.cmd](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+合成 MusicBrainz 形状的数据集（benchmark 用）。
+
+按 release 逐条生成（同一 seed 结果完全一致），每条带上它在 MB 各表中的行：
+release / release_label / release_country / medium / track / recording / cover_art ……
+标签、艺人、release group 等共享实体事先生成。可装入：
+  - 离线快照（vgmmb.snapshot 的 SQLite 格式）：load_snapshot()
+  - 本地 Postgres（只建查询用到的表和列）：load_postgres()，务必指向一个空的临时库
+"""
+import io
+import json
+import random
+import sqlite3
+import uuid
+from collections import Counter
+from datetime import date
+from pathlib import Path
+
+from vgmmb.catalog import catalog_key
+from vgmmb.snapshot import _RELEASE_COLS, _SCHEMA, SNAPSHOT_FORMAT
+
+PREFIXES = ["SECL", "VVCL", "KICA", "PCCG", "SVWC", "KSLA", "LACA", "GNCA", "COCX", "TYCY", "VTCL", "SRCL"]
+STATUSES = {1: "Official", 2: "Promotion", 3: "Bootleg", 4: "Pseudo-Release"}
+PACKAGINGS = {1: "Jewel Case", 2: "Digipak", 3: "Box", 4: "Cardboard/Paper Sleeve"}
+FORMATS = {1: "CD", 2: "Blu-ray", 3: "DVD-Video", 4: "Vinyl", 5: "Digital Media"}
+COUNTRIES = {107: "JP", 222: "US", 221: "GB", 240: "XW"}
+ART_TYPES = {1: "Front", 2: "Back", 3: "Booklet"}
+IMAGE_TYPES = {"image/jpeg": "jpg", "image/png": "png"}
+COMMENTS = ["", "", "", "初回生産限定盤", "通常盤", "完全生産限定盤", "期間生産限定盤"]
+
+def _gid(rng) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+class SynthDataset:
+    """scale = release 数；约 5% 的品番在别的 release 上复用（再发 / 海外版），用于检验排序。"""
+
+    def __init__(self, scale: int, seed: int = 1):
+        self.scale = scale
+        self.seed = seed
+        rng = random.Random(seed)
+        n_labels = max(10, scale // 50)
+        n_artists = max(20, scale // 10)
+        self.labels = [(i, _gid(rng), f"Label {i}") for i in range(1, n_labels + 1)]
+        self.artists = [(i, _gid(rng), f"Artist {i}") for i in range(1, n_artists + 1)]
+        self.catalogs = []       # 每个 release 的主品番（生成后才知道）
+
+    def iter_releases(self):
+        """逐个产出 release 的全部行（dict：表名 -> 行列表 / 行）。"""
+        rng = random.Random(self.seed * 7919 + 1)
+        next_num = {p: rng.randint(100, 5000) for p in PREFIXES}
+        medium_id = track_id = cover_id = rl_id = 0
+        self.catalogs = []
+        for rid in range(1, self.scale + 1):
+            n_media = rng.choices([1, 2, 3, 4], weights=[70, 20, 7, 3])[0]
+            # 品番：多碟盘号连续（SECL-2409~12 这类区间就是这么来的）
+            if self.catalogs and rng.random() < 0.05:
+                cats = [rng.choice(self.catalogs)]
+            else:
+                prefix = rng.choice(PREFIXES)
+                width = 4 if rng.random() < 0.8 else 5
+                start = next_num[prefix]
+                next_num[prefix] += n_media + rng.randint(0, 3)
+                tail = "B" if rng.random() < 0.02 else ""
+                cats = [f"{prefix}-{n:0{width}d}{tail}" for n in range(start, start + n_media)]
+            self.catalogs.append(cats[0])
+
+            ac = rid  # 每个 release 一个 artist credit
+            credit = rng.sample(self.artists, k=rng.choices([1, 2, 3], weights=[75, 20, 5])[0])
+            label = rng.choice(self.labels)
+            year = rng.randint(1985, 2025)
+            countries = rng.sample(list(COUNTRIES), k=rng.choices([1, 2], weights=[85, 15])[0])
+            if rng.random() < 0.6 and 107 not in countries:
+                countries[0] = 107
+
+            rel = {
+                "release": (rid, _gid(rng), f"Release {rid}", rid, ac,
+                            f"49{rng.randrange(10**10, 10**11)}" if rng.random() < 0.8 else None,
+                            rng.choices([1, 2, 3, 4, None], weights=[80, 8, 4, 3, 5])[0],
+                            rng.choice([1, 2, 3, 4, None]), rng.choice(COMMENTS)),
+                "release_group": (rid, _gid(rng), f"Release Group {rid}"),
+                "artist_credit": (ac, " / ".join(a[2] for a in credit)),
+                "artist_credit_name": [
+                    (ac, pos, a[0], a[2] if rng.random() < 0.9 else None,
+                     " / " if pos < len(credit) - 1 else "")
+                    for pos, a in enumerate(credit)
+                ],
+                "release_country": [
+                    (rid, c,
+                     year + i if rng.random() < 0.95 else None,
+                     rng.choice([None, rng.randint(1, 12)]),
+                     rng.choice([None, rng.randint(1, 28)]))
+                    for i, c in enumerate(countries)
+                ],
+                "release_label": [],
+                "medium": [], "track": [], "recording": [],
+                "cover_art": [], "cover_art_type": [],
+            }
+            for cat in cats:
+                rl_id += 1
+                rel["release_label"].append((rl_id, rid, label[0], cat))
+            for pos in range(1, n_media + 1):
+                medium_id += 1
+                fmt = rng.choices([1, 2, 3, 4, 5, None], weights=[70, 12, 8, 4, 4, 2])[0]
+                rel["medium"].append((medium_id, rid, pos, fmt))
+                for tno in range(1, rng.randint(2, 12) + 1):
+                    track_id += 1
+                    length = rng.randint(60_000, 420_000) if rng.random() < 0.95 else None
+                    rel["recording"].append((track_id, f"Recording {track_id}", length))
+                    rel["track"].append((track_id, medium_id, tno, str(tno),
+                                         f"Track {tno}" if rng.random() < 0.9 else None, track_id))
+            for ordering in range(1, rng.choices([0, 1, 2, 3], weights=[20, 50, 20, 10])[0] + 1):
+                cover_id += 1
+                mime = rng.choice(list(IMAGE_TYPES))
+                size = rng.randint(50_000, 5_000_000)
+                rel["cover_art"].append((cover_id, rid, mime, size, size // 20, size // 8, size // 3, ordering))
+                # Front 不一定是 ordering=1
+                types = [1] if rng.random() < 0.6 else [rng.choice([1, 2, 3])]
+                rel["cover_art_type"].extend((cover_id, t) for t in types)
+            yield rel
+
+# —— 与 SQL_MAIN / SQL_ARTIST / SQL_TRACKS / SQL_COVER_* 等价的 Python 实现，用于写快照 ——
+
+def _main_columns(rel) -> dict:
+    rid, gid, name, rg_id, _ac, barcode, status, packaging, comment = rel["release"]
+    dated = [(y, m, d) for _r, _c, y, m, d in rel["release_country"] if y is not None]
+    # ORDER BY year, month NULLS LAST, day NULLS LAST
+    dated.sort(key=lambda t: (t[0], t[1] is None, t[1] or 0, t[2] is None, t[2] or 0))
+    release_date = date(dated[0][0], dated[0][1] or 1, dated[0][2] or 1) if dated else None
+    fmt_counts = Counter(FORMATS.get(fmt, "Unknown") if fmt else "Unknown" for *_x, fmt in rel["medium"])
+    medium_formats = "+".join(f"{n}{f}" if n > 1 else f for f, n in sorted(fmt_counts.items())) or None
+    return {
+        "release_id": rid, "release_gid": gid, "release_title": name,
+        "rg_id": rg_id, "rg_gid": rel["release_group"][1], "rg_title": rel["release_group"][2],
+        "barcode": barcode, "release_status": status, "packaging": packaging,
+        "is_jp": any(COUNTRIES[c] == "JP" for _r, c, *_x in rel["release_country"]),
+        "release_date": release_date, "edition_note": comment,
+        "release_status_name": STATUSES.get(status), "packaging_name": PACKAGINGS.get(packaging),
+        "medium_formats": medium_formats,
+        "catalog_numbers": sorted({cat for *_x, cat in rel["release_label"]}),
+    }
+
+def load_snapshot(ds: SynthDataset, out_path: Path) -> dict:
+    """写成 vgmmb.snapshot 格式的 SQLite（SnapshotBackend 可直接打开）。"""
+    out_path = Path(out_path)
+    out_path.unlink(missing_ok=True)
+    db = sqlite3.connect(out_path, isolation_level=None)
+    db.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + _SCHEMA)
+    db.execute("BEGIN")
+    labels = {label[0]: label for label in ds.labels}
+    artists = {a[0]: a for a in ds.artists}
+    n_rl = 0
+    rl_rows = []
+    for rel in ds.iter_releases():
+        row = _main_columns(rel)
+        row["release_date"] = row["release_date"].isoformat() if row["release_date"] else None
+        row["catalog_numbers"] = json.dumps(row["catalog_numbers"], ensure_ascii=False)
+        row["is_jp"] = int(row["is_jp"])
+        db.execute(f"INSERT INTO release VALUES ({', '.join('?' * len(_RELEASE_COLS))})",
+                   tuple(row[c] for c in _RELEASE_COLS))
+        for _id, rid, label_id, cat in rel["release_label"]:
+            lab = labels[label_id]
+            db.execute("INSERT OR IGNORE INTO label VALUES (?, ?, ?)", lab)
+            rl_rows.append((catalog_key(cat), cat, rid, label_id))
+            n_rl += 1
+        db.executemany("INSERT INTO artist VALUES (?, ?, ?, ?)",
+                       [(rel["release"][0], pos, join, name or artists[aid][2])
+                        for _ac, pos, aid, name, join in rel["artist_credit_name"]])
+        media = {m[0]: m for m in rel["medium"]}
+        recs = {r[0]: r for r in rel["recording"]}
+        db.executemany("INSERT INTO track VALUES (?, ?, ?, ?, ?, ?)",
+                       [(rel["release"][0], media[mid][2], pos, number, name or recs[rec][1], recs[rec][2])
+                        for _tid, mid, pos, number, name, rec in rel["track"]])
+        fronts = {cid for cid, t in rel["cover_art_type"] if ART_TYPES[t] == "Front"}
+        db.executemany("INSERT INTO cover VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       [(rid, cid, mime, IMAGE_TYPES[mime], size, t250, t500, t1200, int(cid in fronts), ordering)
+                        for cid, rid, mime, size, t250, t500, t1200, ordering in rel["cover_art"]])
+        if len(rl_rows) >= 5000:
+            db.executemany("INSERT OR IGNORE INTO release_label VALUES (?, ?, ?, ?)", rl_rows)
+            rl_rows.clear()
+    db.executemany("INSERT OR IGNORE INTO release_label VALUES (?, ?, ?, ?)", rl_rows)
+    meta = {"format": SNAPSHOT_FORMAT, "built_at": "synthetic", "replication_sequence": ds.seed,
+            "filters": json.dumps({"synthetic_scale": ds.scale}), "releases": ds.scale,
+            "release_labels": n_rl}
+    db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+    db.execute("COMMIT")
+    db.execute("ANALYZE")
+    db.close()
+    return meta
+
+# —— Postgres：只建 vgmmb 查询用到的表 / 列（与 MB 同名同义） ——
+
+PG_DDL = """
+CREATE SCHEMA IF NOT EXISTS musicbrainz;
+CREATE SCHEMA IF NOT EXISTS cover_art_archive;
+SET search_path = musicbrainz;
+CREATE TABLE release_status    (id int PRIMARY KEY, name text NOT NULL);
+CREATE TABLE release_packaging (id int PRIMARY KEY, name text NOT NULL);
+CREATE TABLE medium_format     (id int PRIMARY KEY, name text NOT NULL);
+CREATE TABLE iso_3166_1        (area int NOT NULL, code char(2) PRIMARY KEY);
+CREATE TABLE label             (id int PRIMARY KEY, gid uuid NOT NULL, name text NOT NULL);
+CREATE TABLE artist            (id int PRIMARY KEY, gid uuid NOT NULL, name text NOT NULL);
+CREATE TABLE artist_credit     (id int PRIMARY KEY, name text NOT NULL);
+CREATE TABLE artist_credit_name (artist_credit int NOT NULL, position smallint NOT NULL, artist int NOT NULL,
+                                 name text, join_phrase text NOT NULL DEFAULT '',
+                                 PRIMARY KEY (artist_credit, position));
+CREATE TABLE release_group     (id int PRIMARY KEY, gid uuid NOT NULL, name text NOT NULL);
+CREATE TABLE release           (id int PRIMARY KEY, gid uuid NOT NULL, name text NOT NULL,
+                                release_group int NOT NULL, artist_credit int NOT NULL, barcode text,
+                                status int, packaging int, comment text NOT NULL DEFAULT '');
+CREATE TABLE release_country   (release int NOT NULL, country int NOT NULL, date_year smallint,
+                                date_month smallint, date_day smallint, PRIMARY KEY (release, country));
+CREATE TABLE release_label     (id int PRIMARY KEY, release int NOT NULL, label int, catalog_number text);
+CREATE TABLE medium            (id int PRIMARY KEY, release int NOT NULL, position int NOT NULL, format int);
+CREATE TABLE recording         (id int PRIMARY KEY, name text NOT NULL, length int);
+CREATE TABLE track             (id int PRIMARY KEY, medium int NOT NULL, position int NOT NULL,
+                                number text NOT NULL, name text, recording int NOT NULL);
+CREATE TABLE replication_control (current_replication_sequence int);
+SET search_path = cover_art_archive;
+CREATE TABLE art_type          (id int PRIMARY KEY, name text NOT NULL);
+CREATE TABLE image_type        (mime_type text PRIMARY KEY, suffix text NOT NULL);
+CREATE TABLE cover_art         (id bigint PRIMARY KEY, release int NOT NULL, mime_type text NOT NULL,
+                                filesize int, thumb_250_filesize int, thumb_500_filesize int,
+                                thumb_1200_filesize int, ordering int NOT NULL);
+CREATE TABLE cover_art_type    (id bigint NOT NULL, type_id int NOT NULL, PRIMARY KEY (id, type_id));
+"""
+
+# MB 的时间列（mb-lookup --refresh 比较用）：装数据后再加，COPY 仍按原列序；取值为装载时间
+PG_TIMESTAMPS = """
+ALTER TABLE musicbrainz.release       ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.release_group ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.release_label ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.label         ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.medium        ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.track         ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.recording     ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.artist        ADD COLUMN last_updated timestamptz DEFAULT now();
+ALTER TABLE musicbrainz.artist_credit ADD COLUMN created timestamptz DEFAULT now();
+ALTER TABLE cover_art_archive.cover_art ADD COLUMN date_uploaded timestamptz DEFAULT now();
+"""
+
+# 与 MB 官方 schema 一致的常用索引
+PG_INDEXES = """
+CREATE INDEX ON musicbrainz.release_label (release);
+CREATE INDEX ON musicbrainz.release_label (catalog_number);
+CREATE INDEX ON musicbrainz.release (release_group);
+CREATE INDEX ON musicbrainz.medium (release);
+CREATE INDEX ON musicbrainz.track (medium);
+CREATE INDEX ON cover_art_archive.cover_art (release);
+ANALYZE;
+"""
+
+_PG_TABLES = [
+    # (表, 行来源, 是否每个 release 一行)
+    ("musicbrainz.release", "release", True),
+    ("musicbrainz.release_group", "release_group", True),
+    ("musicbrainz.artist_credit", "artist_credit", True),
+    ("musicbrainz.artist_credit_name", "artist_credit_name", False),
+    ("musicbrainz.release_country", "release_country", False),
+    ("musicbrainz.release_label", "release_label", False),
+    ("musicbrainz.medium", "medium", False),
+    ("musicbrainz.recording", "recording", False),
+    ("musicbrainz.track", "track", False),
+    ("cover_art_archive.cover_art", "cover_art", False),
+    ("cover_art_archive.cover_art_type", "cover_art_type", False),
+]
+
+def _copy(cur, table: str, rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v).replace("\\", "\\\\").replace("\t", " ")
+                            for v in row) + "\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} FROM STDIN", buf)
+
+def load_postgres(ds: SynthDataset, conn, flush_every: int = 2000) -> dict:
+    """
+    在 conn 指向的库中建表并用 COPY 装入数据。只用于空的临时库：
+    库里已有 musicbrainz.release 时拒绝执行（防止误写真实镜像）。
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('musicbrainz.release') IS NOT NULL")
+        if cur.fetchone()[0]:
+            raise RuntimeError("musicbrainz.release already exists; load synthetic data into an empty database")
+        cur.execute(PG_DDL)
+        cur.execute("SET search_path = musicbrainz")
+        _copy(cur, "musicbrainz.release_status", STATUSES.items())
+        _copy(cur, "musicbrainz.release_packaging", PACKAGINGS.items())
+        _copy(cur, "musicbrainz.medium_format", FORMATS.items())
+        _copy(cur, "musicbrainz.iso_3166_1", COUNTRIES.items())
+        _copy(cur, "musicbrainz.label", ds.labels)
+        _copy(cur, "musicbrainz.artist", ds.artists)
+        _copy(cur, "musicbrainz.replication_control", [(ds.seed,)])
+        _copy(cur, "cover_art_archive.art_type", ART_TYPES.items())
+        _copy(cur, "cover_art_archive.image_type", IMAGE_TYPES.items())
+
+        pending = {key: [] for _t, key, _one in _PG_TABLES}
+
+        def flush():
+            for table, key, _one in _PG_TABLES:
+                if pending[key]:
+                    _copy(cur, table, pending[key])
+                    pending[key].clear()
+
+        for n, rel in enumerate(ds.iter_releases(), start=1):
+            for _table, key, one in _PG_TABLES:
+                if one:
+                    pending[key].append(rel[key])
+                else:
+                    pending[key].extend(rel[key])
+            if n % flush_every == 0:
+                flush()
+        flush()
+        cur.execute(PG_TIMESTAMPS)
+        cur.execute(PG_INDEXES)
+    conn.commit()
+    return {"releases": ds.scale}
@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks.synth import SynthDataset, load_snapshot
+from vgmmb.snapshot import SnapshotBackend
+
+SYNTH_SCALE = 300
+
+@pytest.fixture(scope="session")
+def synth_snapshot(tmp_path_factory):
+    """固定种子的合成快照（benchmarks.synth）：返回 (数据集, 快照路径)，整个测试会话共用。"""
+    ds = SynthDataset(SYNTH_SCALE)
+    path = tmp_path_factory.mktemp("synth") / "synth.sqlite"
+    load_snapshot(ds, path)
+    return ds, path
+
+@pytest.fixture
+def snapshot_backend(synth_snapshot):
+    backend = SnapshotBackend(synth_snapshot[1])
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def catalog_numbers(snapshot_backend):
+    """快照里全部不同的品番（含多碟 release 的连号）。"""
+    return sorted(set(snapshot_backend.iter_catalog_numbers()))
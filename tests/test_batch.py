@@ -0,0 +1,25 @@
+from vgmmb.batch import chunked, ordered_map, spread_chunks
+
+def test_spread_chunks_single_worker_matches_chunked():
+    items = list(range(1234))
+    assert list(spread_chunks(items, 500, 1)) == list(chunked(items, 500))
+
+def test_spread_chunks_splits_short_input_over_workers():
+    chunks = list(spread_chunks(range(10), 500, 4))
+    assert [len(c) for c in chunks] == [2, 3, 2, 3]
+    assert [x for c in chunks for x in c] == list(range(10))
+    # 不足 workers 条：每条一块，不产出空块
+    assert list(spread_chunks(["a", "b"], 500, 4)) == [["a"], ["b"]]
+    assert list(spread_chunks([], 500, 4)) == []
+
+def test_spread_chunks_keeps_full_chunks_and_caps_size():
+    for n in (0, 1, 7, 99, 100, 101, 257, 1000):
+        chunks = list(spread_chunks(range(n), 25, 4))
+        assert [x for c in chunks for x in c] == list(range(n))
+        assert all(0 < len(c) <= 25 for c in chunks)
+    # 满窗口部分仍按 size 切
+    assert [len(c) for c in spread_chunks(range(110), 25, 4)][:4] == [25, 25, 25, 25]
+
+def test_ordered_map_keeps_input_order_across_threads():
+    out = list(ordered_map(lambda c: [x * 2 for x in c], spread_chunks(range(40), 500, 4), workers=4))
+    assert [x for c in out for x in c] == [x * 2 for x in range(40)]
@@ -0,0 +1,78 @@
+from datetime import date
+
+from vgmmb.cache import LookupCache, cached_query_by_catalogs
+
+HIT = ({"release_id": 1, "release_date": date(2001, 2, 3)}, [], [], None)
+MISS = (None, None, None, None)
+
+class _Source:
+    """假的后端：记录每次被问到的品番、序号与匹配口径的查询次数。"""
+
+    def __init__(self, seq=1, match="key"):
+        self.seq, self.match = seq, match
+        self.asked, self.seq_calls, self.match_calls = [], 0, 0
+
+    def sequence(self):
+        self.seq_calls += 1
+        return self.seq
+
+    def match_mode(self):
+        self.match_calls += 1
+        return self.match
+
+    def query_many(self, catalogs, with_cover=False):
+        self.asked.append(list(catalogs))
+        return {c: HIT if c.replace("-", "").upper() == "SECL1" else MISS for c in catalogs}
+
+def _open(tmp_path, src, **kwargs):
+    cache = LookupCache(tmp_path, **kwargs)
+    cache.sync_sequence(src.sequence, src.match_mode)
+    return cache
+
+def test_round_trip_and_not_found_are_cached(tmp_path):
+    src = _Source()
+    cache = _open(tmp_path, src)
+    first = cached_query_by_catalogs(cache, src.query_many, ["SECL-1", "NOPE-1"], False)
+    again = cached_query_by_catalogs(_open(tmp_path, src), src.query_many, ["SECL-1", "NOPE-1"], False)
+    assert first == again == {"SECL-1": HIT, "NOPE-1": MISS}
+    assert src.asked == [["SECL-1", "NOPE-1"]]
+
+def test_key_mode_shares_rows_across_spellings_but_ilike_does_not(tmp_path):
+    src = _Source(match="key")
+    cached_query_by_catalogs(_open(tmp_path, src), src.query_many, ["SECL-1"], False)
+    cached_query_by_catalogs(_open(tmp_path, src), src.query_many, ["secl1"], False)
+    assert src.asked == [["SECL-1"]]
+
+    src = _Source(match="ilike")
+    cached_query_by_catalogs(_open(tmp_path / "i", src), src.query_many, ["SECL-1"], False)
+    cached_query_by_catalogs(_open(tmp_path / "i", src), src.query_many, ["SECL1"], False)
+    assert src.asked == [["SECL-1"], ["SECL1"]]
+
+def test_sequence_is_trusted_within_ttl_but_match_mode_is_always_checked(tmp_path):
+    src = _Source()
+    cached_query_by_catalogs(_open(tmp_path, src), src.query_many, ["SECL-1"], False)
+    _open(tmp_path, src)
+    assert (src.seq_calls, src.match_calls) == (1, 2)
+
+    # 口径变化（MB_CATALOG_MATCH / mb-index drop）：即使还在 TTL 内也整库失效
+    src.match = "ilike"
+    cache = _open(tmp_path, src)
+    assert cache.stats["invalidated"] == 1
+    assert cache.get_many(["SECL-1"], False) == {}
+
+def test_new_sequence_or_generation_invalidates(tmp_path):
+    src = _Source(seq=1)
+    cached_query_by_catalogs(_open(tmp_path, src, seq_ttl=0), src.query_many, ["SECL-1"], False)
+    src.seq = 2
+    assert _open(tmp_path, src, seq_ttl=0).get_many(["SECL-1"], False) == {}
+
+    cached_query_by_catalogs(_open(tmp_path, src, generation="a"), src.query_many, ["SECL-1"], False)
+    assert _open(tmp_path, src, generation="a").get_many(["SECL-1"], False)
+    assert _open(tmp_path, src, generation="b").get_many(["SECL-1"], False) == {}
+
+def test_cover_modes_and_sources_are_separate(tmp_path):
+    src = _Source()
+    cached_query_by_catalogs(_open(tmp_path, src), src.query_many, ["SECL-1"], False)
+    assert _open(tmp_path, src).get_many(["SECL-1"], True) == {}
+    assert _open(tmp_path, src).get_many(["SECL-1"], "all") == {}
+    assert _open(tmp_path, src, source="snapshot:/x.sqlite").get_many(["SECL-1"], False) == {}
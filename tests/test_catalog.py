@@ -0,0 +1,171 @@
+import random
+import re
+from itertools import groupby
+
+import pytest
+
+from vgmmb.catalog import (
+    catalog_key,
+    compact_catalog_numbers,
+    expand_catalog_range,
+    expand_catalog_ranges,
+    first_from_catalog_range,
+    is_catalog_range,
+    match_key,
+    parse_catalog_range,
+)
+
+# —— 移到 vgmmb.catalog 之前（io.py / normalizer.py 中）的实现，原样留作对照 ——
+_LEGACY_CAT_RE = re.compile(r'^([A-Za-z0-9]+-?)(\d+)([A-Za-z]?)$')
+_LEGACY_CAT_RANGE_RE = re.compile(r"^([A-Z0-9]+-?)(\d+)\s*[~～〜]\s*(\d+)([A-Za-z]?)$")
+
+def _legacy_is_catalog_range(s):
+    return bool(s and _LEGACY_CAT_RANGE_RE.match(s.strip()))
+
+def _legacy_first_from_catalog_range(cat):
+    c = (cat or "").strip()
+    m = _LEGACY_CAT_RANGE_RE.match(c)
+    if not m:
+        return c
+    prefix, start_str, _end_str, tail = m.groups()
+    width = len(start_str)
+    start = int(start_str)
+    return f"{prefix}{start:0{width}d}{tail}"
+
+def _legacy_lcp(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def _legacy_compact_catalog_numbers(catalog_numbers):
+    if not catalog_numbers:
+        return None
+    parsed = []
+    leftovers = []
+    for code in catalog_numbers:
+        m = _LEGACY_CAT_RE.match(code.strip())
+        if not m:
+            leftovers.append(code.strip())
+            continue
+        prefix, num_str, tail = m.group(1), m.group(2), m.group(3)
+        parsed.append({"raw": code.strip(), "prefix": prefix, "num": int(num_str),
+                       "width": len(num_str), "tail": tail})
+    parsed.sort(key=lambda x: (x["prefix"], x["width"], x["tail"], x["num"]))
+    chunks = []
+
+    def emit(prefix, width, tail, items, start, prev):
+        s = f"{start:0{width}d}"
+        e = f"{prev:0{width}d}"
+        k = _legacy_lcp(s, e)
+        if start == prev:
+            chunks.append(next(x["raw"] for x in items if x["num"] == start))
+        else:
+            chunks.append(f"{prefix}{s[:k]}{s[k:]}~{e[k:]}{tail}")
+
+    for (prefix, width, tail), items_iter in groupby(parsed, key=lambda x: (x["prefix"], x["width"], x["tail"])):
+        items = list(items_iter)
+        start = prev = items[0]["num"]
+        for item in items[1:]:
+            cur = item["num"]
+            if cur != prev + 1:
+                emit(prefix, width, tail, items, start, prev)
+                start = cur
+            prev = cur
+        emit(prefix, width, tail, items, start, prev)
+    return ", ".join(chunks + leftovers)
+
+# —— 随机输入 ——
+_PREFIXES = ["SECL-", "KICA-", "VTCL-", "SVWC", "A1-", "PCCG-"]
+
+def _random_catalog(rng):
+    width = rng.choice([3, 4, 4, 5])
+    num = rng.randrange(0, 10 ** width)
+    return f"{rng.choice(_PREFIXES)}{num:0{width}d}{rng.choice(['', '', '', 'A', 'B'])}"
+
+def _random_input(rng):
+    kind = rng.random()
+    if kind < 0.5:
+        cat = _random_catalog(rng)
+        m = _LEGACY_CAT_RE.match(cat)
+        end = rng.choice([m.group(2)[-1:], m.group(2)[-2:], m.group(2), str(rng.randrange(0, 100))])
+        sep = rng.choice(["~", "～", "〜", " ~ "])
+        return f"{m.group(1)}{m.group(2)}{sep}{end}{m.group(3)}"
+    if kind < 0.9:
+        return rng.choice(["", " ", "  "]) + _random_catalog(rng) + rng.choice(["", " "])
+    return rng.choice(["", "   ", "FOO BAR", "SECL-12-3", "-", "ＳＥＣＬ－１"])
+
+def test_first_from_catalog_range_matches_legacy():
+    rng = random.Random(21)
+    for _ in range(5000):
+        raw = _random_input(rng)
+        assert first_from_catalog_range(raw) == _legacy_first_from_catalog_range(raw), raw
+        assert is_catalog_range(raw) == _legacy_is_catalog_range(raw), raw
+
+@pytest.mark.parametrize("raw, first", [
+    # 有意的差异：区间前缀允许小写；不合格式但含区间符时取符号前的部分（旧实现原样返回）
+    ("secl-2409~13", "secl-2409"),
+    ("ABC-1 ~ XYZ", "ABC-1"),
+    ("SECL-12-3〜4", "SECL-12-3"),
+    (None, ""),
+])
+def test_first_from_catalog_range_fallbacks(raw, first):
+    assert first_from_catalog_range(raw) == first
+
+def test_compact_catalog_numbers_matches_legacy():
+    rng = random.Random(21)
+    for _ in range(2000):
+        codes = {_random_catalog(rng) for _ in range(rng.randrange(1, 30))}
+        # 连号段：合并逻辑的主要路径
+        base = _random_catalog(rng)
+        m = _LEGACY_CAT_RE.match(base)
+        start = int(m.group(2))
+        codes.update(f"{m.group(1)}{n:0{len(m.group(2))}d}{m.group(3)}"
+                     for n in range(start, min(start + rng.randrange(1, 15), 10 ** len(m.group(2)))))
+        codes.update(rng.sample(["FOO BAR", "SECL-12-3", "-"], k=rng.randrange(0, 3)))
+        codes = list(codes)
+        rng.shuffle(codes)
+        assert compact_catalog_numbers(codes) == _legacy_compact_catalog_numbers(codes), codes
+    assert compact_catalog_numbers([]) is None
+
+def test_compact_catalog_numbers_drops_duplicates():
+    assert compact_catalog_numbers(["SECL-1", "SECL-2", "SECL-1", " SECL-3 "]) == "SECL-1~3"
+
+@pytest.mark.parametrize("raw, members", [
+    ("SECL-2409~13", ["SECL-2409", "SECL-2410", "SECL-2411", "SECL-2412", "SECL-2413"]),
+    ("VVCL-1583~4", ["VVCL-1583", "VVCL-1584"]),            # 尾号缩写按起始号补齐高位
+    ("KICA-0001~0003", ["KICA-0001", "KICA-0002", "KICA-0003"]),
+    ("SVWC-70359～60", ["SVWC-70359", "SVWC-70360"]),
+    ("VTCL-7899~901B", ["VTCL-7899B", "VTCL-7900B", "VTCL-7901B"]),
+    ("SECL-1999~01", ["SECL-1999"]),                          # 补齐后 end < start：只有首号
+    ("SECL-1193", ["SECL-1193"]),
+    ("  ", []),
+])
+def test_expand_catalog_range(raw, members):
+    assert expand_catalog_range(raw) == members
+    rng = parse_catalog_range(raw)
+    if rng is not None:
+        assert rng.first == members[0] == first_from_catalog_range(raw)
+
+def test_compact_and_expand_round_trip():
+    rng = random.Random(4)
+    for _ in range(2000):
+        base = _random_catalog(rng)
+        m = _LEGACY_CAT_RE.match(base)
+        width, start = len(m.group(2)), int(m.group(2))
+        run = [f"{m.group(1)}{n:0{width}d}{m.group(3)}"
+               for n in range(start, min(start + rng.randrange(1, 40), 10 ** width))]
+        assert expand_catalog_range(compact_catalog_numbers(run)) == run
+
+def test_expand_catalog_ranges_keeps_first_occurrence():
+    assert expand_catalog_ranges(["SECL-2~3", "SECL-1~2", "", "X"]) == ["SECL-2", "SECL-3", "SECL-1", "X"]
+
+def test_catalog_key_and_match_key():
+    assert catalog_key("secl-1193") == catalog_key("SECL1193") == catalog_key("ＳＥＣＬ－１１９３") == "SECL1193"
+    assert catalog_key(" SECL – 1193 ") == "SECL1193"
+    assert catalog_key(None) == ""
+    assert match_key("secl-1193") == "SECL1193"
+    # ILIKE 回退只忽略大小写：连字符不同的写法不能合并
+    assert match_key(" secl-1193 ", keyed=False) == "SECL-1193"
+    assert match_key("SECL1193", keyed=False) != match_key("SECL-1193", keyed=False)
@@ -0,0 +1,161 @@
+import json
+import random
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from vgmmb.catalog import compact_catalog_numbers, expand_catalog_range
+from vgmmb.excel_sync import (
+    TARGET_COLS,
+    DbSource,
+    JsonDirIndex,
+    _extract_fields,
+    read_columns,
+    update_excel,
+)
+from vgmmb.normalizer import NormalizationContext
+
+SHEET = "采购统计"
+CAT = "catelog"
+
+# —— 改成按列合并之前的 update_excel（逐行 iterrows），原样留作对照；记录来源由 load 给出 ——
+def _legacy_merge(df, load, mode):
+    targets = TARGET_COLS
+    for col in targets:
+        if col not in df.columns:
+            df[col] = pd.Series([None] * len(df))
+        # 旧版 pandas 往数值列写文本时自动转 object；pandas 3 改为报错，这里显式转
+        df[col] = df[col].astype(object)
+    missing = []
+    updated = 0
+    for idx, row in df.iterrows():
+        cin = str(row.get(CAT) or "").strip()
+        if not cin: continue
+        payload = load(cin)
+        if not payload:
+            missing.append({"row_index": idx, CAT: cin})
+            continue
+        fields = _extract_fields(payload)
+        for col in targets:
+            new_val = fields.get(col)
+            if new_val is None or (isinstance(new_val, float) and pd.isna(new_val)):
+                continue
+            if mode == "fill-only":
+                if pd.isna(row.get(col)) or row.get(col) in (None, "", " "):
+                    df.at[idx, col] = new_val; updated += 1
+            else:
+                df.at[idx, col] = new_val; updated += 1
+    return df, pd.DataFrame(missing, columns=["row_index", CAT]), updated
+
+def _range_input(catalog_numbers):
+    present = set(catalog_numbers)
+    for cat in catalog_numbers:
+        rng = compact_catalog_numbers([cat, cat[:-1] + str(int(cat[-1]) + 1)]) if cat[-1] < "9" else ""
+        if "~" in rng and all(c in present for c in expand_catalog_range(rng)):
+            return rng.replace("~", "～")
+    pytest.skip("synth snapshot has no consecutive catalog numbers")
+
+@pytest.fixture
+def workbook(tmp_path, catalog_numbers):
+    """按 sheet 的真实样子造一个工作簿：部分目标列已填、缺两个目标列、有空行 / 未命中 / 公式 / 区间。"""
+    rng = random.Random(13)
+    cats = rng.sample(catalog_numbers, 30)
+    rows = [[c, None, None, f"备注{i}", None] for i, c in enumerate(cats)]
+    rows[1][1] = "手填的名称"                       # fill-only 不覆盖
+    rows[2][2] = 3                                   # 数值格
+    rows[3][1] = " "                                 # 只有空格视为空
+    rows[4][0] = f"  {rows[4][0].lower()}  "         # 大小写 / 空白
+    rows[5][0] = _range_input(catalog_numbers)
+    rows[6] = [None, None, None, None, None]         # 中间空行
+    rows[7][0] = "NOPE-0001"
+    rows[8][0] = rows[9][0]                          # 重复品番
+    rows[10][3] = "=LEN(A11)"                        # 非目标列的公式
+    wb = Workbook()
+    ws = wb.active
+    ws.title = SHEET
+    ws.append([CAT, "产品名称", "版本", "其他", "歌手"])
+    for row in rows:
+        ws.append(row)
+    other = wb.create_sheet("其它表")
+    other["A1"] = "不应被改动"
+    path = tmp_path / "book.xlsx"
+    wb.save(path)
+    return path
+
+@pytest.fixture
+def json_dir(tmp_path, snapshot_backend, workbook):
+    out = tmp_path / "out"
+    cats = [str(v or "").strip() for v in pd.read_excel(workbook, sheet_name=SHEET)[CAT]]
+    DbSource(snapshot_backend, NormalizationContext(), json_out=out).load_many([c for c in cats if c])
+    return out
+
+def _cells(frame):
+    return frame.astype(object).where(frame.notna(), None).to_numpy().tolist()
+
+def test_read_columns_matches_read_excel(workbook):
+    cols = [CAT, "产品名称", "版本", "歌手"]
+    expected = pd.read_excel(workbook, sheet_name=SHEET)[cols]
+    got = read_columns(workbook, SHEET, cols + ["版本详情"])
+    assert list(got.columns) == cols
+    pd.testing.assert_frame_equal(got, expected)
+
+@pytest.mark.parametrize("mode", ["fill-only", "overwrite"])
+def test_merge_matches_legacy_row_loop(workbook, json_dir, mode):
+    index = JsonDirIndex(json_dir)
+    df, missing = update_excel(workbook, SHEET, mode=mode, catalog_col=CAT, commit=False, index=index)
+    legacy, legacy_missing, legacy_updated = _legacy_merge(
+        pd.read_excel(workbook, sheet_name=SHEET), JsonDirIndex(json_dir).load, mode)
+    assert _cells(df[[CAT] + TARGET_COLS]) == _cells(legacy[[CAT] + TARGET_COLS])
+    assert df.attrs["updated"] == legacy_updated
+    pd.testing.assert_frame_equal(missing, legacy_missing)
+    # 中间空行的 NaN 按旧口径变成 "nan"，也记为未命中
+    assert list(missing[CAT]) == ["nan", "NOPE-0001"]
+    # 变化表只记录值真正变了的格
+    for row_index, col, old, new in df.attrs["changes"].itertuples(index=False):
+        assert old != new and df.at[row_index, col] == new
+    assert df.at[1, "产品名称"] == ("手填的名称" if mode == "fill-only" else legacy.at[1, "产品名称"])
+
+def test_db_source_matches_json_dir(workbook, json_dir, snapshot_backend):
+    from_dir, miss_dir = update_excel(workbook, SHEET, catalog_col=CAT, commit=False,
+                                      index=JsonDirIndex(json_dir))
+    from_db, miss_db = update_excel(workbook, SHEET, catalog_col=CAT, commit=False,
+                                    index=DbSource(snapshot_backend, NormalizationContext()))
+    assert _cells(from_db) == _cells(from_dir)
+    pd.testing.assert_frame_equal(miss_db, miss_dir)
+    stored = json.loads(next(json_dir.glob("*～*.json")).read_text(encoding="utf-8"))
+    assert "～" in stored["identifiers"]["catalog_number_compact"]
+
+def test_write_back_touches_only_changed_cells(workbook, json_dir):
+    df, _ = update_excel(workbook, SHEET, catalog_col=CAT, index=JsonDirIndex(json_dir))
+    changes = df.attrs["changes"]
+    assert len(changes) > 0
+
+    wb = load_workbook(workbook)
+    ws = wb[SHEET]
+    header = [c.value for c in ws[1]]
+    assert header == [CAT, "产品名称", "版本", "其他", "歌手", "版本详情", "Barcode"]
+    assert ws["B3"].value == "手填的名称" and ws["C4"].value == 3
+    assert ws["D12"].value == "=LEN(A11)"
+    assert ws["A8"].value is None and ws["B8"].value is None
+    assert wb["其它表"]["A1"].value == "不应被改动"
+    changed = {(r + 2, header.index(col) + 1): new for r, col, _old, new in changes.itertuples(index=False)}
+    for row in ws.iter_rows(min_row=2):
+        for cell in row:
+            if (cell.row, cell.column) in changed:
+                assert cell.value == changed[cell.row, cell.column]
+
+    # 再跑一次：没有要写的格，文件不动
+    mtime = workbook.stat().st_mtime_ns
+    again, _ = update_excel(workbook, SHEET, catalog_col=CAT, index=JsonDirIndex(json_dir))
+    assert again.attrs["changes"].empty
+    assert workbook.stat().st_mtime_ns == mtime
+
+def test_write_back_refuses_formula_targets(workbook, json_dir):
+    wb = load_workbook(workbook)
+    wb[SHEET]["E2"] = '="某歌手"'
+    wb.save(workbook)
+    before = workbook.read_bytes()
+    with pytest.raises(RuntimeError, match="hold formulas"):
+        update_excel(workbook, SHEET, catalog_col=CAT, index=JsonDirIndex(json_dir))
+    assert workbook.read_bytes() == before
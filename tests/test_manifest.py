@@ -0,0 +1,75 @@
+import json
+import sys
+
+from vgmmb.cli import main as mb_lookup
+from vgmmb.manifest import (
+    MANIFEST_NAME,
+    STATUS_ERROR,
+    STATUS_NOT_FOUND,
+    STATUS_OK,
+    STATUS_SCHEMA_ERROR,
+    Manifest,
+)
+
+def _entry(raw, status, output=None):
+    return {"input": raw, "catalog": raw, "status": status, "release": None,
+            "output": str(output) if output else None}
+
+def test_select_modes(tmp_path):
+    done = tmp_path / "A-1.json"
+    done.write_text("{}", encoding="utf-8")
+    path = tmp_path / MANIFEST_NAME
+    m = Manifest(path)
+    m.record([_entry("A-1", STATUS_OK, done), _entry("A-2", STATUS_OK, tmp_path / "gone.json"),
+              _entry("A-3", STATUS_NOT_FOUND), _entry("A-4", STATUS_SCHEMA_ERROR),
+              _entry("A-5", STATUS_ERROR)])
+    m.close()
+    # 中断时写了半行：读回时跳过
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"input": "A-9", "sta')
+
+    m = Manifest(path)
+    raws = ["A-1", "A-2", "A-3", "A-4", "A-5", "A-6"]
+    assert list(m.select(raws)) == raws
+    assert list(m.select(raws, resume=True)) == ["A-2", "A-5", "A-6"]
+    assert list(m.select(raws, retry_failed=True)) == ["A-3", "A-4", "A-5"]
+    assert list(m.select(raws, resume=True, retry_failed=True)) == ["A-2", "A-3", "A-4", "A-5", "A-6"]
+    # 同一输入以最后一行为准
+    m.record([_entry("A-3", STATUS_OK, done)])
+    m.close()
+    assert list(Manifest(path).select(raws, retry_failed=True)) == ["A-4", "A-5"]
+
+def _run(monkeypatch, snapshot, *args):
+    monkeypatch.setattr(sys, "argv", ["mb-lookup", "--backend", f"snapshot:{snapshot}", *map(str, args)])
+    mb_lookup()
+
+def _manifest(out):
+    lines = (out / MANIFEST_NAME).read_text(encoding="utf-8").splitlines()
+    return [json.loads(line) for line in lines]
+
+def test_batch_resume_and_retry(monkeypatch, tmp_path, synth_snapshot, catalog_numbers):
+    snapshot = synth_snapshot[1]
+    inputs = catalog_numbers[:8] + ["NOPE-1"]
+    listing = tmp_path / "in.txt"
+    listing.write_text("\n".join(inputs) + "\n", encoding="utf-8")
+    out = tmp_path / "out"
+
+    _run(monkeypatch, snapshot, "--batch", f"file={listing}", "--out", out)
+    first = _manifest(out)
+    assert [e["input"] for e in first] == inputs
+    assert [e["status"] for e in first] == [STATUS_OK] * 8 + [STATUS_NOT_FOUND]
+    assert all((out / f"{c}.json").exists() for c in inputs[:8])
+
+    # --resume：全部处于终态，不再处理任何输入
+    _run(monkeypatch, snapshot, "--batch", f"file={listing}", "--out", out, "--resume")
+    assert len(_manifest(out)) == len(first)
+
+    # 输出文件被删：--resume 只重跑这一条
+    (out / f"{inputs[3]}.json").unlink()
+    _run(monkeypatch, snapshot, "--batch", f"file={listing}", "--out", out, "--resume")
+    assert [e["input"] for e in _manifest(out)[len(first):]] == [inputs[3]]
+    assert (out / f"{inputs[3]}.json").exists()
+
+    # --retry-failed：只重跑未命中的
+    _run(monkeypatch, snapshot, "--batch", f"file={listing}", "--out", out, "--retry-failed")
+    assert [e["input"] for e in _manifest(out)[len(first) + 1:]] == ["NOPE-1"]
@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from vgmmb.catalog import match_key
+from vgmmb.memo import LruDict, RunMemo
+from vgmmb.normalizer import NormalizationContext
+
+class _Query:
+    """记录每次批量查询；gate 给出时第一次查询会停在那里，用来制造并发的同一品番。"""
+
+    def __init__(self, gate=None, fail=False):
+        self.calls = []
+        self.gate = gate
+        self.fail = fail
+        self.started = threading.Event()
+
+    def __call__(self, catalogs, releases=None):
+        self.calls.append(list(catalogs))
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("db down")
+        return {c: ({"release_id": len(c)}, [], [], None) for c in catalogs}
+
+def test_equivalent_spellings_share_one_query():
+    query = _Query()
+    memo = RunMemo(query, NormalizationContext())
+    found = memo.lookup(["SECL-1193", "secl1193", "ＳＥＣＬ－１１９３", "KICA-1"])
+    assert query.calls == [["SECL-1193", "KICA-1"]]
+    assert found["secl1193"] is found["SECL-1193"] is found["ＳＥＣＬ－１１９３"]
+    memo.lookup(["SECL1193", "KICA-1"])
+    assert len(query.calls) == 1
+
+def test_ilike_key_keeps_hyphen_variants_apart():
+    query = _Query()
+    memo = RunMemo(query, NormalizationContext(), key=lambda c: match_key(c, keyed=False))
+    memo.lookup(["SECL-1193", "secl-1193", "SECL1193"])
+    assert query.calls == [["SECL-1193", "SECL1193"]]
+
+def test_concurrent_lookups_wait_for_the_query_in_flight():
+    gate = threading.Event()
+    query = _Query(gate=gate)
+    memo = RunMemo(query, NormalizationContext())
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault("a", memo.lookup(["SECL-1"])))
+    first.start()
+    assert query.started.wait(5)
+    second = threading.Thread(target=lambda: results.setdefault("b", memo.lookup(["secl1", "KICA-2"])))
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()  # 在等第一个线程的查询
+    gate.set()
+    first.join(5)
+    second.join(5)
+    assert query.calls == [["SECL-1"], ["KICA-2"]]
+    assert results["a"]["SECL-1"] is results["b"]["secl1"]
+
+def test_failed_query_is_not_remembered():
+    query = _Query(fail=True)
+    memo = RunMemo(query, NormalizationContext())
+    with pytest.raises(RuntimeError):
+        memo.lookup(["SECL-1"])
+    query.fail = False
+    assert memo.lookup(["SECL-1"])["SECL-1"][0] == {"release_id": 6}
+    assert len(query.calls) == 2
+
+def test_result_table_is_bounded():
+    query = _Query()
+    memo = RunMemo(query, NormalizationContext(), max_entries=3)
+    memo.lookup([f"SECL-{i}" for i in range(10)])
+    # 在途的查询不淘汰：超出的部分在下一次 lookup 时按 LRU 清掉
+    memo.lookup(["SECL-9"])
+    assert len(memo) == 3
+    assert len(query.calls) == 1
+    memo.lookup(["SECL-0"])
+    assert query.calls[-1] == ["SECL-0"]
+
+def test_lru_dict_evicts_least_recently_used():
+    lru = LruDict(2)
+    lru["a"], lru["b"] = 1, 2
+    assert lru.get("a") == 1
+    lru["c"] = 3
+    assert "b" not in lru and lru.get("a") == 1 and len(lru) == 2
+
+def test_matches_backend_and_normalizes_once(snapshot_backend, catalog_numbers):
+    sample = catalog_numbers[:40] + [c.lower() for c in catalog_numbers[:10]] + ["NOPE-1"]
+    calls = []
+
+    def query_many(catalogs, releases=None):
+        calls.append(len(catalogs))
+        return snapshot_backend.query_by_catalogs(catalogs, releases=releases)
+
+    memo = RunMemo(query_many, NormalizationContext(), key=snapshot_backend.match_key)
+    found = memo.lookup(sample)
+    direct = snapshot_backend.query_by_catalogs(sample)
+    assert found == direct
+    assert calls == [41]
+
+    best, artists, tracks, cover = found[catalog_numbers[0]]
+    first = memo.normalize(best, artists, tracks, cover=cover)
+    first["identifiers"]["catalog_number_compact"] = "changed"
+    again = memo.normalize(best, artists, tracks, cover=cover)
+    assert again["identifiers"].get("catalog_number_compact") != "changed"
+    assert again["title"] is first["title"]  # 同一份 normalize 结果
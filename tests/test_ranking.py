@@ -0,0 +1,61 @@
+import os
+import random
+from datetime import date
+
+import pytest
+
+from vgmmb.queries import _best_release, _rank_key, _rank_release
+
+def _rows(rng, n):
+    # 分数取值很少（JP / official / 少数几个年份），同分的行很多；同一 release 下再放多个 label / 品番
+    rows = []
+    for _ in range(n):
+        rows.append({
+            "is_jp": rng.random() < 0.5,
+            "release_status": rng.choice([1, 2, None]),
+            "release_date": rng.choice([None, date(1999, 1, 1), date(1999, 12, 31), date(2005, 6, 1)]),
+            "release_id": rng.randrange(1, 6),
+            "label_id": rng.randrange(1, 4),
+            "catalog_number": rng.choice(["SECL-1", "SECL-2", "secl-1"]),
+        })
+    return rows
+
+def test_rank_key_orders_by_rank_release():
+    rng = random.Random(19)
+    for _ in range(500):
+        rows = _rows(rng, rng.randrange(1, 12))
+        by_key = sorted(rows, key=_rank_key)
+        by_score = sorted(rows, key=_rank_release, reverse=True)
+        assert [_rank_release(r) for r in by_key] == [_rank_release(r) for r in by_score]
+        # 同分时按 release / label / 品番（码位序）取第一条，与输入顺序无关
+        top = [r for r in rows if _rank_release(r) == _rank_release(by_score[0])]
+        want = min(top, key=lambda r: (r["release_id"], r["label_id"], r["catalog_number"]))
+        assert _best_release(rows) == want
+        rng.shuffle(rows)
+        assert _best_release(rows) == want
+
+@pytest.mark.skipif(not os.getenv("MB_DBNAME"), reason="needs a MusicBrainz Postgres (MB_DBNAME)")
+def test_sql_ranking_matches_best_release():
+    from vgmmb.db import connect, dict_cursor
+    from vgmmb.queries import SQL_MAIN_BULK, SQL_MAIN_CANDIDATES_BULK
+
+    conn = connect()
+    try:
+        cur = dict_cursor(conn)
+        # 只挑有多个候选行的品番：单候选的比较不出排序差异
+        cur.execute("SELECT catalog_number FROM musicbrainz.release_label WHERE catalog_number IS NOT NULL "
+                    "GROUP BY catalog_number HAVING count(*) > 1 ORDER BY catalog_number LIMIT 2000")
+        sample = [r["catalog_number"] for r in cur.fetchall()]
+        if not sample:
+            pytest.skip("no catalog number with multiple candidates")
+        cur.execute(SQL_MAIN_CANDIDATES_BULK, (sample,))
+        candidates = {}
+        for row in cur.fetchall():
+            candidates.setdefault(row.pop("query_catalog"), []).append(row)
+        cur.execute(SQL_MAIN_BULK, (sample,))
+        ranked = {row.pop("query_catalog"): row for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+    mismatches = [cat for cat in sample if ranked.get(cat) != _best_release(candidates[cat])]
+    assert not mismatches, mismatches[:10]
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from vgmmb.catalog import catalog_key
+from vgmmb.suggest import CatalogIndex, Suggester, edit_distance, format_suggestions
+
+@pytest.mark.parametrize("a, b, d", [
+    ("SECL1193", "SECL1193", 0),
+    ("SECL1193", "SECL1139", 1),     # 相邻换位
+    ("SECL1193", "SECL193", 1),
+    ("SECL1193", "SECLI193", 0.5),   # 易混字符 I/1
+    ("SVWC7035", "SVWC7O35", 0.5),   # O/0
+    ("SECL1193", "KICA1193", 3),
+])
+def test_edit_distance(a, b, d):
+    assert edit_distance(a, b) == d
+    assert edit_distance(b, a) == d
+
+def test_edit_distance_stops_past_limit():
+    assert edit_distance("SECL1193", "KICA2204", limit=1) > 1
+
+def _typo(rng, key):
+    i = rng.randrange(4, len(key) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return key[:i] + key[i + 1] + key[i] + key[i + 2:]
+    if kind == 1:
+        return key[:i] + key[i + 1:]
+    return key[:i] + rng.choice("0123456789") + key[i + 1:]
+
+def test_suggest_matches_brute_force(catalog_numbers):
+    index = CatalogIndex(catalog_numbers)
+    keys = {catalog_key(c) for c in catalog_numbers}
+    rng = random.Random(11)
+    for cat in rng.sample(catalog_numbers, 100):
+        query = _typo(rng, catalog_key(cat))
+        # 候选截断不应漏掉距离内的品番：与全量暴力比较
+        got = index.suggest(query, limit=len(keys), max_distance=1)
+        brute = sorted((d, k) for k in keys if (d := edit_distance(query, k, 1)) <= 1)
+        assert sorted((d, catalog_key(c)) for c, d in got) == brute, query
+        assert catalog_key(cat) in {catalog_key(c) for c, _ in got}
+        # 默认 max_distance=2：前几名里距离 <= 1 的部分与暴力结果一致
+        top = index.suggest(query, limit=3)
+        assert [d for _, d in top if d <= 1] == [d for d, _ in brute[:3]]
+
+def test_suggest_edge_cases():
+    index = CatalogIndex(["SECL-1193", "secl1193", "KICA-1"])
+    assert len(index) == 2       # 同一键只收第一个写法
+    assert index.suggest("") == []
+    assert index.suggest("SECL-1193") == [("SECL-1193", 0.0)]
+    assert index.suggest("ZZZZ-9999") == []
+    assert format_suggestions([("SECL-1193", 0.5), ("KICA-1", 1.0)]) == "SECL-1193 (d=0.5), KICA-1 (d=1)"
+
+class _Backend:
+    def __init__(self, catalogs, seq=7):
+        self.catalogs, self.seq, self.iterated = catalogs, seq, 0
+
+    def replication_sequence(self):
+        return self.seq
+
+    def iter_catalog_numbers(self):
+        self.iterated += 1
+        return iter(self.catalogs)
+
+def test_suggester_persists_and_rebuilds(tmp_path):
+    path = tmp_path / "idx.pkl.gz"
+    backend = _Backend(["SECL-1193", "KICA-1"])
+    assert Suggester(backend, path, source="a")("SECL1139") == [("SECL-1193", 1.0)]
+    assert path.exists() and backend.iterated == 1
+
+    # 同一数据源、同一序号：直接载入
+    assert Suggester(backend, path, source="a").index.catalogs == ["SECL-1193", "KICA-1"]
+    assert backend.iterated == 1
+
+    assert len(Suggester(backend, path, source="b").index) == 2  # 数据源不同：重建
+    assert backend.iterated == 2
+    backend.seq = 8
+    backend.catalogs = ["VTCL-1"]
+    assert Suggester(backend, path, source="b").index.catalogs == ["VTCL-1"]
+    assert backend.iterated == 3
+
+    # 损坏的索引文件当作不存在
+    path.write_bytes(b"not gzip")
+    assert len(Suggester(backend, path, source="b").index) == 1
+    assert backend.iterated == 4
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from .catalog import match_key
+from .db import close_pool, get_dsn
+from .queries import (
+    DEFAULT_CHUNK_SIZE,
+    current_replication_sequence,
+    iter_catalog_numbers,
+    keyed_match,
+    query_by_catalogs,
+    stale_inputs,
+)
+
+class PostgresBackend:
+    """本地 MusicBrainz Postgres 镜像（默认后端），走进程级连接池。"""
+
+    name = "postgres"
+
+    @property
+    def cache_source(self) -> str:
+        # 本地缓存按数据源分文件：不同的库（如基准测试库与正式镜像）互不串用
+        dsn = get_dsn()
+        return f"postgres://{dsn['host']}:{dsn['port']}/{dsn['dbname']}"
+
+    # 镜像的变化已由复制序号表达
+    cache_generation = ""
+
+    def query_by_catalogs(self, catalogs, with_cover: bool = False,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE, releases=None) -> dict:
+        return query_by_catalogs(catalogs, with_cover=with_cover, chunk_size=chunk_size, releases=releases)
+
+    def replication_sequence(self):
+        return current_replication_sequence()
+
+    def iter_catalog_numbers(self):
+        return iter_catalog_numbers()
+
+    def match_mode(self) -> str:
+        # "key"：归一化键匹配（已执行 mb-index install）；"ilike"：回退匹配，连字符有区别
+        return "key" if keyed_match() else "ilike"
+
+    def match_key(self, catalog: str) -> str:
+        return match_key(catalog, keyed_match())
+
+    def stale_inputs(self, items) -> set:
+        # 仅 Postgres 后端提供：快照里没有 last_updated
+        return stale_inputs(items)
+
+    def close(self):
+        close_pool()
+
+def open_backend(spec: str | None):
+    """
+    --backend 取值：
+      postgres（默认）       本地 MB 镜像
+      snapshot:PATH          mb-snapshot build 生成的离线 SQLite 快照
+    """
+    if not spec or spec == "postgres":
+        return PostgresBackend()
+    if spec.startswith("snapshot:"):
+        from .snapshot import SnapshotBackend
+        return SnapshotBackend(Path(spec.split(":", 1)[1]))
+    raise ValueError(f"unknown backend: {spec!r} (expected 'postgres' or 'snapshot:PATH')")
@@ -0,0 +1,65 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """惰性切块：不把整个输入读进内存。"""
+    it = iter(items)
+    size = max(1, size)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def spread_chunks(items: Iterable[T], size: int, workers: int = 1) -> Iterator[list[T]]:
+    """
+    与 chunked 相同，但每次预读 size*workers 条：凑不满时（输入末尾 / 整个输入不到 workers 块）
+    把这部分均分成至多 workers 块（每块仍不超过 size），小输入也能让 --workers 并行起来。
+    """
+    if workers <= 1:
+        yield from chunked(items, size)
+        return
+    it = iter(items)
+    size = max(1, size)
+    window = size * workers
+    while True:
+        buf = list(islice(it, window))
+        if len(buf) == window:
+            for i in range(0, window, size):
+                yield buf[i:i + size]
+            continue
+        n = len(buf)
+        pieces = min(workers, n)
+        for k in range(pieces):
+            yield buf[k * n // pieces:(k + 1) * n // pieces]
+        return
+
+def ordered_map(fn: Callable[[T], R], items: Iterable[T], workers: int = 1,
+                max_pending: int | None = None) -> Iterator[R]:
+    """
+    用线程池并发执行 fn(item)，按输入顺序逐个产出结果。
+      - workers <= 1 时在当前线程内顺序执行（同一套调用路径）
+      - 同时在途的 item 不超过 max_pending（默认 workers*2），输入端有界
+    fn 自己负责逐条错误处理；这里抛出的异常会原样传给调用方。
+    """
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    max_pending = max_pending or workers * 2
+    it = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vgmmb-batch") as ex:
+        for item in islice(it, max_pending):
+            pending.append(ex.submit(fn, item))
+        while pending:
+            result = pending.popleft().result()
+            for item in islice(it, 1):
+                pending.append(ex.submit(fn, item))
+            yield result
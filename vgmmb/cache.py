@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+from .catalog import match_key
+
+# 缓存默认位置 / 上限；均可由环境变量或 CLI 覆盖
+DEFAULT_CACHE_DIR = Path(os.getenv("VGMMB_CACHE_DIR", Path.home() / ".cache" / "vgmmb"))
+DEFAULT_MAX_AGE_SECS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 复制序号的复查间隔：在此时间内认为镜像未变化，不再查询序号（匹配口径仍每次核对）
+DEFAULT_SEQ_TTL_SECS = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lookup (
+  catalog_key  TEXT    NOT NULL,
+  with_cover   INTEGER NOT NULL,
+  seq          INTEGER NOT NULL,
+  payload      TEXT,
+  size         INTEGER NOT NULL,
+  created_at   REAL    NOT NULL,
+  last_access  REAL    NOT NULL,
+  PRIMARY KEY (catalog_key, with_cover)
+);
+CREATE INDEX IF NOT EXISTS lookup_last_access ON lookup(last_access);
+CREATE TABLE IF NOT EXISTS meta (
+  key   TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+"""
+
+def cover_mode(with_cover) -> int:
+    # 缓存键中的封面口径：0 不取 / 1 最优一张 / 2 全部图片（with_cover == queries.COVER_ALL）
+    return 2 if with_cover == "all" else int(bool(with_cover))
+
+def _encode(obj):
+    if isinstance(obj, datetime):
+        return {"__datetime__": obj.isoformat()}
+    if isinstance(obj, date):
+        return {"__date__": obj.isoformat()}
+    return str(obj)
+
+def _decode(d):
+    if "__date__" in d and len(d) == 1:
+        return date.fromisoformat(d["__date__"])
+    if "__datetime__" in d and len(d) == 1:
+        return datetime.fromisoformat(d["__datetime__"])
+    return d
+
+class LookupCache:
+    """
+    查询结果（best, artists, tracks, cover）的本地 SQLite 缓存。
+    键 = 品番（按后端的匹配口径归一化，见 catalog.match_key）+ with_cover；
+    每条记录带写入时的镜像 replication 序号，序号前进或匹配口径变化时整库失效。未命中（NOT FOUND）同样缓存。
+    每个数据源（source，如某个 Postgres 库 / 某个快照文件）一个缓存文件；
+    generation（快照的构建时间）变化时整库失效。
+    """
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_age: float = DEFAULT_MAX_AGE_SECS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, seq_ttl: float = DEFAULT_SEQ_TTL_SECS,
+                 source: str = "postgres", generation: str = ""):
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+        self.path = cache_dir / f"lookup-{digest}.sqlite"
+        self.source = source
+        self.generation = generation
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.seq_ttl = seq_ttl
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._seq = None
+        self._keyed = True
+
+    def key(self, catalog: str) -> str:
+        return match_key(catalog, self._keyed)
+
+    # —— replication 序号 ——
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, str(value)))
+
+    def sync_sequence(self, fetch_sequence, fetch_match_mode=None) -> int:
+        """
+        确认镜像当前序号与匹配口径（fetch_match_mode() -> "key" / "ilike"，省略为 "key"）。
+        匹配口径每次都核对（MB_CATALOG_MATCH、mb-index install / drop 随时可能改变它）；
+        序号距上次确认不足 seq_ttl 且口径未变时直接沿用。
+        序号变化时清空旧序号的记录；口径变化时键的含义变了，清空全部记录。
+        fetch_sequence 返回 None 时按 -1 处理。
+        """
+        match = fetch_match_mode() if fetch_match_mode is not None else "key"
+        with self._lock:
+            checked_at = float(self._meta("seq_checked_at") or 0)
+            known = self._meta("seq")
+            known_match = self._meta("match")
+            known_generation = self._meta("generation") or ""
+            if (known is not None and known_match == match and known_generation == self.generation
+                    and time.time() - checked_at < self.seq_ttl):
+                self._seq = int(known)
+                self._keyed = match == "key"
+                return self._seq
+        seq = fetch_sequence()
+        seq = -1 if seq is None else int(seq)
+        with self._lock:
+            if known is not None and (known_match != match or known_generation != self.generation):
+                cur = self._db.execute("DELETE FROM lookup")
+                self.stats["invalidated"] += cur.rowcount
+            elif known is not None and int(known) != seq:
+                cur = self._db.execute("DELETE FROM lookup WHERE seq != ?", (seq,))
+                self.stats["invalidated"] += cur.rowcount
+            self._set_meta("seq", seq)
+            self._set_meta("match", match)
+            self._set_meta("source", self.source)
+            self._set_meta("generation", self.generation)
+            self._set_meta("seq_checked_at", time.time())
+            self._seq = seq
+            self._keyed = match == "key"
+        return seq
+
+    # —— 读写 ——
+    def get_many(self, catalogs, with_cover: bool) -> dict:
+        """返回 {catalog: (best, artists, tracks, cover)}，仅包含命中的条目。"""
+        now = time.time()
+        hits = {}
+        with self._lock:
+            for cat in catalogs:
+                row = self._db.execute(
+                    "SELECT payload, created_at FROM lookup "
+                    "WHERE catalog_key = ? AND with_cover = ? AND seq = ?",
+                    (self.key(cat), cover_mode(with_cover), self._seq),
+                ).fetchone()
+                if row is None or now - row[1] > self.max_age:
+                    self.stats["misses"] += 1
+                    continue
+                payload = json.loads(row[0], object_hook=_decode) if row[0] else None
+                hits[cat] = tuple(payload) if payload else (None, None, None, None)
+                self.stats["hits"] += 1
+            if hits:
+                self._db.executemany(
+                    "UPDATE lookup SET last_access = ? WHERE catalog_key = ? AND with_cover = ?",
+                    [(now, self.key(c), cover_mode(with_cover)) for c in hits],
+                )
+        return hits
+
+    def put_many(self, found: dict, with_cover: bool):
+        now = time.time()
+        rows = []
+        for cat, result in found.items():
+            payload = json.dumps(list(result), default=_encode, ensure_ascii=False) if result[0] else None
+            rows.append((self.key(cat), cover_mode(with_cover), self._seq, payload,
+                         len(payload or ""), now, now))
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO lookup VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self.stats["stored"] += len(rows)
+
+    def evict(self):
+        """按年龄 + 总大小（LRU）淘汰。"""
+        with self._lock:
+            cur = self._db.execute("DELETE FROM lookup WHERE created_at < ?",
+                                   (time.time() - self.max_age,))
+            self.stats["evicted"] += cur.rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM lookup").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - self.max_bytes
+            freed = 0
+            victims = []
+            for key, cover, size in self._db.execute(
+                    "SELECT catalog_key, with_cover, size FROM lookup ORDER BY last_access"):
+                victims.append((key, cover))
+                freed += size
+                if freed >= excess:
+                    break
+            self._db.executemany("DELETE FROM lookup WHERE catalog_key = ? AND with_cover = ?", victims)
+            self.stats["evicted"] += len(victims)
+
+    def summary(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM lookup").fetchone()
+        return {**self.stats, "entries": entries, "bytes": size, "seq": self._seq, "source": self.source,
+                "path": str(self.path)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def cached_query_by_catalogs(cache: LookupCache, query_many, catalogs, with_cover: bool, **kwargs) -> dict:
+    """先查缓存，只把未命中的 catalog 交给 query_many（如 queries.query_by_catalogs）。"""
+    found = cache.get_many(catalogs, with_cover)
+    missing = [c for c in dict.fromkeys(catalogs) if c not in found]
+    if missing:
+        fresh = query_many(missing, with_cover=with_cover, **kwargs)
+        cache.put_many(fresh, with_cover)
+        found.update(fresh)
+    return found
@@ -0,0 +1,173 @@
+import re
+import unicodedata
+from typing import NamedTuple
+
+# 品番比较时忽略的分隔符：空白与各种连字符（全角 － 经 NFKC 后即为 -）
+_KEY_STRIP_CLASS = "‐‑‒–—―−-"
+_KEY_STRIP_RE = re.compile(rf"[\s{_KEY_STRIP_CLASS}]+")
+
+# 与 catalog_key() 等价的 SQL 表达式（%s 处为被归一化的列或参数）
+SQL_CATALOG_KEY_EXPR = f"upper(regexp_replace(normalize(%s, NFKC), '[[:space:]{_KEY_STRIP_CLASS}]+', '', 'g'))"
+
+def catalog_key(catalog: str | None) -> str:
+    """
+    品番归一化键：NFKC（全角→半角）+ 大写 + 去掉空白/连字符。
+    'secl-1193' / 'SECL1193' / 'ＳＥＣＬ－１１９３' -> 'SECL1193'
+    必须与 mb-index 安装的 SQL 函数 vgmmb_catalog_key() 保持一致。
+    """
+    s = unicodedata.normalize("NFKC", catalog or "")
+    return _KEY_STRIP_RE.sub("", s).upper()
+
+def match_key(catalog: str | None, keyed: bool = True) -> str:
+    """
+    判断两条输入是否必然查到同一结果的键，须与数据库的匹配口径一致：
+    归一化键匹配（mb-index 已安装 / 快照）用 catalog_key；ILIKE 回退只忽略大小写，
+    'SECL1193' 与 'SECL-1193' 可能得到不同结果，不能合并。
+    """
+    return catalog_key(catalog) if keyed else (catalog or "").strip().upper()
+
+# —— 品番的解析 / 区间展开 / 合并 ——
+# 品番：前缀（可带连字符）+ 数字（保留宽度 / 前导 0）+ 可选尾字母，如 SECL-2409、KICA-0001、VTCL-60123A
+CAT_RE = re.compile(r"^([A-Za-z0-9]+-?)(\d+)([A-Za-z]?)$")
+CAT_RANGE_SEPS = "~～〜"
+CAT_RANGE_RE = re.compile(rf"^([A-Za-z0-9]+-?)(\d+)\s*[{CAT_RANGE_SEPS}]\s*(\d+)([A-Za-z]?)$")
+_RANGE_SEP_RE = re.compile(rf"[{CAT_RANGE_SEPS}]")
+
+class CatalogNumber(NamedTuple):
+    prefix: str
+    num: int
+    width: int
+    tail: str
+
+    def __str__(self):
+        return f"{self.prefix}{self.num:0{self.width}d}{self.tail}"
+
+class CatalogRange(NamedTuple):
+    """区间 'SECL-2409~13'：尾号缩写已按起始号补齐高位；end < start 时视为只有首号。"""
+    prefix: str
+    start: int
+    end: int
+    width: int
+    tail: str
+
+    @property
+    def first(self) -> str:
+        return f"{self.prefix}{self.start:0{self.width}d}{self.tail}"
+
+    def members(self) -> list[str]:
+        p, w, t = self.prefix, self.width, self.tail
+        return [f"{p}{n:0{w}d}{t}" for n in range(self.start, self.end + 1)]
+
+def parse_catalog(catalog: str | None) -> CatalogNumber | None:
+    m = CAT_RE.match((catalog or "").strip())
+    if not m:
+        return None
+    prefix, num_str, tail = m.groups()
+    return CatalogNumber(prefix, int(num_str), len(num_str), tail)
+
+def parse_catalog_range(catalog: str | None) -> CatalogRange | None:
+    m = CAT_RANGE_RE.match((catalog or "").strip())
+    if not m:
+        return None
+    prefix, start_str, end_str, tail = m.groups()
+    width = len(start_str)  # 保持前导 0
+    if len(end_str) < width:
+        end_str = start_str[:width - len(end_str)] + end_str
+    start, end = int(start_str), int(end_str)
+    return CatalogRange(prefix, start, max(start, end), width, tail)
+
+def is_catalog_range(s: str | None) -> bool:
+    return bool(s and CAT_RANGE_RE.match(s.strip()))
+
+def first_from_catalog_range(cat: str | None) -> str:
+    """
+    'VVCL-1583~4' -> 'VVCL-1583'
+    'KICA-0001~0003' -> 'KICA-0001'
+    不合品番格式但含区间符时取符号前的部分（'ABC-1 ~ XYZ' -> 'ABC-1'）；其它原样（去首尾空白）返回
+    """
+    c = (cat or "").strip()
+    rng = parse_catalog_range(c)
+    if rng is not None:
+        return rng.first
+    head = _RANGE_SEP_RE.split(c, 1)
+    return head[0].rstrip() if len(head) > 1 else c
+
+def expand_catalog_range(cat: str | None) -> list[str]:
+    """
+    'SECL-2409~13'   -> ['SECL-2409', 'SECL-2410', ..., 'SECL-2413']
+    'VVCL-1583~4'    -> ['VVCL-1583', 'VVCL-1584']      （尾号缩写按起始号补齐高位）
+    保持数字宽度与尾字母；非区间时返回 [原值]，end < start 时只返回首号。
+    """
+    c = (cat or "").strip()
+    rng = parse_catalog_range(c)
+    if rng is None:
+        return [c] if c else []
+    return rng.members()
+
+def first_from_catalog_ranges(catalogs) -> list[str]:
+    return [first_from_catalog_range(c) for c in catalogs]
+
+def expand_catalog_ranges(catalogs) -> list[str]:
+    """逐条展开后按输入顺序拼接（去重，保留第一次出现的位置）。"""
+    out = {}
+    for c in catalogs:
+        for m in expand_catalog_range(c):
+            out.setdefault(m, None)
+    return list(out)
+
+def catalog_keys(catalogs) -> list[str]:
+    return [catalog_key(c) for c in catalogs]
+
+def compact_catalog_numbers(catalog_numbers) -> str | None:
+    """
+    ['SVWC-7853','SVWC-7854','SVWC-7855','KSLA-0012','KSLA-0013'] -> 'KSLA-0012~3, SVWC-7853~5'
+    规则:
+      - 仅对同 (prefix, width, tail) 分组内做连续合并；尾字母必须一致，保留数字宽度
+      - 多点范围只写出与起始号不同的尾部（SVWC-70359~60）；单点原样写出
+      - 无法解析的品番按输入顺序附在末尾
+    按组收集编号、排序后一次扫描切段；10 万条在一秒内完成。
+    """
+    if not catalog_numbers:
+        return None
+
+    groups = {}     # (prefix, width, tail) -> [数字串]
+    leftovers = []  # 解析失败的原样保留
+    match = CAT_RE.match
+    for code in catalog_numbers:
+        code = code.strip()
+        m = match(code)
+        if m is None:
+            leftovers.append(code)
+            continue
+        prefix, num_str, tail = m.groups()
+        key = (prefix, len(num_str), tail)
+        bucket = groups.get(key)
+        if bucket is None:
+            bucket = groups[key] = []
+        bucket.append(num_str)
+
+    chunks = []
+    for key in sorted(groups):
+        prefix, width, tail = key
+        nums = sorted(set(map(int, groups[key])))
+        start = prev = nums[0]
+        for cur in nums[1:] + [None]:
+            if cur is not None and cur == prev + 1:
+                prev = cur
+                continue
+            s = f"{start:0{width}d}"
+            if start == prev:
+                chunks.append(f"{prefix}{s}{tail}")
+            else:
+                e = f"{prev:0{width}d}"
+                chunks.append(f"{prefix}{s}~{e[_lcp(s, e):]}{tail}")
+            start = prev = cur
+    return ", ".join(chunks + leftovers)
+
+def _lcp(a: str, b: str) -> int:
+    """longest common prefix length for two strings"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
@@ -1,35 +1,95 @@
 import argparse
+import os
+import sys
 from pathlib import Path
-from importlib import resources
 
+from . import metrics
+from .backend import open_backend
+from .batch import ordered_map, spread_chunks
+from .cache import DEFAULT_CACHE_DIR, LookupCache, cached_query_by_catalogs
+from .catalog import first_from_catalog_range
+from .db import configure_pool
+from .io import NdjsonWriter, read_lines, resolve_pkg_file, write_json
 from .log import setup_logging
-from .queries import query_by_catalog
-from .normalizer import normalize_record, load_label_alias
+from .manifest import MANIFEST_NAME, Manifest
+from .memo import RunMemo
+from .normalizer import NormalizationContext, build_range_resolution, normalize_record
+from .pipeline import process_chunk, range_members, safe_basename
+from .queries import COVER_ALL, DEFAULT_CHUNK_SIZE
+from .refresh import DEFAULT_MARGIN_HOURS, REFRESH_SOURCES, load_items, select_stale
 from .schema import load_schema, validate
-from .io import write_json, read_lines, first_from_catalog_range, is_catalog_range
-import re
-
-def _safe_basename(name: str) -> str:
-    n = (name or "").strip()
-    # 过滤 Windows 非法字符 \/:*?"<>|，以及尾部空格/点
-    n = re.sub(r'[\\/:*?"<>|]+', "_", n)
-    return n.rstrip(" .")
-
-def _resolve_pkg_file(relpath: str) -> str:
-    # relpath 例如 "data/schemas/mb-album-v1.json"
-    with resources.as_file(resources.files("vgmmb").joinpath(relpath)) as p:
-        return str(p)
-
-def _one(catalog: str, args, schema, label_alias_map):
-    best, artists, tracks, cover = query_by_catalog(catalog, with_cover=args.with_cover)
+from .suggest import INDEX_NAME, Suggester, format_suggestions
+
+def _open_backend(args):
+    try:
+        return open_backend(args.backend)
+    except (ValueError, FileNotFoundError) as ex:
+        raise SystemExit(f"[BACKEND ERROR] {ex}") from None
+
+def _make_lookup(args, backend):
+    """返回 (lookup, cache)：lookup(catalogs) -> {catalog: (best, artists, tracks, cover)}。"""
+    def lookup(catalogs, releases=None):
+        return backend.query_by_catalogs(catalogs, with_cover=args.with_cover, chunk_size=args.chunk_size,
+                                         releases=releases)
+
+    if not args.cache:
+        return lookup, None
+    cache = LookupCache(Path(args.cache_dir) if args.cache_dir else DEFAULT_CACHE_DIR,
+                        source=backend.cache_source, generation=backend.cache_generation)
+    cache.sync_sequence(backend.replication_sequence, backend.match_mode)
+
+    def cached_lookup(catalogs, releases=None):
+        return cached_query_by_catalogs(cache, backend.query_by_catalogs, catalogs, args.with_cover,
+                                        chunk_size=args.chunk_size, releases=releases)
+    return cached_lookup, cache
+
+def _make_suggester(args, backend):
+    # --suggest：未命中时给出近似品番；索引第一次用到时才加载 / 构建
+    if not args.suggest:
+        return None
+    cache_dir = Path(args.cache_dir) if args.cache_dir else DEFAULT_CACHE_DIR
+    return Suggester(backend, cache_dir / INDEX_NAME, source=args.backend)
+
+def _finish(args, backend, cache):
+    backend.close()
+    if cache is not None:
+        cache.evict()
+        if args.cache_stats:
+            _print_cache_stats(cache, _status_stream(args))
+        cache.close()
+    reg = metrics.registry()
+    if reg is not None:
+        if args.profile:
+            print("[PROFILE]\n" + metrics.format_summary(reg), file=sys.stderr)
+        if args.metrics_file:
+            metrics.write_prometheus(reg, Path(args.metrics_file))
+
+def _status_stream(args):
+    # 记录写 stdout（NDJSON 且 --out 省略或为 -）时，状态行改走 stderr，避免污染数据流
+    if args.format == "ndjson" and (args.out or "-") == "-":
+        return sys.stderr
+    return sys.stdout
+
+def _print_cache_stats(cache, stream=None):
+    stats = cache.summary()
+    print("[CACHE] " + " ".join(f"{k}={v}" for k, v in stats.items()), file=stream or sys.stdout)
+
+def _one(catalog: str, args, schema, ctx, lookup, suggest=None):
+    input_cat = (args.catalog or catalog).strip()
+    members = range_members(input_cat, args)
+    found = lookup([catalog] + (members or []))
+    best, artists, tracks, cover = found.get(catalog, (None, None, None, None))
     if not best:
+        if suggest is not None:
+            print(f"[SUGGEST] {catalog} -> {format_suggestions(suggest(catalog)) or '-'}")
         raise SystemExit(f"[NOT FOUND] {catalog}")
 
-    out = normalize_record(best, artists, tracks, label_alias_map, cover=cover)
+    out = normalize_record(best, artists, tracks, ctx, cover=cover)
 
     # ✅ 无论是否区间，记录“用户输入的 catalog”到 JSON
-    input_cat = (args.catalog or catalog).strip()
     out.setdefault("identifiers", {})["catalog_number_compact"] = input_cat
+    if members:
+        out["range_resolution"] = build_range_resolution(input_cat, members, best, found)
 
     if args.validate:
         errors = validate(out, schema)
@@ -42,11 +102,11 @@ def _one(catalog: str, args, schema, label_alias_map):
     if args.out:
         pout = Path(args.out)
         if pout.exists() and pout.is_dir():
-            outfile = pout / f"{_safe_basename(input_cat)}.json"
+            outfile = pout / f"{safe_basename(input_cat)}.json"
         else:
             outfile = pout  # 用户明确给了文件名，尊重
     else:
-        outfile = Path(f"{_safe_basename(input_cat)}.json")
+        outfile = Path(f"{safe_basename(input_cat)}.json")
 
     write_json(out, outfile)
 
@@ -58,94 +118,173 @@ def main():
         description="Lookup release by catalog number from local MusicBrainz and emit normalized JSON"
     )
     p.add_argument("--catalog", help="Catalog number (e.g., PCCG-01965)")
-    p.add_argument("--batch", help="Batch file=path or dir=path; read each line as a catalog number")
-    p.add_argument("--out", help="Output file (single) or output directory (batch). Omit to print to stdout.")
+    p.add_argument("--batch", help="Batch file=path or dir=path; read each line as a catalog number "
+                                   "(file=- reads stdin)")
+    p.add_argument("--out", help="Output file (single) or output directory (batch). Omit to print to stdout. "
+                                 "With --format ndjson: '-' or a .jsonl[.gz|.zst] file")
+    p.add_argument("--format", choices=["json", "ndjson"], default="json",
+                   help="Batch output: one pretty JSON file per catalog (json) or one NDJSON stream (ndjson)")
     p.add_argument("--validate", action="store_true", help="Validate against schema")
     p.add_argument("--with-cover", action="store_true", help="Fetch one best cover (Front preferred)")
+    p.add_argument("--all-covers", action="store_true",
+                   help="Also list every cover-art image under images.all (implies --with-cover)")
+    p.add_argument("--resolve-range", action="store_true",
+                   help="For range inputs (e.g. SECL-2409~13) resolve every member in the same bulk query "
+                        "and report split / missing discs in range_resolution")
     # 默认值为 None，后面用包内资源兜底
     p.add_argument("--schema", default=None)
     p.add_argument("--label-alias", default=None)
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                   help="Catalogs resolved per bulk SQL round trip in batch mode")
+    p.add_argument("--workers", type=int, default=1,
+                   help="Parallel batch workers; each holds its own pooled DB connection. Work is split "
+                        "per chunk; inputs shorter than workers x --chunk-size are spread evenly "
+                        "over the workers")
+    p.add_argument("--pool-min", type=int, default=None,
+                   help="Min pooled DB connections (default: $MB_POOL_MIN or 1)")
+    p.add_argument("--pool-max", type=int, default=None,
+                   help="Max pooled DB connections (default: $MB_POOL_MAX or 4)")
+    p.add_argument("--resume", action="store_true",
+                   help="Batch: skip inputs already finished according to OUT/_manifest.jsonl")
+    p.add_argument("--retry-failed", action="store_true",
+                   help="Batch: only re-run inputs recorded as not-found / schema-error / error")
+    p.add_argument("--refresh", nargs="?", const="auto", choices=REFRESH_SOURCES, default=None,
+                   help="Re-generate only the records in --out whose MusicBrainz sources changed since they were "
+                        "collected; release ids come from the run manifest or the JSON files (default: auto)")
+    p.add_argument("--refresh-margin", type=float, default=DEFAULT_MARGIN_HOURS,
+                   help="Hours subtracted from each record's collection time to cover mirror replication lag")
+    p.add_argument("--suggest", action="store_true",
+                   help="On NOT FOUND, print ranked near-matching catalog numbers (index kept in the cache dir)")
+    p.add_argument("--backend", default="postgres",
+                   help="Data source: 'postgres' (default) or 'snapshot:PATH' (built by mb-snapshot)")
+    p.add_argument("--cache", action=argparse.BooleanOptionalAction, default=False,
+                   help="Use the local lookup cache (keyed by catalog + mirror replication sequence)")
+    p.add_argument("--cache-dir", default=None,
+                   help="Cache directory (default: $VGMMB_CACHE_DIR or ~/.cache/vgmmb)")
+    p.add_argument("--cache-stats", action="store_true", help="Print cache hit/miss/eviction stats at exit")
+    p.add_argument("--profile", action="store_true",
+                   help="Time each stage (SQL, normalize, validate, write) and print p50/p95/p99 at exit")
+    p.add_argument("--metrics-file", default=None,
+                   help="Write stage timings and counters in Prometheus text format to this file at exit")
     args = p.parse_args()
+    if args.all_covers:
+        args.with_cover = COVER_ALL
+    if args.profile or args.metrics_file:
+        metrics.enable()
 
     # —— 先解析默认路径（包内资源）——
     if args.schema is None:
-        args.schema = _resolve_pkg_file("data/schemas/mb-album-v1.json")
+        args.schema = resolve_pkg_file("data/schemas/mb-album-v1.json")
     if args.label_alias is None:
-        args.label_alias = _resolve_pkg_file("data/label_alias.json")
+        args.label_alias = resolve_pkg_file("data/label_alias.json")
 
-    # —— 再加载 schema / 别名映射 —— 
+    # —— 再加载 schema；别名 / 格式映射在第一条记录时才读入，整个 run 共用 —— 
     schema = load_schema(Path(args.schema)) if args.validate else None
-    label_alias_map = load_label_alias(Path(args.label_alias)) if args.label_alias else {}
+    ctx = NormalizationContext(label_alias_path=args.label_alias or None)
 
     # —— 最后再分支到单条或批量 —— 
     if args.catalog and not args.batch:
         norm_cat = first_from_catalog_range(args.catalog)
-        _one(norm_cat, args, schema, label_alias_map)
+        if not norm_cat:
+            raise SystemExit(f"--catalog needs a catalog number (got {args.catalog!r})")
+        backend = _open_backend(args)
+        lookup, cache = _make_lookup(args, backend)
+        try:
+            _one(norm_cat, args, schema, ctx, lookup, _make_suggester(args, backend))
+        finally:
+            _finish(args, backend, cache)
         return
 
-    if args.batch:
-        kv = args.batch.split("=", 1)
-        if len(kv) != 2 or kv[0] not in ("file", "dir"):
-            raise SystemExit("--batch expects 'file=...' or 'dir=...'")
-        mode, path = kv
-        path = Path(path)
-
-        out_dir = Path(args.out) if args.out else Path("out")
-        out_dir.mkdir(parents=True, exist_ok=True)
-
-        if mode == "file":
-            for raw in read_lines(path):
-                cat = first_from_catalog_range(raw)
-                try:
-                    best, artists, tracks, cover = query_by_catalog(cat, with_cover=args.with_cover)
-                    if not best:
-                        print(f"[NOT FOUND] {cat}")
-                        continue
-                    out = normalize_record(best, artists, tracks, label_alias_map, cover=cover)
-                    # ✅ 无论单/区间，都记录“原始输入”到 JSON
-                    input_cat = raw.strip()
-                    out.setdefault("identifiers", {})["catalog_number_compact"] = input_cat
-
-                    if args.validate:
-                        errors = validate(out, schema)
-                        if errors:
-                            for e in errors:
-                                print(f"[SCHEMA ERROR] {raw} -> {e.message} at {list(e.path)}")
-                            continue
-
-                    # ✅ 用“原始输入”命名文件（而不是 cat 首号）
-                    outfile = out_dir / f"{_safe_basename(input_cat)}.json"
-                    write_json(out, outfile)
-
-                except Exception as ex:
-                    print(f"[ERROR] {cat}: {ex}")
-            return
-        else:  # dir
-            for fp in path.glob("*.txt"):
-                for raw in read_lines(fp):
-                    cat = first_from_catalog_range(raw)
-                    try:
-                        best, artists, tracks, cover = query_by_catalog(cat, with_cover=args.with_cover)
-                        if not best:
-                            print(f"[NOT FOUND] {cat}")
-                            continue
-                        out = normalize_record(best, artists, tracks, label_alias_map, cover=cover)
-                        # ✅ 无论单/区间，都记录“原始输入”到 JSON
-                        input_cat = raw.strip()
-                        out.setdefault("identifiers", {})["catalog_number_compact"] = input_cat
-
-                        if args.validate:
-                            errors = validate(out, schema)
-                            if errors:
-                                for e in errors:
-                                    print(f"[SCHEMA ERROR] {raw} -> {e.message} at {list(e.path)}")
-                                continue
-
-                        # ✅ 用“原始输入”命名文件（而不是 cat 首号）
-                        outfile = out_dir / f"{_safe_basename(input_cat)}.json"
-                        write_json(out, outfile)
-                    except Exception as ex:
-                        print(f"[ERROR] {cat}: {ex}")
-            return
+    if args.batch or args.refresh:
+        if args.refresh:
+            # --refresh：输入取自已有的输出目录，只重跑来源有变化的记录（覆盖原文件）
+            if args.format != "json" or args.batch:
+                raise SystemExit("--refresh works on a --format json output directory and takes no --batch")
+            if not Path(args.out or "out").is_dir():
+                raise SystemExit(f"[REFRESH] no output directory {args.out or 'out'}")
+        else:
+            kv = args.batch.split("=", 1)
+            if len(kv) != 2 or kv[0] not in ("file", "dir"):
+                raise SystemExit("--batch expects 'file=...' or 'dir=...'")
+            mode, path = kv
+            path = Path(path)
+
+        if args.format == "ndjson":
+            # NDJSON：所有记录顺序写入一个流（stdout / .jsonl / .jsonl.gz / .jsonl.zst）
+            out_dir = None
+            target = args.out or "-"
+            manifest_path = None if target == "-" else Path(target + ".manifest.jsonl")
+            sink = NdjsonWriter(target, append=args.resume or args.retry_failed)
+        else:
+            out_dir = Path(args.out) if args.out else Path("out")
+            out_dir.mkdir(parents=True, exist_ok=True)
+            manifest_path = out_dir / MANIFEST_NAME
+            sink = None
+
+        # 批量模式：整个 run 共用一个连接池，每条 catalog 不再重新握手
+        pool_max = args.pool_max if args.pool_max is not None else int(os.getenv("MB_POOL_MAX", "4"))
+        configure_pool(args.pool_min, max(pool_max, args.workers))
+        backend = _open_backend(args)
+        lookup, cache = _make_lookup(args, backend)
+        # 整个 run 共用：重复 / 写法不同的同一品番只查一次，同一 release 只取一次曲目等、只 normalize 一次
+        # 去重键跟随匹配口径；开了缓存时用缓存核对过的口径
+        memo = RunMemo(lookup, ctx, key=cache.key if cache is not None else backend.match_key)
+        try:
+            raws = _refresh_inputs(args, backend, out_dir) if args.refresh else _iter_batch_lines(mode, path)
+            _run_batch(raws, out_dir, args, schema, memo.normalize, memo.lookup, sink, manifest_path,
+                       _make_suggester(args, backend))
+        finally:
+            _finish(args, backend, cache)
+            if sink is not None:
+                sink.close()
+        return
 
     p.print_help()
+
+
+def _iter_batch_lines(mode, path):
+    if mode == "file":  # file=- 读 stdin
+        yield from read_lines(path)
+    else:  # dir
+        for fp in path.glob("*.txt"):
+            yield from read_lines(fp)
+
+def _refresh_inputs(args, backend, out_dir) -> list[str]:
+    if not hasattr(backend, "stale_inputs"):
+        raise SystemExit("[REFRESH] needs the postgres backend (snapshots carry no last_updated)")
+    try:
+        items = load_items(out_dir, args.refresh)
+    except FileNotFoundError as ex:
+        raise SystemExit(f"[REFRESH] {ex}") from None
+    with metrics.timer("refresh_check"):
+        stale = select_stale(backend, items, args.refresh_margin)
+    print(f"[REFRESH] records={len(items)} stale={len(stale)}", file=_status_stream(args))
+    return stale
+
+def _run_batch(raws, out_dir, args, schema, normalize, lookup, sink=None, manifest_path=None,
+               suggest=None):
+    # file= / dir= / --refresh 共用同一个执行引擎：按块切分 → 线程池并发 → 按输入顺序输出
+    def work(raws):
+        return process_chunk(raws, out_dir, args, schema, normalize, lookup, suggest)
+
+    status = _status_stream(args)
+    manifest = Manifest(manifest_path) if manifest_path else None
+    if manifest is not None:
+        raws = manifest.select(raws, resume=args.resume, retry_failed=args.retry_failed)
+    try:
+        for entries in ordered_map(work, spread_chunks(raws, args.chunk_size, args.workers),
+                                   workers=args.workers):
+            for entry in entries:
+                metrics.inc("records", status=entry["status"])
+                for line in entry.pop("messages"):
+                    print(line, file=status)
+                record = entry.pop("record", None)
+                if record is not None:
+                    sink.write(record)
+            if sink is not None:
+                sink.flush()
+            if manifest is not None:
+                manifest.record(entries)
+    finally:
+        if manifest is not None:
+            manifest.close()
@@ -1,7 +1,24 @@
+import logging
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+# 连接空闲超过该秒数后，借出前先做一次 SELECT 1 健康检查
+HEALTH_CHECK_IDLE_SECS = 30.0
+
+# 连接断开类错误：出现时丢弃连接，由调用方决定是否重试
+BROKEN_CONN_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
 def get_dsn():
     return dict(
         host=os.getenv("MB_HOST", "localhost"),
@@ -12,8 +29,167 @@ def get_dsn():
         options=f"-c search_path={os.getenv('MB_SEARCH_PATH', 'musicbrainz')}"
     )
 
+class PreparingConnection(psycopg2.extensions.connection):
+    """记录本连接上已经 PREPARE 过的语句名，同一连接上每条 SQL 只解析一次。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.last_used = time.monotonic()
+
+@metrics.timed("connect")
 def connect():
-    return psycopg2.connect(**get_dsn())
+    return psycopg2.connect(connection_factory=PreparingConnection, **get_dsn())
 
 def dict_cursor(conn):
     return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+def _to_positional(sql: str) -> str:
+    # PREPARE 只认 $1/$2...，把 psycopg2 风格的 %s 依次替换
+    counter = iter(range(1, 10_000))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", sql)
+
+def execute_prepared(cur, name: str, sql: str, params: tuple = ()):
+    """
+    在 cur 所属连接上按 name PREPARE 一次 sql，之后走 EXECUTE。
+    非 PreparingConnection（例如外部传入的普通连接）直接退回普通 execute。
+    """
+    prepared = getattr(cur.connection, "prepared", None)
+    if prepared is None:
+        cur.execute(sql, params)
+        return
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {_to_positional(sql)}")
+        prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+class ConnectionPool:
+    """
+    线程安全的连接池：
+      - minconn 个连接预热，最多 maxconn 个同时借出（超出时阻塞等待）
+      - 空闲过久的连接借出前做健康检查，断开的连接自动丢弃并重连
+      - 连接为 autocommit，只读查询不会留下 idle in transaction
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 4):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"invalid pool size: min={minconn} max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._closed = False
+        for _ in range(minconn):
+            self._idle.append(self._new_conn())
+
+    @staticmethod
+    def _new_conn():
+        conn = connect()
+        conn.autocommit = True
+        return conn
+
+    @staticmethod
+    def _healthy(conn) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < HEALTH_CHECK_IDLE_SECS:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except BROKEN_CONN_ERRORS:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except psycopg2.Error as ex:
+            log.debug("closing discarded connection failed: %s", ex)
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._new_conn()
+            if self._healthy(conn):
+                return conn
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        with metrics.timer("pool_wait"):
+            self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except BROKEN_CONN_ERRORS:
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                if conn.closed or self._closed:
+                    self._discard(conn)
+                else:
+                    conn.last_used = time.monotonic()
+                    with self._lock:
+                        self._idle.append(conn)
+            self._slots.release()
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+_pool = None
+_pool_size = None
+_pool_lock = threading.Lock()
+
+def configure_pool(minconn: int | None = None, maxconn: int | None = None):
+    """
+    设定进程级连接池大小（默认取环境变量 MB_POOL_MIN / MB_POOL_MAX）。
+    连接池在第一次借连接时才真正建立，全部命中缓存的 run 不会连库。
+    """
+    global _pool, _pool_size
+    minconn = int(os.getenv("MB_POOL_MIN", "1")) if minconn is None else minconn
+    maxconn = int(os.getenv("MB_POOL_MAX", "4")) if maxconn is None else maxconn
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        _pool_size = (minconn, max(minconn, maxconn))
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            minconn, maxconn = _pool_size or (int(os.getenv("MB_POOL_MIN", "1")),
+                                              int(os.getenv("MB_POOL_MAX", "4")))
+            _pool = ConnectionPool(minconn, maxconn)
+        return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+@contextmanager
+def pooled_cursor():
+    """从进程级连接池借一个连接，返回 RealDictCursor。"""
+    with get_pool().connection() as conn, dict_cursor(conn) as cur:
+        yield cur
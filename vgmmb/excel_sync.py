@@ -1,23 +1,16 @@
 # -*- coding: utf-8 -*-
 import json
+import os
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 
 import pandas as pd
 
-CAT_RANGE_SEPS = ["~", "～", "〜"]
+from .catalog import CAT_RANGE_SEPS, first_from_catalog_range
 
 def _normalize_input(catalog: str) -> str:
     return (catalog or "").strip()
 
-def _first_from_range(catalog: str) -> str:
-    if not catalog:
-        return catalog
-    s = catalog.strip()
-    for sep in CAT_RANGE_SEPS[1:]:
-        s = s.replace(sep, CAT_RANGE_SEPS[0])
-    return s.split(CAT_RANGE_SEPS[0], 1)[0] if CAT_RANGE_SEPS[0] in s else s
-
 def _try_get(d: Dict[str, Any], path: str) -> Any:
     cur = d
     for key in path.split("."):
@@ -52,24 +45,262 @@ def _extract_fields(payload: Dict[str, Any]) -> Dict[str, Optional[str]]:
 
     return {"产品名称": name, "版本": version, "版本详情": vdetail, "歌手": artist, "Barcode": barcode}
 
-def _load_json_by_catalog(json_dir: Path, catalog_input: str) -> Optional[Dict[str, Any]]:
-    base = _normalize_input(catalog_input)
-    if not base: return None
+def _unify_range_sep(s: str) -> str:
+    for sep in CAT_RANGE_SEPS[1:]:
+        s = s.replace(sep, CAT_RANGE_SEPS[0])
+    return s
+
+class JsonDirIndex:
+    """
+    json_dir 的一次性目录索引：扫描一次目录，按文件名（原样 / 统一区间分隔符 + 大写）建表；
+    解析结果按文件缓存，重复的 catalog 只读一次文件。
+    匹配顺序：原样 → 统一分隔符 → 输入的区间首号 → 文件名的区间首号（如 SECL-2409 → SECL-2409~13.json）。
+    """
+
+    def __init__(self, json_dir: Path):
+        self.json_dir = Path(json_dir)
+        self.by_name: Dict[str, Path] = {}
+        self.by_unified: Dict[str, Path] = {}
+        self.by_first: Dict[str, Path] = {}
+        self._payloads: Dict[Path, Optional[Dict[str, Any]]] = {}
+        if self.json_dir.is_dir():
+            with os.scandir(self.json_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    stem = entry.name[:-len(".json")]
+                    path = Path(entry.path)
+                    self.by_name[stem] = path
+                    self.by_unified.setdefault(_unify_range_sep(stem).upper(), path)
+                    self.by_first.setdefault(first_from_catalog_range(stem).upper(), path)
+
+    def __len__(self):
+        return len(self.by_name)
 
-    candidates = [json_dir / f"{base}.json"]
-    unified = base
-    for sep in CAT_RANGE_SEPS[1:]: unified = unified.replace(sep, CAT_RANGE_SEPS[0])
-    if unified != base: candidates.append(json_dir / f"{unified}.json")
-    first = _first_from_range(base)
-    if first != base: candidates.append(json_dir / f"{first}.json")
+    def find(self, catalog_input: str) -> Optional[Path]:
+        base = _normalize_input(catalog_input)
+        if not base: return None
+        first = first_from_catalog_range(base)
+        return (self.by_name.get(base)
+                or self.by_unified.get(_unify_range_sep(base).upper())
+                or self.by_name.get(first)
+                or self.by_unified.get(first.upper())
+                or self.by_first.get(first.upper()))
 
-    for p in candidates:
-        if p.exists():
+    def load(self, catalog_input: str) -> Optional[Dict[str, Any]]:
+        path = self.find(catalog_input)
+        if path is None: return None
+        if path not in self._payloads:
             try:
-                return json.loads((p.read_text(encoding="utf-8")))
+                self._payloads[path] = json.loads(path.read_text(encoding="utf-8"))
             except Exception:
-                return None
-    return None
+                self._payloads[path] = None
+        return self._payloads[path]
+
+    def load_many(self, catalog_inputs) -> Dict[str, Optional[Dict[str, Any]]]:
+        return {c: self.load(c) for c in catalog_inputs}
+
+class DbSource:
+    """
+    --from-db：不经 out/ 目录，直接把 sheet 里去重后的 catalog 交给后端批量查询
+    （backend.query_by_catalogs），在内存里 normalize_record，结果与 JsonDirIndex.load_many 同形。
+    结果按输入缓存，同一次运行的多个 sheet / 工作簿不会重复查询；
+    给出 json_out 时顺带把每条记录写成 JSON（文件名同 mb-lookup 批量模式）。
+    """
+
+    def __init__(self, backend, ctx, with_cover: bool = False, json_out: Optional[Path] = None):
+        self.backend = backend
+        self.ctx = ctx  # normalizer.NormalizationContext
+        self.with_cover = with_cover
+        self.json_out = Path(json_out) if json_out else None
+        self._payloads: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def load_many(self, catalog_inputs) -> Dict[str, Optional[Dict[str, Any]]]:
+        from .io import write_json
+        from .normalizer import normalize_record
+        from .pipeline import safe_basename
+
+        todo = {c: first_from_catalog_range(c) for c in catalog_inputs if c not in self._payloads}
+        if todo:
+            # 取首号为空的输入（如只有 "~" 的单元格）不送去查询，按未命中处理
+            found = self.backend.query_by_catalogs(list(dict.fromkeys(c for c in todo.values() if c)),
+                                                   with_cover=self.with_cover)
+            for cin, cat in todo.items():
+                best, artists, tracks, cover = found.get(cat, (None, None, None, None))
+                if not best:
+                    self._payloads[cin] = None
+                    continue
+                out = normalize_record(best, artists, tracks, self.ctx, cover=cover)
+                out.setdefault("identifiers", {})["catalog_number_compact"] = cin
+                if self.json_out is not None:
+                    write_json(out, self.json_out / f"{safe_basename(cin)}.json")
+                self._payloads[cin] = out
+        return {c: self._payloads[c] for c in catalog_inputs}
+
+def _catalog_inputs(col: pd.Series) -> pd.Series:
+    # 与逐行读取时的口径一致：str(值 or "").strip()（NaN 为真值，会变成 "nan"）
+    return col.map(lambda v: str(v or "").strip())
+
+def _fields_frame(cins: pd.Series, payloads: Dict[str, Any], targets) -> pd.DataFrame:
+    """
+    所有 payload 一次性抽取成字段表（每个不同的 catalog 只抽一次），再按行对齐到 sheet。
+    无 payload 的行整行为 None。
+    """
+    extracted = {c: _extract_fields(p) for c, p in payloads.items() if p}
+    by_cat = pd.DataFrame.from_dict(extracted, orient="index", columns=targets, dtype=object)
+    aligned = by_cat.reindex(cins.to_numpy())
+    aligned.index = cins.index
+    return aligned
+
+CHANGE_COLS = ["row_index", "column", "old", "new"]
+
+def _merge_fields(df: pd.DataFrame, fields: pd.DataFrame, targets, mode: str,
+                  changes: Optional[list] = None) -> int:
+    """
+    按列把字段表并入 df（原地），返回写入的单元格数。
+      fill-only：只填原值为空（NaN / None / "" / " "）的格
+      overwrite：有新值就覆盖
+    新值为 None / NaN 的格一律不动。
+    给出 changes 时，把值真正变化的格以 (row_index, column, old, new) 追加进去。
+    """
+    updated = 0
+    for col in targets:
+        new = fields[col]
+        mask = new.map(lambda v: not (v is None or (isinstance(v, float) and pd.isna(v))))
+        old = df[col]
+        if mode == "fill-only":
+            mask &= old.isna() | old.map(lambda v: isinstance(v, str) and v in ("", " "))
+        n = int(mask.sum())
+        if not n:
+            continue
+        if changes is not None:
+            before = old[mask]
+            diff = before.isna() | (before.astype(object) != new[mask].astype(object))
+            for i in diff.index[diff]:
+                old_v = before[i]
+                changes.append((i, col, None if pd.isna(old_v) else old_v, new[i]))
+        if df[col].dtype.kind in "biuf":
+            # 整列为空（或纯数字）的列读进来是数值类型，放不下文本
+            df[col] = df[col].astype(object)
+        df.loc[mask, col] = new[mask]
+        updated += n
+    return updated
+
+def write_changes(excel_path: Path, sheet_name: str, changes: pd.DataFrame, df: pd.DataFrame,
+                  catalog_col: str, targets) -> int:
+    """
+    只把变化的格写回工作簿（openpyxl 原地改单元格，其余格的值、格式、公式保持不变）。
+    df 的第 i 行对应 sheet 的第 i + 2 行（第 1 行为表头）；写入前核对该行的品番格，
+    与读入时不一致（例如 sheet 在读后被改动）则放弃写入。返回写入的单元格数。
+    注意 openpyxl 保存时不保留公式的缓存结果：Excel 重新打开并保存之前，
+    下次 read_columns（data_only）读到的公式格都是空值。要写入的格本身是公式时放弃写入；
+    .xlsm / .xltm 保留宏。
+    """
+    if changes.empty:
+        return 0
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, keep_vba=Path(excel_path).suffix.lower() in (".xlsm", ".xltm"))
+    ws = wb[sheet_name]
+    header = {}
+    for cell in next(ws.iter_rows(min_row=1, max_row=1)):
+        if cell.value is not None:
+            header.setdefault(str(cell.value), cell.column)
+    next_col = ws.max_column + 1
+    for col in targets:
+        if col not in header:
+            ws.cell(row=1, column=next_col, value=col)
+            header[col] = next_col
+            next_col += 1
+
+    cat_idx = header[catalog_col]
+    positions = {label: pos for pos, label in enumerate(df.index)}
+    cats = df[catalog_col].to_numpy()
+    # 核对用计算值（与 read_columns 的 data_only 口径一致，品番格是公式时比的是结果而非公式文本）；
+    # 写入仍走上面的普通工作簿，公式格原样保留
+    check_rows = {positions[row_index] + 2 for row_index in changes["row_index"].unique()}
+    values_wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        actual_cats = {}
+        for r, (value,) in enumerate(values_wb[sheet_name].iter_rows(
+                min_row=2, max_row=max(check_rows), min_col=cat_idx, max_col=cat_idx, values_only=True), 2):
+            if r in check_rows:
+                actual_cats[r] = value
+    finally:
+        values_wb.close()
+    for r in sorted(check_rows):
+        expect = cats[r - 2]
+        actual = actual_cats.get(r)
+        if isinstance(expect, str) and isinstance(actual, str) and expect.strip() != actual.strip():
+            raise RuntimeError(f"Row {r} of sheet '{sheet_name}' no longer holds catalog "
+                               f"'{expect.strip()}' (found '{actual.strip()}'); nothing written")
+
+    cells = [(ws.cell(row=positions[row_index] + 2, column=header[col]), new)
+             for row_index, col, _old, new in changes.itertuples(index=False)]
+    formulas = [cell.coordinate for cell, _new in cells if cell.data_type == "f"]
+    if formulas:
+        raise RuntimeError(f"Sheet '{sheet_name}': cells {', '.join(formulas[:5])}"
+                           f"{' ...' if len(formulas) > 5 else ''} hold formulas; nothing written")
+    formula_cols = [col for col in [catalog_col] + list(targets)
+                    if any(cell.data_type == "f" for (cell,) in ws.iter_rows(
+                        min_row=2, min_col=header[col], max_col=header[col]))]
+    if formula_cols:
+        print(f"[WARN] Sheet '{sheet_name}' has formulas in {formula_cols}; saving drops their cached "
+              "values, so open and save the workbook in Excel before the next mb-sync-excel run")
+
+    for cell, new in cells:
+        cell.value = new
+    wb.save(excel_path)
+    return len(changes)
+
+TARGET_COLS = ["产品名称", "版本", "版本详情", "歌手", "Barcode"]
+
+_EXCEL_ERRORS = frozenset(("#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"))
+
+def _convert_value(v):
+    # 与 pandas 的 openpyxl reader 口径一致：空格 -> ""，错误值 -> NaN，整数值的浮点 -> int
+    if v is None:
+        return ""
+    if isinstance(v, str):
+        return float("nan") if v in _EXCEL_ERRORS else v
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        iv = int(v)
+        return iv if iv == v else float(v)
+    return v
+
+def read_columns(excel_path: Path, sheet_name: str, columns) -> pd.DataFrame:
+    """
+    流式读取 sheet 中表头名为 columns 的列（openpyxl read_only + iter_rows），
+    其它列只看不存，内存只随所需列增长。结果与 pd.read_excel(...)[所需列] 一致：
+    同样的空值 / 类型推断，末尾空行被裁掉（中间的空行保留，行号与 sheet 对齐）。
+    表头里没有的列不出现在结果中。
+    """
+    from openpyxl import load_workbook
+    from pandas.io.parsers import TextParser
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb[sheet_name]
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = [_convert_value(v) for v in next(rows, ())]
+        pos = {}
+        for i, name in enumerate(header):
+            if name != "" and str(name) in columns:
+                pos.setdefault(str(name), i)
+        names = [c for c in columns if c in pos]
+        idx = [pos[c] for c in names]
+        data = [[header[i] for i in idx]]
+        last_with_data = 0
+        for n, row in enumerate(rows, start=1):
+            width = len(row)
+            data.append([_convert_value(row[i]) if i < width else "" for i in idx])
+            if any(v is not None for v in row):
+                last_with_data = n
+    finally:
+        wb.close()
+    del data[last_with_data + 1:]
+    return TextParser(data, header=0, skip_blank_lines=False).read()
 
 def update_excel(
     excel_path: Path,
@@ -78,64 +309,145 @@ def update_excel(
     mode: str = "fill-only",
     catalog_col: str = "catelog",
     commit: bool = True,
+    index: Optional[Any] = None,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    df = pd.read_excel(excel_path, sheet_name=sheet_name)
+    """
+    只读入 catalog_col 与 5 个目标列（流式），返回 (df, 未命中表)。
+    index 为记录来源（JsonDirIndex 或 DbSource，默认按 json_dir 建 JsonDirIndex）；
+    同一次运行处理多个 sheet / 工作簿时传入共用的实例。
+    """
+    targets = TARGET_COLS
+    df = read_columns(excel_path, sheet_name, [catalog_col] + targets)
     if catalog_col not in df.columns:
         raise KeyError(f"Sheet '{sheet_name}' does not contain column '{catalog_col}'")
 
-    targets = ["产品名称", "版本", "版本详情", "歌手", "Barcode"]
     for col in targets:
         if col not in df.columns:
             df[col] = pd.Series([None] * len(df))
 
-    missing = []
-    updated = 0
-    for idx, row in df.iterrows():
-        cin = str(row.get(catalog_col) or "").strip()
-        if not cin: continue
-        payload = _load_json_by_catalog(json_dir, cin)
-        if not payload:
-            missing.append({"row_index": idx, catalog_col: cin})
-            continue
-        fields = _extract_fields(payload)
-        for col in targets:
-            new_val = fields.get(col)
-            if new_val is None or (isinstance(new_val, float) and pd.isna(new_val)):
-                continue
-            if mode == "fill-only":
-                if pd.isna(row.get(col)) or row.get(col) in (None, "", " "):
-                    df.at[idx, col] = new_val; updated += 1
-            else:
-                df.at[idx, col] = new_val; updated += 1
+    if index is None:
+        index = JsonDirIndex(json_dir)
+    cins = _catalog_inputs(df[catalog_col])
+    payloads = index.load_many([c for c in cins.unique() if c])
+    fields = _fields_frame(cins, payloads, targets)
+    changes = []
+    updated = _merge_fields(df, fields, targets, mode, changes)
+    changes_df = pd.DataFrame(changes, columns=CHANGE_COLS)
+    df.attrs["updated"] = updated
+    df.attrs["changes"] = changes_df
 
+    miss = (cins != "") & cins.map(lambda c: not payloads.get(c))
+    missing = {"row_index": list(df.index[miss]), catalog_col: list(cins[miss])}
     missing_df = pd.DataFrame(missing, columns=["row_index", catalog_col])
     if commit:
-        with pd.ExcelWriter(excel_path, engine="openpyxl", mode="a", if_sheet_exists="replace") as xw:
-            df.to_excel(xw, sheet_name=sheet_name, index=False)
+        write_changes(excel_path, sheet_name, changes_df, df, catalog_col, targets)
     return df, missing_df
 
+SUGGEST_COLS = ["suggestion_1", "suggestion_2", "suggestion_3"]
+
+def add_suggestions(missing_df: pd.DataFrame, catalog_col: str, backend_spec: str = "postgres",
+                    cache_dir: Optional[Path] = None) -> pd.DataFrame:
+    """给未命中报告追加近似品番列（suggestion_1..3，格式 'SECL-2409 (d=1)'）。"""
+    from .backend import open_backend
+    from .cache import DEFAULT_CACHE_DIR
+    from .suggest import INDEX_NAME, Suggester
+
+    backend = open_backend(backend_spec)
+    try:
+        suggest = Suggester(backend, (cache_dir or DEFAULT_CACHE_DIR) / INDEX_NAME,
+                            source=backend_spec, limit=len(SUGGEST_COLS))
+        rows = []
+        for cin in missing_df[catalog_col]:
+            hits = [f"{cat} (d={d:g})" for cat, d in suggest(first_from_catalog_range(str(cin)))]
+            rows.append(hits + [None] * (len(SUGGEST_COLS) - len(hits)))
+    finally:
+        backend.close()
+    out = missing_df.copy()
+    for i, col in enumerate(SUGGEST_COLS):
+        out[col] = [r[i] for r in rows]
+    return out
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Sync normalized MB JSON into Excel archive.")
-    parser.add_argument("--excel", required=True, help="Path to the Excel file (e.g., 海淘复盘.xlsx)")
-    parser.add_argument("--sheet", default="采购统计")
+    parser.add_argument("--excel", required=True, nargs="+",
+                        help="Path(s) to the Excel file(s) (e.g., 海淘复盘.xlsx)")
+    parser.add_argument("--sheet", nargs="+", default=["采购统计"],
+                        help="Sheet name(s) to sync in every workbook")
     parser.add_argument("--json-dir", default="out")
     parser.add_argument("--mode", choices=["fill-only", "overwrite"], default="fill-only")
     parser.add_argument("--catalog-col", default="catelog")
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--report-changes", action="store_true",
+                        help="Print changed cells per column and save them to <excel>_变更报告.csv")
+    parser.add_argument("--suggest", action="store_true",
+                        help="Add near-matching catalog numbers to the missing report")
+    parser.add_argument("--backend", default="postgres",
+                        help="Catalog source for --suggest: 'postgres' or 'snapshot:PATH'")
+    parser.add_argument("--cache-dir", default=None, help="Where the suggestion index is kept")
+    parser.add_argument("--from-db", action="store_true",
+                        help="Resolve the sheet's catalogs from --backend directly instead of reading --json-dir")
+    parser.add_argument("--write-json", action="store_true",
+                        help="With --from-db: also write each resolved record to --json-dir")
+    parser.add_argument("--with-cover", action="store_true", help="With --from-db: fetch the best cover too")
+    parser.add_argument("--label-alias", default=None, help="With --from-db: label alias map (default: bundled)")
     args = parser.parse_args()
 
+    backend = None
+    if args.from_db:
+        from .backend import open_backend
+        from .io import resolve_pkg_file
+        from .normalizer import NormalizationContext
+
+        try:
+            backend = open_backend(args.backend)
+        except (ValueError, FileNotFoundError) as ex:
+            raise SystemExit(f"[BACKEND ERROR] {ex}") from None
+        label_alias = args.label_alias or resolve_pkg_file("data/label_alias.json")
+        index = DbSource(backend, NormalizationContext(label_alias_path=label_alias),
+                         with_cover=args.with_cover, json_out=Path(args.json_dir) if args.write_json else None)
+    else:
+        index = JsonDirIndex(Path(args.json_dir))
+    multi = len(args.excel) * len(args.sheet) > 1
+    try:
+        for excel in args.excel:
+            for sheet in args.sheet:
+                _sync_one(Path(excel), sheet, index, args, multi)
+    finally:
+        if backend is not None:
+            backend.close()
+
+def _sync_one(excel: Path, sheet: str, index, args, multi: bool):
     df, miss = update_excel(
-        excel_path=Path(args.excel),
-        sheet_name=args.sheet,
+        excel_path=excel,
+        sheet_name=sheet,
         json_dir=Path(args.json_dir),
         mode=args.mode,
         catalog_col=args.catalog_col,
         commit=not args.dry_run,
+        index=index,
     )
+    if args.suggest and len(miss) > 0:
+        miss = add_suggestions(miss, args.catalog_col, args.backend,
+                               Path(args.cache_dir) if args.cache_dir else None)
+
+    # 多个 sheet / 工作簿时，报告文件名带上 sheet 名，避免互相覆盖
+    stem = excel.with_suffix("").as_posix() + (f"_{sheet}" if len(args.sheet) > 1 else "")
+    if multi:
+        print(f"[SHEET] {excel} / {sheet}")
     print("[SUMMARY] Updated columns:", list(df.columns))
+    print("[SUMMARY] Updated cells:", df.attrs.get("updated", 0))
+    changes = df.attrs.get("changes")
+    if changes is not None:
+        print("[SUMMARY] Changed cells:", len(changes))
+        if args.report_changes and len(changes) > 0:
+            for col, n in changes["column"].value_counts(sort=False).items():
+                print(f"[CHANGES] {col}: {n}")
+            changes_path = stem + "_变更报告.csv"
+            changes.to_csv(changes_path, index=False, encoding="utf-8-sig")
+            print(f"[SUMMARY] Change report saved to: {changes_path}")
     print("[SUMMARY] Missing:", len(miss))
     if len(miss) > 0:
-        report_path = Path(args.excel).with_suffix("").as_posix() + "_未命中报告.csv"
+        report_path = stem + "_未命中报告.csv"
         miss.to_csv(report_path, index=False, encoding="utf-8-sig")
         print(f"[SUMMARY] Missing report saved to: {report_path}")
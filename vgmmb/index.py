@@ -0,0 +1,117 @@
+import argparse
+
+import psycopg2
+
+from .catalog import SQL_CATALOG_KEY_EXPR
+from .db import connect
+from .log import setup_logging
+
+CATALOG_KEY_FUNC = "musicbrainz.vgmmb_catalog_key"
+CATALOG_KEY_INDEX = "release_label_vgmmb_catalog_key_idx"
+CATALOG_TRGM_INDEX = "release_label_vgmmb_catalog_trgm_idx"
+
+# IMMUTABLE + PARALLEL SAFE 才能用于表达式索引；函数体与 vgmmb.catalog.catalog_key 等价
+SQL_CREATE_KEY_FUNC = f"""
+CREATE OR REPLACE FUNCTION {CATALOG_KEY_FUNC}(text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+AS $$ SELECT {SQL_CATALOG_KEY_EXPR % "$1"} $$
+"""
+
+SQL_CREATE_KEY_INDEX = f"""
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {CATALOG_KEY_INDEX}
+ON musicbrainz.release_label ({CATALOG_KEY_FUNC}(catalog_number))
+"""
+
+# 可选：trigram 索引，供 ILIKE 回退路径 / 模糊检索使用
+SQL_CREATE_TRGM_INDEX = f"""
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {CATALOG_TRGM_INDEX}
+ON musicbrainz.release_label USING gin (catalog_number gin_trgm_ops)
+"""
+
+# CONCURRENTLY 建索引失败（中断 / 超时）会留下 INVALID 索引：存在但查询用不上
+SQL_KEY_INDEX_VALID = f"""COALESCE((SELECT indisvalid AND indisready FROM pg_index
+  WHERE indexrelid = to_regclass('musicbrainz.{CATALOG_KEY_INDEX}')), false)"""
+
+SQL_STATUS = f"""
+SELECT
+  to_regprocedure('{CATALOG_KEY_FUNC}(text)') IS NOT NULL AS has_function,
+  to_regclass('musicbrainz.{CATALOG_KEY_INDEX}') IS NOT NULL AS has_key_index,
+  {SQL_KEY_INDEX_VALID} AS key_index_valid,
+  to_regclass('musicbrainz.{CATALOG_TRGM_INDEX}') IS NOT NULL AS has_trgm_index
+"""
+
+def _autocommit_conn():
+    # CREATE INDEX CONCURRENTLY 不能在事务块内执行
+    conn = connect()
+    conn.autocommit = True
+    return conn
+
+def install(trgm: bool = False):
+    conn = _autocommit_conn()
+    try:
+        with conn.cursor() as cur:
+            print(f"[INDEX] create function {CATALOG_KEY_FUNC}(text)")
+            cur.execute(SQL_CREATE_KEY_FUNC)
+            # 上次失败留下的 INVALID 索引会让 IF NOT EXISTS 直接跳过，先删掉再建
+            cur.execute(f"SELECT to_regclass('musicbrainz.{CATALOG_KEY_INDEX}') IS NOT NULL, "
+                        f"{SQL_KEY_INDEX_VALID}")
+            exists, valid = cur.fetchone()
+            if exists and not valid:
+                print(f"[INDEX] drop invalid index {CATALOG_KEY_INDEX}")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS musicbrainz.{CATALOG_KEY_INDEX}")
+            print(f"[INDEX] create index {CATALOG_KEY_INDEX} (this may take a while)")
+            cur.execute(SQL_CREATE_KEY_INDEX)
+            if trgm:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                print(f"[INDEX] create index {CATALOG_TRGM_INDEX}")
+                cur.execute(SQL_CREATE_TRGM_INDEX)
+            cur.execute("ANALYZE musicbrainz.release_label")
+    finally:
+        conn.close()
+
+def drop():
+    conn = _autocommit_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS musicbrainz.{CATALOG_TRGM_INDEX}")
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS musicbrainz.{CATALOG_KEY_INDEX}")
+            cur.execute(f"DROP FUNCTION IF EXISTS {CATALOG_KEY_FUNC}(text)")
+    finally:
+        conn.close()
+
+def status() -> dict:
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_STATUS)
+            cols = [d[0] for d in cur.description]
+            return dict(zip(cols, cur.fetchone()))
+    finally:
+        conn.close()
+
+def main():
+    setup_logging()
+    p = argparse.ArgumentParser(
+        prog="mb-index",
+        description="Install / inspect the normalized catalog-number index in the MusicBrainz mirror"
+    )
+    sub = p.add_subparsers(dest="cmd", required=True)
+    p_install = sub.add_parser("install", help="Create vgmmb_catalog_key() and its expression index")
+    p_install.add_argument("--trgm", action="store_true",
+                           help="Also create a pg_trgm GIN index on release_label.catalog_number")
+    sub.add_parser("status", help="Show which objects are installed")
+    sub.add_parser("drop", help="Remove the function and indexes")
+    args = p.parse_args()
+
+    try:
+        if args.cmd == "install":
+            install(trgm=args.trgm)
+            print("[INDEX] done")
+        elif args.cmd == "drop":
+            drop()
+            print("[INDEX] dropped")
+        else:
+            for k, v in status().items():
+                print(f"{k}: {v}")
+    except psycopg2.Error as ex:
+        raise SystemExit(f"[INDEX ERROR] {ex}") from None
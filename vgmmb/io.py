@@ -1,13 +1,22 @@
+import gzip
+import io
 import json
+import sys
+from importlib import resources
 from pathlib import Path
 from typing import Iterable
-import re
 
-CAT_RANGE_RE = re.compile(r"^([A-Z0-9]+-?)(\d+)\s*[~～〜]\s*(\d+)([A-Za-z]?)$")
+from . import metrics
 
-def is_catalog_range(s: str | None) -> bool:
-    return bool(s and CAT_RANGE_RE.match(s.strip()))
+# 品番区间的解析已移到 vgmmb.catalog；这里保留旧的导入位置
+from .catalog import CAT_RANGE_RE, expand_catalog_range, first_from_catalog_range, is_catalog_range  # noqa: F401
 
+def resolve_pkg_file(relpath: str) -> str:
+    # relpath 例如 "data/schemas/mb-album-v1.json"
+    with resources.as_file(resources.files("vgmmb").joinpath(relpath)) as p:
+        return str(p)
+
+@metrics.timed("write_json")
 def write_json(obj: dict, out_path: Path | None):
     text = json.dumps(obj, ensure_ascii=False, indent=2)
     if out_path:
@@ -17,24 +26,63 @@ def write_json(obj: dict, out_path: Path | None):
         print(text)
 
 def read_lines(path: Path) -> Iterable[str]:
-    for line in path.read_text(encoding="utf-8").splitlines():
-        s = line.strip()
-        if s and not s.startswith("#"):
-            yield s
+    # 逐行流式读取；path 为 "-" 时读 stdin（可放在 Unix 管道里）
+    if str(path) == "-":
+        f = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig")
+        close = False
+    else:
+        f = open(path, encoding="utf-8")
+        close = True
+    try:
+        for line in f:
+            s = line.strip()
+            if s and not s.startswith("#"):
+                yield s
+    finally:
+        if close:
+            f.close()
 
-def first_from_catalog_range(cat: str) -> str:
+class NdjsonWriter:
     """
-    'VVCL-1583~4' -> 'VVCL-1583'
-    'SECL-1193~4' -> 'SECL-1193'
-    'KICA-0001~0003' -> 'KICA-0001'
-    其它非区间 -> 原样返回
+    单文件顺序写 NDJSON（一行一条紧凑 JSON）。
+    target 为 "-" 时写 stdout；后缀 .gz 用 gzip，.zst 用 zstandard（可选依赖）。
+    append=True 时追加（gzip / zstd 多帧拼接仍可正常解压）。
     """
-    c = (cat or "").strip()
-    m = CAT_RANGE_RE.match(c)
-    if not m:
-        return c
-    prefix, start_str, end_str, tail = m.groups()
-    width = len(start_str)  # 保持前导0
-    start = int(start_str)
-    # 无论 end 是否小于 start，我们都只取 start
-    return f"{prefix}{start:0{width}d}{tail}"
\ No newline at end of file
+
+    def __init__(self, target: str, append: bool = False):
+        self.target = target
+        self._raw = None
+        if target == "-":
+            self._fh = sys.stdout
+            return
+        path = Path(target)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        mode = "a" if append else "w"
+        if path.suffix == ".gz":
+            self._fh = gzip.open(path, mode + "t", encoding="utf-8")
+        elif path.suffix == ".zst":
+            try:
+                import zstandard
+            except ImportError:
+                raise SystemExit("[NDJSON] writing .zst requires the 'zstandard' package "
+                                 "(pip install zstandard)") from None
+            self._raw = open(path, mode + "b")
+            self._fh = io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(self._raw),
+                                        encoding="utf-8")
+        else:
+            self._fh = open(path, mode, encoding="utf-8")
+
+    @metrics.timed("write_ndjson")
+    def write(self, obj: dict):
+        self._fh.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def flush(self):
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is sys.stdout:
+            self._fh.flush()
+            return
+        self._fh.close()
+        if self._raw is not None:
+            self._raw.close()
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+MANIFEST_NAME = "_manifest.jsonl"
+
+STATUS_OK = "ok"
+STATUS_NOT_FOUND = "not-found"
+STATUS_SCHEMA_ERROR = "schema-error"
+STATUS_ERROR = "error"
+FAILED_STATUSES = (STATUS_NOT_FOUND, STATUS_SCHEMA_ERROR, STATUS_ERROR)
+
+class Manifest:
+    """
+    批量 run 的检查点：追加式 JSON Lines（输出目录下的 _manifest.jsonl，
+    NDJSON 输出时为 <输出文件>.manifest.jsonl），一行一条输入的处理结果
+    （input / catalog / status / release / output / at）。同一 input 以最后一行为准，
+    进程中途被杀也只丢失最后一块尚未落盘的结果。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 上次被中断时写了半行
+                    self.entries[entry["input"]] = entry
+        self._fh = None
+
+    def is_done(self, raw: str) -> bool:
+        """终态：成功（且输出文件仍在）、未命中、schema 错误；[ERROR] 视为可重试。"""
+        entry = self.entries.get(raw.strip())
+        if entry is None or entry["status"] == STATUS_ERROR:
+            return False
+        if entry["status"] == STATUS_OK:
+            return bool(entry.get("output")) and Path(entry["output"]).exists()
+        return True
+
+    def is_failed(self, raw: str) -> bool:
+        entry = self.entries.get(raw.strip())
+        return entry is not None and entry["status"] in FAILED_STATUSES
+
+    def select(self, raws, resume: bool = False, retry_failed: bool = False):
+        """
+        按模式过滤输入：
+          resume        跳过已完成的，处理未记录 / [ERROR] 的
+          retry_failed  只处理上次失败的（not-found / schema-error / error）
+          两者同时给出  处理未完成的 + 失败的
+        """
+        for raw in raws:
+            if resume and retry_failed:
+                if not self.is_done(raw) or self.is_failed(raw):
+                    yield raw
+            elif retry_failed:
+                if self.is_failed(raw):
+                    yield raw
+            elif resume:
+                if not self.is_done(raw):
+                    yield raw
+            else:
+                yield raw
+
+    def record(self, entries):
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.path.open("a", encoding="utf-8")
+            if self._fh.tell() and not self._ends_with_newline():
+                self._fh.write("\n")  # 上次中断留下的半行单独成行，别和新记录粘在一起
+        at = datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+        for entry in entries:
+            entry = {**entry, "at": at}
+            self.entries[entry["input"]] = entry
+            self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def _ends_with_newline(self) -> bool:
+        with self.path.open("rb") as f:
+            f.seek(-1, 2)
+            return f.read(1) == b"\n"
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
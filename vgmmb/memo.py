@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from . import metrics
+from .catalog import catalog_key
+from .normalizer import normalize_record
+
+# 每张表的条目上限：同一 run 里重复的品番 / release 大多离得不远，超出后按 LRU 淘汰，内存有界
+DEFAULT_MAX_ENTRIES = 100_000
+
+class LruDict:
+    """线程安全的有界 dict（LRU）。只提供 get / 赋值 / in，够 RunMemo 与后端共用。"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, default)
+            if key in self._data:
+                self._data.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+class RunMemo:
+    """
+    一次批量 run 内的查询合并与记忆：
+      - lookup：按 key（与后端匹配口径一致的等价键，见 catalog.match_key）去重后再查询；
+        已查过、或正被另一个 worker 查询的键直接复用结果
+      - releases：release_id -> (artists, tracks, cover)，交给后端 query_by_catalogs(releases=...)，
+        同一 release 的艺人 / 曲目 / 封面整个 run 只取一次
+      - normalize：同一 release_label 行只 normalize 一次；返回浅拷贝（identifiers 另拷一层），
+        调用方可以放心改 catalog_number_compact / range_resolution
+    query_many(catalogs, releases=...) 与 backend.query_by_catalogs 同形。
+    """
+
+    def __init__(self, query_many, ctx, max_entries: int = DEFAULT_MAX_ENTRIES, key=catalog_key):
+        self.query_many = query_many
+        self.ctx = ctx
+        self.key = key
+        self.releases = LruDict(max_entries)
+        self._records = LruDict(max_entries)
+        self._results = OrderedDict()  # key(catalog) -> Future[(best, artists, tracks, cover)]
+        self._max_results = max(1, max_entries)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        # 已缓存（含在途）的品番查询数
+        return len(self._results)
+
+    def _evict_results(self):
+        # 只淘汰已完成的；在途的 Future 还有 worker 在等
+        while len(self._results) > self._max_results:
+            key, fut = next(iter(self._results.items()))
+            if not fut.done():
+                break
+            del self._results[key]
+
+    def lookup(self, catalogs) -> dict:
+        """返回 {catalog: (best, artists, tracks, cover)}；键与输入一致，等价的不同写法共用一次查询。"""
+        keys = {c: self.key(c) for c in catalogs if c}
+        mine, futures = {}, {}
+        with self._lock:
+            for cat, key in keys.items():
+                if key in futures:
+                    continue
+                fut = self._results.get(key)
+                if fut is None:
+                    fut = self._results[key] = Future()
+                    mine[key] = cat
+                else:
+                    self._results.move_to_end(key)
+                futures[key] = fut
+            self._evict_results()
+        if len(keys) > len(mine):
+            metrics.inc("memo_hits", len(keys) - len(mine), kind="lookup")
+
+        if mine:
+            try:
+                found = self.query_many(list(mine.values()), releases=self.releases)
+            except BaseException as ex:
+                # 失败的键不留在表里：等待中的 worker 拿到同一个异常，之后的输入会重新查询
+                with self._lock:
+                    for key in mine:
+                        self._results.pop(key, None)
+                for key in mine:
+                    futures[key].set_exception(ex)
+                raise
+            for key, cat in mine.items():
+                futures[key].set_result(found[cat])
+        return {cat: futures[key].result() for cat, key in keys.items()}
+
+    def normalize(self, best, artists, tracks, cover=None) -> dict:
+        key = (best["release_id"], best["label_id"], best["catalog_number"])
+        body = self._records.get(key)
+        if body is None:
+            body = normalize_record(best, artists, tracks, self.ctx, cover=cover)
+            self._records[key] = body
+        else:
+            metrics.inc("memo_hits", kind="record")
+        out = dict(body)
+        out["identifiers"] = dict(body["identifiers"])
+        return out
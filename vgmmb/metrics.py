@@ -0,0 +1,206 @@
+import functools
+import os
+import random
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from time import perf_counter
+
+# 秒；Prometheus 直方图的桶上界
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Stage:
+    """一个阶段的耗时：次数 / 总和 / 直方图各桶计数是精确的；分位数取自 samples。"""
+    __slots__ = ("count", "total", "buckets", "samples")
+
+    def __init__(self, n_buckets: int):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * n_buckets   # 各桶（不累计）计数，最后一格为 +Inf
+        self.samples = []
+
+class Registry:
+    """
+    一次 run 的计时 / 计数：各阶段的耗时（次数、总和、直方图桶与分位数样本）、
+    各阶段取回的行数，以及任意带标签的计数器。线程安全。
+    max_samples：每个阶段保留的分位数样本上限；None 为全部保留（一次性 run，分位数精确），
+    常驻进程（mb-serve）给出上限后改为蓄水池抽样，内存有界、分位数为近似值。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_samples: int | None = None):
+        self._lock = threading.Lock()
+        self.bucket_bounds = tuple(buckets)
+        self.max_samples = max_samples
+        self.stages = {}                        # stage -> _Stage
+        self.rows = defaultdict(int)            # stage -> rows fetched
+        self.counters = defaultdict(int)        # (name, ((label, value), ...)) -> n
+        self._rng = random.Random()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            st = self.stages.get(stage)
+            if st is None:
+                st = self.stages[stage] = _Stage(len(self.bucket_bounds) + 1)
+            st.count += 1
+            st.total += seconds
+            st.buckets[bisect_left(self.bucket_bounds, seconds)] += 1
+            if self.max_samples is None or len(st.samples) < self.max_samples:
+                st.samples.append(seconds)
+            else:
+                # 蓄水池抽样（Algorithm R）：每个观测值留在样本里的概率相同
+                j = self._rng.randrange(st.count)
+                if j < self.max_samples:
+                    st.samples[j] = seconds
+
+    def add_rows(self, stage: str, n: int):
+        with self._lock:
+            self.rows[stage] += n
+
+    def inc(self, name: str, n: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += n
+
+    def summary(self) -> list[dict]:
+        """每个阶段一行：count / total / p50 / p95 / p99（秒）/ rows，按总耗时降序。"""
+        with self._lock:
+            stages = {s: (st.count, st.total, sorted(st.samples)) for s, st in self.stages.items()}
+            rows = dict(self.rows)
+        out = []
+        for stage, (count, total, xs) in stages.items():
+            out.append({"stage": stage, "count": count, "total": total,
+                        "p50": _percentile(xs, 50), "p95": _percentile(xs, 95),
+                        "p99": _percentile(xs, 99), "rows": rows.get(stage)})
+        out.sort(key=lambda r: r["total"], reverse=True)
+        return out
+
+    def prometheus(self, prefix: str = "vgmmb") -> str:
+        """Prometheus 文本格式（供 node_exporter textfile collector 采集）；直方图由桶计数直接给出，不扫样本。"""
+        with self._lock:
+            stages = {s: (st.count, st.total, list(st.buckets)) for s, st in self.stages.items()}
+            rows = dict(self.rows)
+            counters = dict(self.counters)
+        lines = []
+        name = f"{prefix}_stage_duration_seconds"
+        lines += [f"# HELP {name} Time spent per pipeline stage.", f"# TYPE {name} histogram"]
+        for stage, (count, total, per_bucket) in sorted(stages.items()):
+            cumulative = 0
+            for le, n in zip(self.bucket_bounds, per_bucket):
+                cumulative += n
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        if rows:
+            name = f"{prefix}_rows_fetched_total"
+            lines += [f"# HELP {name} Rows fetched from the database per stage.", f"# TYPE {name} counter"]
+            lines += [f'{name}{{stage="{stage}"}} {n}' for stage, n in sorted(rows.items())]
+        by_name = defaultdict(list)
+        for (cname, labels), n in sorted(counters.items()):
+            by_name[cname].append((labels, n))
+        for cname, series in by_name.items():
+            name = f"{prefix}_{cname}_total"
+            lines.append(f"# TYPE {name} counter")
+            for labels, n in series:
+                lbl = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{lbl}}} {n}" if lbl else f"{name} {n}")
+        return "\n".join(lines) + "\n"
+
+def _percentile(sorted_xs, p: float) -> float:
+    # nearest-rank
+    if not sorted_xs:
+        return 0.0
+    k = max(0, min(len(sorted_xs) - 1, -(-len(sorted_xs) * p // 100) - 1))
+    return sorted_xs[int(k)]
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# 未启用时为 None：timer() 返回空操作的上下文，timed() 包装的函数只多一次判断
+_registry: Registry | None = None
+
+def enable(max_samples: int | None = None) -> Registry:
+    global _registry
+    if _registry is None:
+        _registry = Registry(max_samples=max_samples)
+    return _registry
+
+def disable():
+    global _registry
+    _registry = None
+
+def registry() -> Registry | None:
+    return _registry
+
+class _Timer:
+    __slots__ = ("reg", "stage", "t0")
+
+    def __init__(self, reg: Registry, stage: str):
+        self.reg = reg
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.reg.observe(self.stage, perf_counter() - self.t0)
+        return False
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+def timer(stage: str):
+    """with timer("sql_main"): ... —— 记录一段代码的耗时。"""
+    reg = _registry
+    return _NOOP if reg is None else _Timer(reg, stage)
+
+def timed(stage: str):
+    """函数装饰器版的 timer()。"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            reg = _registry
+            if reg is None:
+                return fn(*args, **kwargs)
+            t0 = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                reg.observe(stage, perf_counter() - t0)
+        return wrapper
+    return deco
+
+def add_rows(stage: str, n: int):
+    reg = _registry
+    if reg is not None:
+        reg.add_rows(stage, n)
+
+def inc(name: str, n: int = 1, **labels):
+    reg = _registry
+    if reg is not None:
+        reg.inc(name, n, **labels)
+
+def format_summary(reg: Registry) -> str:
+    lines = [f"{'stage':<16} {'count':>8} {'total_s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'rows':>9}"]
+    for r in reg.summary():
+        rows = "-" if r["rows"] is None else str(r["rows"])
+        lines.append(f"{r['stage']:<16} {r['count']:>8} {r['total']:>9.3f} {r['p50'] * 1e3:>9.2f} "
+                     f"{r['p95'] * 1e3:>9.2f} {r['p99'] * 1e3:>9.2f} {rows:>9}")
+    return "\n".join(lines)
+
+def write_prometheus(reg: Registry, path: Path):
+    # 先写临时文件再改名，采集端不会读到半个文件
+    path = Path(path)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp.write_text(reg.prometheus(), encoding="utf-8")
+    tmp.replace(path)
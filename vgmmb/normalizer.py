@@ -1,115 +1,98 @@
 import json
+import re
+import threading
 from datetime import datetime
 from pathlib import Path
 
-import re
-from itertools import groupby
-
-CAT_RE = re.compile(r'^([A-Za-z0-9]+-?)(\d+)([A-Za-z]?)$')  # 前缀-数字-可选尾字母
+from . import metrics
+from .catalog import CAT_RE, catalog_key, compact_catalog_numbers  # noqa: F401  # CAT_RE: 兼容旧的导入位置
 
-# 加载映射表
 FMT_MAP_PATH = Path(__file__).resolve().parent / "data" / "format_mapping.json"
-with open(FMT_MAP_PATH, encoding="utf-8") as f:
-    FORMAT_MAP = json.load(f)
+_FMT_COUNT_RE = re.compile(r"^(\d+)x?(.*)$")  # 支持 "2Blu-ray"、"2xBlu-ray"
+_FMT_SPLIT_RE = re.compile(r"\+|,")
 
-def map_format(fmt_name: str) -> str:
-    if not fmt_name:
-        return None
-    name = fmt_name.strip()
-    m = re.match(r"^(\d+)x?(.*)$", name)  # 支持 "2Blu-ray"、"2xBlu-ray"
-    prefix_num, core = (m.group(1), m.group(2).strip()) if m else (None, name)
-    mapped_core = FORMAT_MAP.get(core) or ("BD" if "blu" in core.lower() or "bd" in core.lower()
-                                           else "DVD" if "dvd" in core.lower()
-                                           else core)
-    return f"{prefix_num}{mapped_core}" if prefix_num else mapped_core
-
-
-def _lcp(a: str, b: str) -> int:
-    """longest common prefix length for two strings"""
-    n = min(len(a), len(b))
-    i = 0
-    while i < n and a[i] == b[i]:
-        i += 1
-    return i
-
-def compact_catalog_numbers(catalog_numbers):
+class NormalizationContext:
     """
-    输入: ['SVWC-7853','SVWC-7854','SVWC-7855'] ...
-    输出: 'SVWC-7853~5, KSLA-0012~4, SVWC-70359~60'
-    规则:
-      - 仅对同 (prefix, width, tail) 分组内做连续合并
-      - 保留数字宽度(前导0)，尾字母必须一致才归为同组
-      - 非连续编号不合并；无法解析的品番保留原样
+    normalize_record 用到的只读资源：格式映射表、标签别名（预先反转成 casefold 后的
+    别名 -> 规范名）以及格式显示串的缓存。第一次用到时才读文件，之后整个 run 的
+    各条记录、各个 worker 线程共用一份。
     """
-    if not catalog_numbers:
-        return None
 
-    parsed = []
-    leftovers = []  # 解析失败的原样保留
-    for code in catalog_numbers:
-        m = CAT_RE.match(code.strip())
-        if not m:
-            leftovers.append(code.strip())
-            continue
-        prefix, num_str, tail = m.group(1), m.group(2), m.group(3)
-        width = len(num_str)
-        parsed.append({
-            "raw": code.strip(),
-            "prefix": prefix,
-            "num": int(num_str),
-            "num_str": num_str,
-            "width": width,
-            "tail": tail
-        })
-
-    # 先按 (prefix, width, tail, num) 排序，便于 groupby + 连续段识别
-    parsed.sort(key=lambda x: (x["prefix"], x["width"], x["tail"], x["num"]))
-
-    compact_chunks = []
-
-    # 分组：同前缀、同宽度、同尾字母
-    for (prefix, width, tail), items_iter in groupby(parsed, key=lambda x: (x["prefix"], x["width"], x["tail"])):
-        items = list(items_iter)
-        # 连续段切分
-        start = items[0]["num"]
-        prev = start
-        for i in range(1, len(items)):
-            cur = items[i]["num"]
-            if cur != prev + 1:  # 断段
-                # 输出一段 [start, prev]
-                s = f"{start:0{width}d}"
-                e = f"{prev:0{width}d}"
-                # 计算公共前缀长度（数字部分）
-                k = _lcp(s, e)
-                if start == prev:
-                    # 单点：不写 1×，直接回放 raw（更稳妥）
-                    raw = next(x["raw"] for x in items if x["num"] == start)
-                    compact_chunks.append(raw)
-                else:
-                    # 多点范围：prefix + s[:k] + s[k:]~e[k:] + tail
-                    head = s[:k]
-                    left = s[k:]
-                    right = e[k:]
-                    compact_chunks.append(f"{prefix}{head}{left}~{right}{tail}")
-                # 开启新段
-                start = cur
-            prev = cur
-        # 收尾最后一段
-        s = f"{start:0{width}d}"
-        e = f"{prev:0{width}d}"
-        k = _lcp(s, e)
-        if start == prev:
-            raw = next(x["raw"] for x in items if x["num"] == start)
-            compact_chunks.append(raw)
-        else:
-            head = s[:k]
-            left = s[k:]
-            right = e[k:]
-            compact_chunks.append(f"{prefix}{head}{left}~{right}{tail}")
+    def __init__(self, label_alias_path: Path | None = None, label_alias_map: dict | None = None,
+                 format_map_path: Path = FMT_MAP_PATH):
+        self.label_alias_path = Path(label_alias_path) if label_alias_path else None
+        self.format_map_path = Path(format_map_path)
+        self._alias_map = label_alias_map
+        self._format_map = None
+        self._label_lookup = None
+        self._format_cache = {}  # medium_formats 原串 -> 显示串
+        self._lock = threading.Lock()
+
+    @property
+    def format_map(self) -> dict:
+        if self._format_map is None:
+            with self._lock:
+                if self._format_map is None:
+                    with open(self.format_map_path, encoding="utf-8") as f:
+                        self._format_map = json.load(f)
+        return self._format_map
+
+    @property
+    def label_lookup(self) -> dict:
+        if self._label_lookup is None:
+            with self._lock:
+                if self._label_lookup is None:
+                    alias_map = self._alias_map
+                    if alias_map is None:
+                        alias_map = load_label_alias(self.label_alias_path)
+                    lookup = {}
+                    # 与旧的线性扫描一致：多个规范名都含同一别名时，取先出现的那个
+                    for canonical, aliases in alias_map.items():
+                        lookup.setdefault(canonical.casefold(), canonical)
+                        for alias in aliases or ():
+                            lookup.setdefault(alias.casefold(), canonical)
+                    self._label_lookup = lookup
+        return self._label_lookup
+
+    def canonical_label(self, name: str) -> str:
+        if not name:
+            return name
+        return self.label_lookup.get(name.casefold(), name)
+
+    def map_format(self, fmt_name: str) -> str:
+        if not fmt_name:
+            return None
+        name = fmt_name.strip()
+        m = _FMT_COUNT_RE.match(name)
+        prefix_num, core = (m.group(1), m.group(2).strip()) if m else (None, name)
+        lower = core.lower()
+        mapped_core = self.format_map.get(core) or ("BD" if "blu" in lower or "bd" in lower
+                                                    else "DVD" if "dvd" in lower
+                                                    else core)
+        return f"{prefix_num}{mapped_core}" if prefix_num else mapped_core
+
+    def format_display(self, raw_fmt: str) -> str:
+        """"2Blu-ray+CD" -> "2BD+CD"；同一原串只算一次（常见组合就那么几十种）。"""
+        if not raw_fmt:
+            return "Unknown"
+        cached = self._format_cache.get(raw_fmt)
+        if cached is None:
+            parts = [p.strip() for p in _FMT_SPLIT_RE.split(raw_fmt) if p.strip()]
+            cached = "+".join(dict.fromkeys(self.map_format(p) for p in parts))  # 去重保持顺序
+            self._format_cache[raw_fmt] = cached
+        return cached
+
+_default_context = None
+
+def default_context() -> NormalizationContext:
+    """包内格式映射、无标签别名的共享上下文。"""
+    global _default_context
+    if _default_context is None:
+        _default_context = NormalizationContext(label_alias_map={})
+    return _default_context
 
-    # 拼上解析失败的原样项（保持稳定顺序，放在末尾更直观；也可放在最前）
-    compact_all = compact_chunks + leftovers
-    return ", ".join(compact_all)
+def map_format(fmt_name: str) -> str:
+    return default_context().map_format(fmt_name)
 
 
 def _fmt_mmss(ms):
@@ -119,7 +102,7 @@ def _fmt_mmss(ms):
     m, s = divmod(sec, 60)
     return f"{m}:{s:02d}"
 
-def load_label_alias(path: Path):
+def load_label_alias(path: Path | None):
     if path and path.exists():
         # 兼容 Windows 可能带 BOM 的 UTF-8
         return json.loads(path.read_text(encoding="utf-8-sig"))
@@ -149,44 +132,45 @@ def build_caa_urls(release_gid: str, img_id: int, ext: str):
         "thumb_1200": f"{base}-1200.{ext}",
     }
 
-def normalize_record(best, artists, tracks, label_alias_map=None, cover=None):
+def build_image(release_gid: str, cover: dict) -> dict:
+    """封面查询的一行（queries.resolve_covers 的输出）-> JSON 中的图片对象。"""
+    img_id = int(cover["id"])
+    return {
+        "id": img_id,
+        "is_front": bool(cover["is_front"]),
+        "mime": cover.get("mime_type"),
+        "bytes": cover.get("filesize"),
+        "urls": build_caa_urls(release_gid, img_id, _ext_from_suffix(cover.get("file_suffix"))),
+    }
+
+@metrics.timed("normalize")
+def normalize_record(best, artists, tracks, ctx: NormalizationContext | None = None, cover=None):
+    """ctx 为 NormalizationContext（整个 run 共用一个）；传旧式的别名 dict 也可以，但每次都会重建反查表。"""
+    if ctx is None:
+        ctx = default_context()
+    elif not isinstance(ctx, NormalizationContext):
+        ctx = NormalizationContext(label_alias_map=ctx)
     product_name = best["release_title"]
     edition_name = (best.get("edition_note") or "").strip() or None
     if edition_name is None:
         edition_name = "通常盤"
-    label_name = best["label_name"] or ""
-    if label_alias_map:
-        for canonical, aliases in label_alias_map.items():
-            if label_name == canonical or label_name in aliases:
-                label_name = canonical
-                break
+    label_name = ctx.canonical_label(best["label_name"] or "")
     # 解析日期（ISO 格式字符串）
     date_str = ""
     if best.get("release_date"):
         # psycopg2 自动转成 datetime.date
         date_str = str(best["release_date"])
-    # 构造封面（可拼接 URL）
+    # 构造封面（可拼接 URL）：cover 为最优一张（dict），或全部图片（list，最优的在前 → 另写 images.all）
     images = {}
     if cover:
-        ext = _ext_from_suffix(cover.get("file_suffix"))
-        urls = build_caa_urls(str(best["release_gid"]), int(cover["id"]), ext)
-        images["cover"] = {
-            "id": int(cover["id"]),
-            "is_front": bool(cover["is_front"]),
-            "mime": cover.get("mime_type"),
-            "bytes": cover.get("filesize"),
-            "urls": urls,
-        }
-
-    raw_fmt = best.get("medium_formats") or ""
-    if raw_fmt:
-        # 拆分，如 "2Blu-ray+CD" → ["2Blu-ray", "CD"]
-        parts = [p.strip() for p in re.split(r"\+|,", raw_fmt) if p.strip()]
-        mapped_parts = [map_format(p) for p in parts]
-        fmt_display = "+".join(dict.fromkeys(mapped_parts))  # 去重保持顺序
-    else:
-        fmt_display = "Unknown"
+        gid = str(best["release_gid"])
+        if isinstance(cover, list):
+            images["all"] = [build_image(gid, c) for c in cover]
+            images["cover"] = images["all"][0]
+        else:
+            images["cover"] = build_image(gid, cover)
 
+    fmt_display = ctx.format_display(best.get("medium_formats") or "")
 
     out = {
         "source": {
@@ -227,3 +211,34 @@ def normalize_record(best, artists, tracks, label_alias_map=None, cover=None):
         "images": images
     }
     return out
+
+
+def build_range_resolution(input_cat: str, members, best, found) -> dict:
+    """
+    区间输入的逐号归属：members 为展开后的各号，best 为首号选中的 release，
+    found 为同一次批量查询的结果 {catalog: (best, artists, tracks, cover)}。
+    先看成员是否在首号 release 的全部品番里；不在时才用该号自己的查询结果判定。
+      split   = 成员分属多个 release
+      missing = 查不到的成员
+    """
+    primary = str(best["release_gid"]) if best["release_gid"] else None
+    own = {catalog_key(c) for c in best.get("catalog_numbers") or []}
+    rows, missing, releases = [], [], []
+    for m in members:
+        if catalog_key(m) in own:
+            gid = primary
+        else:
+            other = (found.get(m) or (None,))[0]
+            gid = str(other["release_gid"]) if other and other["release_gid"] else None
+        if gid is None:
+            missing.append(m)
+        elif gid not in releases:
+            releases.append(gid)
+        rows.append({"catalog_number": m, "release": gid})
+    return {
+        "input": input_cat,
+        "members": rows,
+        "releases": releases,
+        "split": len(releases) > 1,
+        "missing": missing,
+    }
@@ -0,0 +1,90 @@
+import re
+
+from .catalog import expand_catalog_range, first_from_catalog_ranges, is_catalog_range
+from .io import write_json
+from .manifest import STATUS_ERROR, STATUS_NOT_FOUND, STATUS_OK, STATUS_SCHEMA_ERROR
+from .normalizer import build_range_resolution
+from .schema import validate
+from .suggest import format_suggestions
+
+# mb-lookup 批量模式与 mb-serve 共用的逐块处理：一次批量查询 → 逐条 normalize / validate / 输出。
+# args 只读取 resolve_range / validate / out 三项。
+
+def safe_basename(name: str) -> str:
+    n = (name or "").strip()
+    # 过滤 Windows 非法字符 \/:*?"<>|，以及尾部空格/点
+    n = re.sub(r'[\\/:*?"<>|]+', "_", n)
+    return n.rstrip(" .")
+
+def range_members(raw: str, args):
+    # --resolve-range：区间输入展开成全部成员号，与首号放进同一次批量查询
+    if args.resolve_range and is_catalog_range(raw):
+        return expand_catalog_range(raw)
+    return None
+
+def make_entry(raw, cat, status, messages=(), release=None, output=None) -> dict:
+    # 一条输入的处理结果：既用于打印状态行，也写入 manifest
+    return {"input": raw.strip(), "catalog": cat, "status": status, "release": release,
+            "output": str(output) if output else None, "messages": list(messages)}
+
+def emit_one(raw, cat, found, out_dir, args, schema, normalize, suggest=None) -> dict:
+    """
+    处理一条已查询的输入（found 为整块的批量查询结果），返回处理结果（见 make_entry）。
+    normalize(best, artists, tracks, cover) 返回可修改的记录（RunMemo.normalize）。
+    """
+    # 取首号为空的输入（如 "~"）不会出现在查询结果里，按未命中处理
+    best, artists, tracks, cover = found.get(cat, (None, None, None, None))
+    if not best:
+        messages = [f"[NOT FOUND] {cat or raw.strip()}"]
+        if suggest is not None and cat:
+            messages.append(f"[SUGGEST] {cat} -> {format_suggestions(suggest(cat)) or '-'}")
+        return make_entry(raw, cat, STATUS_NOT_FOUND, messages)
+    out = normalize(best, artists, tracks, cover=cover)
+    # ✅ 无论单/区间，都记录“原始输入”到 JSON
+    input_cat = raw.strip()
+    out.setdefault("identifiers", {})["catalog_number_compact"] = input_cat
+    members = range_members(input_cat, args)
+    notes = []
+    if members:
+        rr = out["range_resolution"] = build_range_resolution(input_cat, members, best, found)
+        if rr["split"]:
+            notes.append(f"[RANGE SPLIT] {raw} -> {len(rr['releases'])} releases")
+        if rr["missing"]:
+            notes.append(f"[RANGE MISSING] {raw} -> {', '.join(rr['missing'])}")
+    release = out["identifiers"]["mbids"]["release"]
+
+    if args.validate:
+        errors = validate(out, schema)
+        if errors:
+            return make_entry(raw, cat, STATUS_SCHEMA_ERROR,
+                          [f"[SCHEMA ERROR] {raw} -> {e.message} at {list(e.path)}" for e in errors],
+                          release=release)
+
+    if out_dir is None:
+        # NDJSON：记录交回主线程按输入顺序写入同一个流
+        result = make_entry(raw, cat, STATUS_OK, notes, release=release, output=args.out or "-")
+        result["record"] = out
+        return result
+
+    # ✅ 用“原始输入”命名文件（而不是 cat 首号）
+    outfile = out_dir / f"{safe_basename(input_cat)}.json"
+    write_json(out, outfile)
+    return make_entry(raw, cat, STATUS_OK, notes, release=release, output=outfile)
+
+def process_chunk(raws, out_dir, args, schema, normalize, lookup, suggest=None) -> list[dict]:
+    # 一个 worker 处理一块：一次批量查询 → 逐条 normalize / validate / write
+    chunk = list(zip(raws, first_from_catalog_ranges(raws)))
+    wanted = [cat for _, cat in chunk]
+    for raw, _ in chunk:
+        wanted.extend(range_members(raw, args) or [])
+    try:
+        found = lookup(wanted)
+    except Exception as ex:
+        return [make_entry(raw, cat, STATUS_ERROR, [f"[ERROR] {cat}: {ex}"]) for raw, cat in chunk]
+    entries = []
+    for raw, cat in chunk:
+        try:
+            entries.append(emit_one(raw, cat, found, out_dir, args, schema, normalize, suggest))
+        except Exception as ex:
+            entries.append(make_entry(raw, cat, STATUS_ERROR, [f"[ERROR] {cat}: {ex}"]))
+    return entries
@@ -1,9 +1,18 @@
-from .db import connect, dict_cursor
+import os
+import threading
+
+import psycopg2.errors
+
+from . import metrics
+from .catalog import catalog_key
+from .db import BROKEN_CONN_ERRORS, execute_prepared, get_pool, pooled_cursor
+from .index import CATALOG_KEY_FUNC, SQL_KEY_INDEX_VALID
 
 OFFICIAL_STATUS_ID = 1  # MusicBrainz: status=1 通常表示 official
 
-SQL_MAIN = """
-SELECT
+# SQL_MAIN 的列与 JOIN：单条与批量（SQL_MAIN_BULK）、快照构建共用。
+# 原先每行 4 个相关子查询，现改为 LATERAL 聚合：release_country 一次扫描同时得出 is_jp 与最早日期。
+_SQL_MAIN_COLUMNS = """
   rl.catalog_number,
   r.id            AS release_id,
   r.gid           AS release_gid,
@@ -17,62 +26,145 @@ SELECT
   r.barcode,
   r.status        AS release_status,
   r.packaging,
-  -- JP 发行标记
-  CASE WHEN EXISTS (
-    SELECT 1
-    FROM musicbrainz.release_country rc
-    JOIN musicbrainz.iso_3166_1 i1 ON i1.area = rc.country
-    WHERE rc.release = r.id AND i1.code = 'JP'
-  ) THEN TRUE ELSE FALSE END AS is_jp,
-
-  -- 发行日期：取最早的一条
-  (
-    SELECT make_date(rc.date_year, COALESCE(rc.date_month, 1), COALESCE(rc.date_day, 1))
-    FROM musicbrainz.release_country rc
-    WHERE rc.release = r.id AND rc.date_year IS NOT NULL
-    ORDER BY rc.date_year ASC, rc.date_month ASC NULLS LAST, rc.date_day ASC NULLS LAST
-    LIMIT 1
-  ) AS release_date,
+  rcs.is_jp,
+  rcs.release_date,
 
   -- ★ 版本注记 / 状态 / 包装
   r.comment AS edition_note,
   rs.name   AS release_status_name,
   rp.name   AS packaging_name,
 
+  fmts.medium_formats,
+  cns.catalog_numbers
+"""
+
+_SQL_BASE_JOINS = """
+JOIN musicbrainz.release r        ON r.id = rl.release
+JOIN musicbrainz.release_group rg ON rg.id = r.release_group
+JOIN musicbrainz.label l          ON l.id = rl.label
+"""
+
+# 排序要用的列：JP 发行标记 + 发行日期（取最早的一条，year/month/day 依次升序，空值排后）
+_SQL_RANK_LATERALS = """
+CROSS JOIN LATERAL (
+  SELECT
+    COALESCE(bool_or(i1.code = 'JP'), FALSE) AS is_jp,
+    (array_agg(make_date(rc.date_year, COALESCE(rc.date_month, 1), COALESCE(rc.date_day, 1))
+               ORDER BY rc.date_year ASC, rc.date_month ASC NULLS LAST, rc.date_day ASC NULLS LAST)
+       FILTER (WHERE rc.date_year IS NOT NULL))[1] AS release_date
+  FROM musicbrainz.release_country rc
+  LEFT JOIN musicbrainz.iso_3166_1 i1 ON i1.area = rc.country
+  WHERE rc.release = r.id
+) rcs
+"""
 
-  -- ★ 格式聚合（修正：保留数量 → 2×CD + DVD-Video）
-(
+_SQL_DETAIL_JOINS = """
+LEFT JOIN musicbrainz.release_status    rs ON rs.id = r.status
+LEFT JOIN musicbrainz.release_packaging rp ON rp.id = r.packaging
+-- ★ 格式聚合（保留数量 → 2CD+DVD-Video）
+LEFT JOIN LATERAL (
   SELECT STRING_AGG(
            CASE WHEN mc.cnt > 1 THEN mc.cnt::text || '' || mc.fmt ELSE mc.fmt END,
            '+' ORDER BY mc.fmt
-         )
+         ) AS medium_formats
   FROM (
-    SELECT
-      COALESCE(mf.name, 'Unknown') AS fmt,
-      COUNT(*) AS cnt
+    SELECT COALESCE(mf.name, 'Unknown') AS fmt, COUNT(*) AS cnt
     FROM musicbrainz.medium m
     LEFT JOIN musicbrainz.medium_format mf ON mf.id = m.format
     WHERE m.release = r.id
     GROUP BY COALESCE(mf.name, 'Unknown')
   ) AS mc
-) AS medium_formats,
+) fmts ON TRUE
+-- ★ 所有品番
+LEFT JOIN LATERAL (
+  SELECT array_agg(DISTINCT rl2.catalog_number) AS catalog_numbers
+  FROM musicbrainz.release_label rl2
+  WHERE rl2.release = r.id AND rl2.catalog_number IS NOT NULL
+) cns ON TRUE
+"""
+
+_SQL_MAIN_JOINS = _SQL_BASE_JOINS + _SQL_RANK_LATERALS + _SQL_DETAIL_JOINS
 
-  -- ★ 所有品番
-  (
-    SELECT array_agg(DISTINCT rl2.catalog_number)
-    FROM musicbrainz.release_label rl2
-    WHERE rl2.release = r.id AND rl2.catalog_number IS NOT NULL
-  ) AS catalog_numbers
+# 与 _rank_release 相同的打分；同分时按 _rank_key 的次序（release / label / 品番）取第一条
+_SQL_RANK_ORDER = f"""
+  (CASE WHEN rcs.is_jp THEN 10 ELSE 0 END
+   + CASE WHEN r.status = {OFFICIAL_STATUS_ID} THEN 5 ELSE 0 END
+   + COALESCE(GREATEST(0, 3000 - EXTRACT(YEAR FROM rcs.release_date)::int), 0)) DESC,
+  r.id ASC, rl.label ASC, rl.catalog_number COLLATE "C" ASC
+"""
 
+def _ranked(candidates: str, bulk: bool) -> str:
+    """
+    candidates：FROM ... WHERE 片段（rl 为命中的 release_label）。
+    先只算排序列、在库里选出每条输入的最优行，再只对选中的行做格式 / 品番聚合。
+    选出的行连同 is_jp / release_date 一起带出（CTE 别名即 rcs），外层不必再扫 release_country。
+    """
+    rank_cols = "rl.id AS rl_id, rcs.is_jp, rcs.release_date"
+    if bulk:
+        pick = (f"SELECT DISTINCT ON (q.catalog) q.catalog AS query_catalog, {rank_cols}\n"
+                f"{candidates}\nORDER BY q.catalog, {_SQL_RANK_ORDER}")
+        head = "rcs.query_catalog,"
+    else:
+        pick = f"SELECT {rank_cols}\n{candidates}\nORDER BY {_SQL_RANK_ORDER}\nLIMIT 1"
+        head = ""
+    return f"""
+WITH best AS (
+{pick}
+)
+SELECT {head}
+{_SQL_MAIN_COLUMNS}
+FROM best rcs
+JOIN musicbrainz.release_label rl ON rl.id = rcs.rl_id
+{_SQL_BASE_JOINS}{_SQL_DETAIL_JOINS}
+"""
+
+_CAND_ILIKE = f"""
 FROM musicbrainz.release_label rl
-JOIN musicbrainz.release r        ON r.id = rl.release
-JOIN musicbrainz.release_group rg ON rg.id = r.release_group
-JOIN musicbrainz.label l          ON l.id = rl.label
-LEFT JOIN musicbrainz.release_status    rs ON rs.id = r.status
-LEFT JOIN musicbrainz.release_packaging rp ON rp.id = r.packaging
+{_SQL_BASE_JOINS}{_SQL_RANK_LATERALS}
 WHERE rl.catalog_number ILIKE %s
 """
 
+# 一次查整块 catalog：unnest 成虚表再按 ILIKE 连接，query_catalog 标明是哪条输入命中的
+_CAND_BULK_ILIKE = f"""
+FROM unnest(%s::text[]) AS q(catalog)
+JOIN musicbrainz.release_label rl ON rl.catalog_number ILIKE q.catalog
+{_SQL_BASE_JOINS}{_SQL_RANK_LATERALS}
+"""
+
+# 索引匹配：按归一化品番键（vgmmb.catalog.catalog_key）等值比较，走 mb-index 建的表达式索引
+_CAND_KEYED = f"""
+FROM musicbrainz.release_label rl
+{_SQL_BASE_JOINS}{_SQL_RANK_LATERALS}
+WHERE {CATALOG_KEY_FUNC}(rl.catalog_number) = %s
+"""
+
+_CAND_BULK_KEYED = f"""
+FROM unnest(%s::text[], %s::text[]) AS q(catalog, catalog_key)
+JOIN musicbrainz.release_label rl ON {CATALOG_KEY_FUNC}(rl.catalog_number) = q.catalog_key
+{_SQL_BASE_JOINS}{_SQL_RANK_LATERALS}
+"""
+
+# 旧匹配方式：ILIKE 无法走 b-tree 索引，仅在未执行 `mb-index install` 时回退使用。
+# 以下 4 条都只返回最优的一行（批量版每条输入一行）
+SQL_MAIN = _ranked(_CAND_ILIKE, bulk=False)
+SQL_MAIN_BULK = _ranked(_CAND_BULK_ILIKE, bulk=True)
+SQL_MAIN_KEYED = _ranked(_CAND_KEYED, bulk=False)
+SQL_MAIN_BULK_KEYED = _ranked(_CAND_BULK_KEYED, bulk=True)
+
+# 全部候选行（不排序），供排序一致性核对（benchmarks parity）使用
+SQL_MAIN_CANDIDATES_BULK = f"""
+SELECT
+  q.catalog AS query_catalog,
+{_SQL_MAIN_COLUMNS}
+FROM unnest(%s::text[]) AS q(catalog)
+JOIN musicbrainz.release_label rl ON rl.catalog_number ILIKE q.catalog
+{_SQL_MAIN_JOINS}
+"""
+
+# 函数在、且表达式索引可用（不是建到一半的 INVALID 索引）才走键匹配，否则键匹配会退化成全表扫描
+SQL_HAS_CATALOG_KEY = (f"SELECT to_regprocedure('{CATALOG_KEY_FUNC}(text)') IS NOT NULL "
+                       f"AND {SQL_KEY_INDEX_VALID} AS ok")
+
 
 SQL_ARTIST = """
 SELECT acn.position, acn.join_phrase, COALESCE(acn.name, a.name) AS display_name
@@ -97,9 +189,37 @@ WHERE rm.release = %s
 ORDER BY rm.position, t.position
 """
 
-# 取一张“最优封面”：优先 Front，其次按 ordering 升序
-SQL_COVER_ONE = """
+# —— 批量版：一次取一组 release_id 的艺人 / 曲目 / 封面，release_id 列用于回填 ——
+SQL_ARTIST_BULK = """
+SELECT r.id AS release_id, acn.position, acn.join_phrase, COALESCE(acn.name, a.name) AS display_name
+FROM release r
+JOIN artist_credit ac ON ac.id = r.artist_credit
+JOIN artist_credit_name acn ON acn.artist_credit = ac.id
+LEFT JOIN artist a ON a.id = acn.artist
+WHERE r.id = ANY(%s::int[])
+ORDER BY r.id, acn.position
+"""
+
+SQL_TRACKS_BULK = """
+SELECT rm.release  AS release_id,
+       rm.position AS disc_no,
+       t.position  AS track_no,
+       t.number    AS track_num_label,
+       COALESCE(t.name, rec.name) AS track_title,
+       rec.length  AS track_length_ms
+FROM medium rm
+JOIN track t ON t.medium = rm.id
+LEFT JOIN recording rec ON rec.id = t.recording
+WHERE rm.release = ANY(%s::int[])
+ORDER BY rm.release, rm.position, t.position
+"""
+
+# 封面：每张图一行，is_front 由 cover_art_type 连接后聚合得出（原先每张图一次相关 EXISTS）
+COVER_ALL = "all"  # with_cover 取此值时返回每个 release 的全部图片
+
+_SQL_COVER_IMAGES = """
 SELECT
+  ca.release AS release_id,
   ca.id,
   ca.mime_type,
   it.suffix AS file_suffix,
@@ -107,19 +227,68 @@ SELECT
   ca.thumb_250_filesize,
   ca.thumb_500_filesize,
   ca.thumb_1200_filesize,
-  EXISTS (
-    SELECT 1
-    FROM cover_art_archive.cover_art_type cat
-    JOIN cover_art_archive.art_type at ON at.id = cat.type_id
-    WHERE cat.id = ca.id AND at.name = 'Front'
-  ) AS is_front
+  COALESCE(bool_or(at.name = 'Front'), FALSE) AS is_front,
+  ca.ordering
 FROM cover_art_archive.cover_art ca
-LEFT JOIN cover_art_archive.image_type it ON it.mime_type = ca.mime_type
-WHERE ca.release = %s
-ORDER BY is_front DESC, ca.ordering ASC
-LIMIT 1
+LEFT JOIN cover_art_archive.cover_art_type cat ON cat.id = ca.id
+LEFT JOIN cover_art_archive.art_type at        ON at.id = cat.type_id
+LEFT JOIN cover_art_archive.image_type it      ON it.mime_type = ca.mime_type
+WHERE ca.release = ANY(%s::int[])
+GROUP BY ca.id, it.suffix
+"""
+
+# 每个 release 一张“最优封面”：优先 Front，其次按 ordering 升序
+SQL_COVER_BULK = f"""
+SELECT DISTINCT ON (img.release_id) img.*
+FROM ({_SQL_COVER_IMAGES}) img
+ORDER BY img.release_id, img.is_front DESC, img.ordering ASC
+"""
+
+# 每个 release 的全部图片，同样的先后顺序（最优的在前）
+SQL_COVER_ALL_BULK = f"""
+SELECT img.*
+FROM ({_SQL_COVER_IMAGES}) img
+ORDER BY img.release_id, img.is_front DESC, img.ordering ASC
 """
 
+# 镜像当前的复制序号：每次 replication 后递增，用作本地缓存的失效依据
+SQL_REPLICATION_SEQ = """
+SELECT current_replication_sequence FROM musicbrainz.replication_control LIMIT 1
+"""
+
+SQL_ALL_CATALOG_NUMBERS = """
+SELECT DISTINCT catalog_number FROM musicbrainz.release_label WHERE catalog_number IS NOT NULL
+"""
+
+DEFAULT_CHUNK_SIZE = 500
+
+# —— 增量刷新（mb-lookup --refresh）：记录的每个来源表，以及它与 release r 的关联条件 ——
+# 时间列取 _REFRESH_TIME_COLUMNS 中该表第一个存在的列（MB 的 artist_credit 只有 created，封面只有 date_uploaded）
+_REFRESH_SOURCES = (
+    ("musicbrainz.release", "x.id = r.id"),
+    ("musicbrainz.release_group", "x.id = r.release_group"),
+    ("musicbrainz.release_label", "x.release = r.id"),
+    ("musicbrainz.label", "x.id IN (SELECT rl.label FROM musicbrainz.release_label rl WHERE rl.release = r.id)"),
+    ("musicbrainz.medium", "x.release = r.id"),
+    ("musicbrainz.track", "x.medium IN (SELECT m.id FROM musicbrainz.medium m WHERE m.release = r.id)"),
+    ("musicbrainz.recording", "x.id IN (SELECT t.recording FROM musicbrainz.medium m "
+                              "JOIN musicbrainz.track t ON t.medium = m.id WHERE m.release = r.id)"),
+    ("musicbrainz.artist_credit", "x.id = r.artist_credit"),
+    ("musicbrainz.artist", "x.id IN (SELECT acn.artist FROM musicbrainz.artist_credit_name acn "
+                           "WHERE acn.artist_credit = r.artist_credit)"),
+    ("cover_art_archive.cover_art", "x.release = r.id"),
+)
+_REFRESH_TIME_COLUMNS = ("last_updated", "created", "date_uploaded")
+
+SQL_REFRESH_COLUMNS = """
+SELECT table_schema || '.' || table_name AS tbl, column_name
+FROM information_schema.columns
+WHERE table_schema || '.' || table_name = ANY(%s) AND column_name = ANY(%s)
+"""
+
+# 一次刷新检查的条数：四个数组参数，几千条一块足够摊薄往返
+REFRESH_CHUNK_SIZE = 5000
+
 def _rank_release(row):
     score = 0
     if row.get("is_jp"):
@@ -133,25 +302,234 @@ def _rank_release(row):
         score += 0  # 没日期不加分
     return score
 
-def query_by_catalog(catalog: str, with_cover: bool = False):
-    with connect() as conn, dict_cursor(conn) as cur:
-        cur.execute(SQL_MAIN, (catalog,))
+def _rank_key(row):
+    # 分数高者优先；同分按 release id、label id、品番（码位序）升序，与 SQL 的 _SQL_RANK_ORDER 一致
+    return (-_rank_release(row), row["release_id"], row["label_id"], row["catalog_number"])
+
+def _best_release(rows):
+    return min(rows, key=_rank_key)
+
+_keyed_match = None
+_keyed_match_lock = threading.Lock()
+
+def _use_keyed_match(cur) -> bool:
+    """
+    是否使用归一化键匹配：MB_CATALOG_MATCH=ilike/key 强制指定，
+    默认 auto —— 检测镜像里是否装了 vgmmb_catalog_key() 且其表达式索引有效（每进程只查一次）。
+    """
+    global _keyed_match
+    mode = os.getenv("MB_CATALOG_MATCH", "auto").lower()
+    if mode in ("ilike", "key"):
+        return mode == "key"
+    with _keyed_match_lock:
+        if _keyed_match is None:
+            cur.execute(SQL_HAS_CATALOG_KEY)
+            _keyed_match = bool(cur.fetchone()["ok"])
+        return _keyed_match
+
+def keyed_match() -> bool:
+    """当前的匹配口径（同 _use_keyed_match）；auto 且尚未检测时借一个连接查一次。"""
+    mode = os.getenv("MB_CATALOG_MATCH", "auto").lower()
+    if mode in ("ilike", "key"):
+        return mode == "key"
+    if _keyed_match is not None:
+        return _keyed_match
+    with pooled_cursor() as cur:
+        return _use_keyed_match(cur)
+
+def _query_by_catalog(cur, catalog: str, with_cover: bool):
+    keyed = _use_keyed_match(cur)
+    with metrics.timer("sql_main"):
+        if keyed:
+            execute_prepared(cur, "vgmmb_main_keyed", SQL_MAIN_KEYED, (catalog_key(catalog),))
+        else:
+            execute_prepared(cur, "vgmmb_main", SQL_MAIN, (catalog,))
         rows = cur.fetchall()
-        if not rows:
-            return None, None, None, None
+    metrics.add_rows("sql_main", len(rows))
+    if not rows:
+        return None, None, None, None
 
-        best = sorted(rows, key=_rank_release, reverse=True)[0]
-        rid = best["release_id"]
+    best = rows[0]  # SQL 已按 _rank_key 的规则选好
+    rid = best["release_id"]
 
-        cur.execute(SQL_ARTIST, (rid,))
+    with metrics.timer("sql_artist"):
+        execute_prepared(cur, "vgmmb_artist", SQL_ARTIST, (rid,))
         artists = cur.fetchall()
+    metrics.add_rows("sql_artist", len(artists))
 
-        cur.execute(SQL_TRACKS, (rid,))
+    with metrics.timer("sql_tracks"):
+        execute_prepared(cur, "vgmmb_tracks", SQL_TRACKS, (rid,))
         tracks = cur.fetchall()
+    metrics.add_rows("sql_tracks", len(tracks))
+
+    cover = resolve_covers(cur, [rid], all_images=with_cover == COVER_ALL).get(rid) if with_cover else None
+    return best, artists, tracks, cover
+
+def query_by_catalog(catalog: str, with_cover: bool = False):
+    # 连接从进程级连接池借用；若借到的连接已断开（DB 重启等），换新连接重试一次
+    try:
+        with pooled_cursor() as cur:
+            return _query_by_catalog(cur, catalog, with_cover)
+    except BROKEN_CONN_ERRORS:
+        with pooled_cursor() as cur:
+            return _query_by_catalog(cur, catalog, with_cover)
+
+def resolve_covers(cur, release_ids, all_images: bool = False) -> dict:
+    """
+    一次查询取一组 release 的封面：release_id -> 最优封面（Front 优先，其次 ordering），
+    all_images=True 时为该 release 全部图片的列表（最优的在前）。没有图片的 release 不在结果里。
+    """
+    if all_images:
+        rows = _fetch_bulk(cur, "sql_cover", "vgmmb_cover_all_bulk", SQL_COVER_ALL_BULK, (list(release_ids),))
+        return _group_by_release(rows)
+    rows = _fetch_bulk(cur, "sql_cover", "vgmmb_cover_bulk", SQL_COVER_BULK, (list(release_ids),))
+    return {row["release_id"]: row for row in rows}
+
+def _group_by_release(rows):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row["release_id"], []).append(row)
+    return grouped
+
+def _fetch_bulk(cur, stage: str, name: str, sql: str, params: tuple) -> list:
+    with metrics.timer(stage):
+        execute_prepared(cur, name, sql, params)
+        rows = cur.fetchall()
+    metrics.add_rows(stage, len(rows))
+    return rows
 
-        cover = None
-        if with_cover:
-            cur.execute(SQL_COVER_ONE, (rid,))
-            cover = cur.fetchone()
+def _query_chunk(cur, catalogs: list, with_cover: bool, releases=None) -> dict:
+    if _use_keyed_match(cur):
+        keys = [catalog_key(c) for c in catalogs]
+        rows = _fetch_bulk(cur, "sql_main", "vgmmb_main_bulk_keyed", SQL_MAIN_BULK_KEYED, (catalogs, keys))
+    else:
+        rows = _fetch_bulk(cur, "sql_main", "vgmmb_main_bulk", SQL_MAIN_BULK, (catalogs,))
+    # 每条 catalog 一行：最优 release 已在 SQL 里选好（规则同 _rank_key）
+    chosen = {row.pop("query_catalog"): row for row in rows}
+
+    # releases：本 run 已取过的 release -> (artists, tracks, cover)，只为其余的发 SQL
+    per_release = {}
+    rids = []
+    for rid in sorted({best["release_id"] for best in chosen.values()}):
+        known = releases.get(rid) if releases is not None else None
+        if known is not None:
+            per_release[rid] = known
+        else:
+            rids.append(rid)
+
+    if rids:
+        artists = _group_by_release(
+            _fetch_bulk(cur, "sql_artist", "vgmmb_artist_bulk", SQL_ARTIST_BULK, (rids,)))
+        tracks = _group_by_release(
+            _fetch_bulk(cur, "sql_tracks", "vgmmb_tracks_bulk", SQL_TRACKS_BULK, (rids,)))
+        covers = resolve_covers(cur, rids, all_images=with_cover == COVER_ALL) if with_cover else {}
+        for rid in rids:
+            per_release[rid] = (artists.get(rid, []), tracks.get(rid, []), covers.get(rid))
+            if releases is not None:
+                releases[rid] = per_release[rid]
+
+    result = {}
+    for cat in catalogs:
+        best = chosen.get(cat)
+        if best is None:
+            result[cat] = (None, None, None, None)
+            continue
+        result[cat] = (best, *per_release[best["release_id"]])
+    return result
+
+def query_by_catalogs(catalogs, with_cover: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      releases=None) -> dict:
+    """
+    批量版 query_by_catalog：每块 chunk_size 条 catalog 只发 3~4 条 SQL。
+    返回 {catalog: (best, artists, tracks, cover)}，未命中为 (None, None, None, None)。
+    with_cover：False 不取封面；True 取最优一张（dict）；COVER_ALL 取全部图片（list，最优的在前）。
+    releases：可选的 release_id -> (artists, tracks, cover) 表（如 memo.RunMemo.releases），
+    命中的 release 不再查艺人 / 曲目 / 封面，新取到的写回；同一张表须用同一个 with_cover。
+    """
+    unique = list(dict.fromkeys(c for c in catalogs if c))
+    result = {}
+    for i in range(0, len(unique), max(1, chunk_size)):
+        chunk = unique[i:i + chunk_size]
+        try:
+            with pooled_cursor() as cur:
+                result.update(_query_chunk(cur, chunk, with_cover, releases))
+        except BROKEN_CONN_ERRORS:
+            with pooled_cursor() as cur:
+                result.update(_query_chunk(cur, chunk, with_cover, releases))
+    return result
+
+def current_replication_sequence():
+    """返回镜像的 replication 序号；非复制镜像（无该表 / 无数据）返回 None。"""
+    try:
+        with pooled_cursor() as cur:
+            cur.execute(SQL_REPLICATION_SEQ)
+            row = cur.fetchone()
+    except psycopg2.errors.UndefinedTable:
+        return None
+    return row["current_replication_sequence"] if row else None
+
+def iter_catalog_numbers(batch_size: int = 50000):
+    """流式产出 release_label 中的全部品番（去重），供近似检索索引构建。"""
+    with get_pool().connection() as conn:
+        # 命名游标需要事务；用完回滚，连接仍以 autocommit 归还
+        conn.autocommit = False
+        try:
+            with conn.cursor(name="vgmmb_catalogs") as cur:
+                cur.itersize = batch_size
+                cur.execute(SQL_ALL_CATALOG_NUMBERS)
+                for (catalog_number,) in cur:
+                    yield catalog_number
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+
+_refresh_columns = None
+
+def _refresh_time_columns(cur) -> dict:
+    """{来源表: 时间列}；镜像里没有时间列的表不参与比较（每进程只查一次）。"""
+    global _refresh_columns
+    if _refresh_columns is None:
+        cur.execute(SQL_REFRESH_COLUMNS, ([t for t, _ in _REFRESH_SOURCES], list(_REFRESH_TIME_COLUMNS)))
+        present = {(row["tbl"], row["column_name"]) for row in cur.fetchall()}
+        _refresh_columns = {t: next(c for c in _REFRESH_TIME_COLUMNS if (t, c) in present)
+                            for t, _ in _REFRESH_SOURCES
+                            if any((t, c) in present for c in _REFRESH_TIME_COLUMNS)}
+    return _refresh_columns
+
+def _sql_stale(columns: dict, keyed: bool) -> str:
+    # 记录过期的条件：原 release 已删除 / 合并；任一来源行在采集之后有改动；
+    # 同一品番有新增 / 改动的 release_label（最优 release 可能易主，上次未命中的也可能有了结果）
+    conds = ["(s.release_gid IS NOT NULL AND r.id IS NULL)"]
+    for table, on in _REFRESH_SOURCES:
+        col = columns.get(table)
+        if col:
+            conds.append(f"EXISTS (SELECT 1 FROM {table} x WHERE {on} AND x.{col} > s.since)")
+    col = columns.get("musicbrainz.release_label")
+    if keyed and col:
+        conds.append(f"EXISTS (SELECT 1 FROM musicbrainz.release_label x "
+                     f"WHERE {CATALOG_KEY_FUNC}(x.catalog_number) = s.catalog_key AND x.{col} > s.since)")
+    where = "\n   OR ".join(conds)
+    return f"""
+SELECT s.input
+FROM unnest(%s::text[], %s::text[], %s::timestamptz[], %s::text[]) AS s(input, release_gid, since, catalog_key)
+LEFT JOIN musicbrainz.release r ON r.gid = s.release_gid::uuid
+WHERE {where}
+"""
 
-        return best, artists, tracks, cover
+def stale_inputs(items, chunk_size: int = REFRESH_CHUNK_SIZE) -> set:
+    """
+    items：(input, release_gid 或 None, since, catalog) 序列，since 为带时区的 datetime。
+    返回来源在 since 之后有变化、需要重新生成的 input 集合；每块 chunk_size 条只发一条 SQL。
+    """
+    items = list(items)
+    stale = set()
+    with pooled_cursor() as cur:
+        columns = _refresh_time_columns(cur)
+        sql = _sql_stale(columns, _use_keyed_match(cur))
+        for i in range(0, len(items), max(1, chunk_size)):
+            chunk = items[i:i + chunk_size]
+            params = ([it[0] for it in chunk], [it[1] for it in chunk], [it[2] for it in chunk],
+                      [catalog_key(it[3]) for it in chunk])
+            rows = _fetch_bulk(cur, "sql_refresh", "vgmmb_refresh", sql, params)
+            stale.update(row["input"] for row in rows)
+    return stale
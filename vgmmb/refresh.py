@@ -0,0 +1,75 @@
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from .catalog import first_from_catalog_range
+from .manifest import MANIFEST_NAME, STATUS_ERROR, STATUS_OK, Manifest
+
+REFRESH_SOURCES = ("auto", "json", "manifest")
+
+# MB 的 last_updated 是上游编辑的时间，复制包晚些才落到本地镜像：
+# 采集前不久在上游改动、采集后才同步过来的行，last_updated 会早于 collected_at。
+# 比较时把采集时间往前推这么多小时，覆盖正常的复制延迟。
+DEFAULT_MARGIN_HOURS = 48.0
+
+class RefreshItem(NamedTuple):
+    input: str                      # 原始输入（= identifiers.catalog_number_compact，也是输出文件名）
+    release: str | None             # 上次命中的 release MBID；未命中为 None
+    collected_at: datetime | None   # None：上次出错 / 时间不明，无条件重跑
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def items_from_manifest(path: Path) -> list[RefreshItem]:
+    # 以 manifest 的记录时间为采集时间（略晚于 source.collected_at，差距由 margin 覆盖）
+    items = []
+    for raw, entry in Manifest(path).entries.items():
+        status = entry["status"]
+        if status == STATUS_OK and not (entry.get("output") and Path(entry["output"]).exists()):
+            status = STATUS_ERROR  # 输出文件被删了：重新生成
+        at = None if status == STATUS_ERROR else _parse_time(entry.get("at"))
+        items.append(RefreshItem(raw, entry.get("release"), at))
+    return items
+
+def items_from_json(out_dir: Path) -> list[RefreshItem]:
+    items = []
+    for path in sorted(out_dir.glob("*.json")):
+        try:
+            record = json.loads(path.read_text(encoding="utf-8"))
+            ids = record["identifiers"]
+            raw = ids.get("catalog_number_compact") or path.stem
+        except (OSError, ValueError, KeyError, TypeError):
+            continue  # 不是本工具写出的记录
+        release = (ids.get("mbids") or {}).get("release")
+        items.append(RefreshItem(raw, release, _parse_time((record.get("source") or {}).get("collected_at"))))
+    return items
+
+def load_items(out_dir: Path, source: str = "auto") -> list[RefreshItem]:
+    """
+    从输出目录收集待检查的记录：
+      manifest  读 _manifest.jsonl（最快，也包括上次未命中 / 出错的输入）
+      json      逐个读 *.json 的 identifiers.mbids.release 与 source.collected_at
+      auto      有 manifest 用 manifest，否则读 JSON
+    """
+    manifest_path = out_dir / MANIFEST_NAME
+    if source == "manifest" or (source == "auto" and manifest_path.exists()):
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"no {MANIFEST_NAME} in {out_dir}")
+        return items_from_manifest(manifest_path)
+    return items_from_json(out_dir)
+
+def select_stale(backend, items, margin_hours: float = DEFAULT_MARGIN_HOURS) -> list[str]:
+    """返回需要重新生成的输入（保持 items 的顺序）：来源有变化的，加上采集时间不明 / 上次出错的。"""
+    margin = timedelta(hours=margin_hours)
+    forced = {it.input for it in items if it.collected_at is None}
+    checked = [(it.input, it.release, it.collected_at - margin, first_from_catalog_range(it.input))
+               for it in items if it.collected_at is not None]
+    stale = backend.stale_inputs(checked) if checked else set()
+    return [it.input for it in items if it.input in forced or it.input in stale]
@@ -1,6 +1,10 @@
-from pathlib import Path
 import json
-from jsonschema import Draft202012Validator
+import threading
+from pathlib import Path
+
+from . import metrics
+
+# jsonschema 导入较慢（约 0.1s），放到第一次加载 / 校验时再导入，mb-lookup --help 不必为它等待
 
 def load_schema(path: Path):
     try:
@@ -9,11 +13,49 @@ def load_schema(path: Path):
     except json.JSONDecodeError as e:
         snippet = text[:120].replace("\n", "\\n")
         raise SystemExit(f"[Schema JSON error] {path} at pos {e.pos}: {e.msg}\n"
-                         f"→ File begins with: {snippet}")
+                         f"→ File begins with: {snippet}") from None
+    from jsonschema import Draft202012Validator
     Draft202012Validator.check_schema(data)
     return data
 
+# 每个 schema 只编译一次：{id(schema): (schema, validator)}；保存 schema 引用以免 id 被复用
+_validators = {}
+_validators_lock = threading.Lock()
+
+def get_validator(schema: dict):
+    """返回 schema 的编译后校验器（进程内缓存）。校验器只读，可在多个 worker 线程间共享。"""
+    key = id(schema)
+    cached = _validators.get(key)
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+    with _validators_lock:
+        cached = _validators.get(key)
+        if cached is None or cached[0] is not schema:
+            from jsonschema import Draft202012Validator
+            cached = (schema, Draft202012Validator(schema))
+            _validators[key] = cached
+        return cached[1]
+
+def is_valid(instance: dict, schema: dict) -> bool:
+    """快速路径：只判断通过与否，遇到第一个错误即停止。"""
+    return get_validator(schema).is_valid(instance)
+
+@metrics.timed("validate")
 def validate(instance: dict, schema: dict):
-    validator = Draft202012Validator(schema)
+    validator = get_validator(schema)
+    # 绝大多数记录是合法的：先走快速路径，失败时才收集并排序完整错误列表
+    if validator.is_valid(instance):
+        return []
     errors = sorted(validator.iter_errors(instance), key=lambda e: e.path)
     return errors
+
+def validate_many(instances, schema: dict) -> list:
+    """批量校验，返回与输入一一对应的错误列表（合法记录为空列表）。"""
+    validator = get_validator(schema)
+    results = []
+    for instance in instances:
+        if validator.is_valid(instance):
+            results.append([])
+        else:
+            results.append(sorted(validator.iter_errors(instance), key=lambda e: e.path))
+    return results
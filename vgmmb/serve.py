@@ -0,0 +1,285 @@
+import argparse
+import ipaddress
+import json
+import logging
+import socket
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from . import metrics
+from .backend import open_backend
+from .db import configure_pool
+from .io import resolve_pkg_file
+from .log import setup_logging
+from .manifest import STATUS_ERROR, STATUS_NOT_FOUND, STATUS_OK, STATUS_SCHEMA_ERROR
+from .memo import RunMemo
+from .normalizer import NormalizationContext
+from .pipeline import process_chunk
+from .queries import COVER_ALL, DEFAULT_CHUNK_SIZE
+from .schema import get_validator, load_schema
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_ENTRIES = 50_000
+# 单次 POST 的上限：再大就该走 mb-lookup --batch
+DEFAULT_MAX_BATCH = 5_000
+MAX_BODY_BYTES = 8 * 1024 * 1024
+METRIC_SAMPLES = 4096
+
+_HTTP_STATUS = {
+    STATUS_OK: HTTPStatus.OK,
+    STATUS_NOT_FOUND: HTTPStatus.NOT_FOUND,
+    STATUS_SCHEMA_ERROR: HTTPStatus.UNPROCESSABLE_ENTITY,
+    STATUS_ERROR: HTTPStatus.INTERNAL_SERVER_ERROR,
+}
+# 指标里只按已知路由打标签，乱填的路径归到 other，序列数有界
+_ROUTES = ("/lookup", "/health", "/metrics")
+
+def _is_loopback(host: str) -> bool:
+    # 主机名要求全部解析结果都是回环地址（localhost 可能同时解析出 127.0.0.1 与 ::1）
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return bool(infos) and all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos)
+
+class LookupService:
+    """
+    mb-serve 的常驻状态，所有请求线程共享：
+      - backend：进程级连接池（启动时预热），或 SQLite 快照
+      - ctx / schema：别名、格式映射与编译后的校验器启动时加载一次
+      - memo：RunMemo 充当内存 LRU 结果缓存（按后端匹配口径合并并发的同一品番）；
+        镜像复制序号变化时整体换新，不会返回同步前的旧记录
+    单条与批量都走 mb-lookup 批量模式的同一段处理（pipeline.process_chunk），输出与 mb-lookup 完全一致。
+    """
+
+    def __init__(self, backend, args, schema=None, ctx=None):
+        self.backend = backend
+        self.args = args
+        self.schema = schema
+        self.ctx = ctx or NormalizationContext()
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._sequence = self._fetch_sequence()
+        self._checked = time.monotonic()
+        self._memo = self._new_memo()
+
+    def _new_memo(self):
+        return RunMemo(self._query_many, self.ctx, max_entries=self.args.cache_entries,
+                       key=self.backend.match_key)
+
+    def _query_many(self, catalogs, releases=None):
+        return self.backend.query_by_catalogs(catalogs, with_cover=self.args.with_cover,
+                                              chunk_size=self.args.chunk_size, releases=releases)
+
+    def _fetch_sequence(self):
+        # None 是正常结果（镜像没有复制表 / 快照未记录序号）；只有查询本身失败才算后端不可用
+        try:
+            seq = self.backend.replication_sequence()
+        except Exception as ex:
+            log.warning("replication sequence unavailable: %s", ex)
+            self._backend_ok = False
+            return None
+        self._backend_ok = True
+        return seq
+
+    def memo(self) -> RunMemo:
+        # 至多每 --sequence-check 秒查一次复制序号；变化则丢弃全部缓存结果
+        now = time.monotonic()
+        if now - self._checked >= self.args.sequence_check:
+            with self._lock:
+                if now - self._checked >= self.args.sequence_check:
+                    self._checked = now
+                    seq = self._fetch_sequence()
+                    if seq is not None and seq != self._sequence:
+                        log.info("replication sequence %s -> %s, dropping cached results", self._sequence, seq)
+                        self._sequence = seq
+                        self._memo = self._new_memo()
+                        metrics.inc("serve_cache_resets")
+        return self._memo
+
+    def lookup_many(self, raws) -> list[dict]:
+        """返回与输入一一对应的处理结果（见 pipeline.make_entry）；命中的带 record。"""
+        memo = self.memo()
+        entries = []
+        for i in range(0, len(raws), self.args.chunk_size):
+            entries.extend(process_chunk(raws[i:i + self.args.chunk_size], None, self.args, self.schema,
+                                         memo.normalize, memo.lookup))
+        for entry in entries:
+            entry.pop("output", None)
+            metrics.inc("serve_lookups", status=entry["status"])
+        return entries
+
+    def health(self) -> dict:
+        # 不逐次查库：沿用 memo() 按 --sequence-check 节奏做的检查结果
+        self.memo()
+        return {
+            "status": "ok" if self._backend_ok else "degraded",
+            "backend": self.args.backend,
+            "replication_sequence": self._sequence,
+            "cached_results": len(self._memo),
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "mb-serve"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> LookupService:
+        return self.server.service
+
+    def log_message(self, fmt, *args):
+        log.debug("%s %s", self.address_string(), fmt % args)
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        if not isinstance(body, bytes):
+            body = (json.dumps(body, ensure_ascii=False) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        metrics.inc("serve_requests", path=self._route, status=int(status))
+
+    def _error(self, status, message):
+        self._send(status, {"error": message})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self._route = url.path if url.path in _ROUTES else "other"
+        with metrics.timer(f"serve {self._route}"):
+            if url.path == "/lookup":
+                catalogs = parse_qs(url.query).get("catalog")
+                if not catalogs or not catalogs[0].strip():
+                    return self._error(HTTPStatus.BAD_REQUEST, "missing ?catalog=")
+                entry = self.service.lookup_many([catalogs[0]])[0]
+                # 单条：命中直接返回记录本身（与 mb-lookup --catalog 输出的 JSON 相同）
+                if entry["status"] == STATUS_OK:
+                    return self._send(HTTPStatus.OK, entry["record"])
+                return self._send(_HTTP_STATUS[entry["status"]], entry)
+            if url.path == "/health":
+                body = self.service.health()
+                ok = body["status"] == "ok"
+                return self._send(HTTPStatus.OK if ok else HTTPStatus.SERVICE_UNAVAILABLE, body)
+            if url.path == "/metrics":
+                reg = metrics.registry()
+                return self._send(HTTPStatus.OK, reg.prometheus().encode("utf-8"),
+                                  "text/plain; version=0.0.4; charset=utf-8")
+        self._error(HTTPStatus.NOT_FOUND, f"no route {url.path}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        self._route = url.path if url.path in _ROUTES else "other"
+        # 连接是 keep-alive 的：任何应答之前先把请求体读完，读不了的就关连接，
+        # 否则剩下的请求体会被当成下一个请求解析
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            return self._error(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"body exceeds {MAX_BODY_BYTES} bytes")
+        body = self.rfile.read(length)
+        if url.path != "/lookup":
+            return self._error(HTTPStatus.NOT_FOUND, f"no route {url.path}")
+        try:
+            catalogs = json.loads(body or b"{}").get("catalogs")
+        except (ValueError, AttributeError):
+            return self._error(HTTPStatus.BAD_REQUEST, 'expected JSON body {"catalogs": [...]}')
+        if not isinstance(catalogs, list) or not all(isinstance(c, str) for c in catalogs):
+            return self._error(HTTPStatus.BAD_REQUEST, '"catalogs" must be a list of strings')
+        if len(catalogs) > self.service.args.max_batch:
+            return self._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f"at most {self.service.args.max_batch} catalogs per request")
+        with metrics.timer("serve /lookup bulk"):
+            raws = [c for c in catalogs if c.strip()]
+            self._send(HTTPStatus.OK, {"results": self.service.lookup_many(raws)})
+
+class LookupServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: LookupService):
+        host = address[0]
+        if ":" in host:
+            self.address_family = socket.AF_INET6
+        super().__init__(address, _Handler)
+        self.service = service
+
+def main():
+    setup_logging()
+    p = argparse.ArgumentParser(
+        prog="mb-serve",
+        description="Serve catalog lookups as a local HTTP/JSON API with warm connections and caches"
+    )
+    p.add_argument("--host", default="127.0.0.1", help="Loopback address to bind (non-loopback is refused)")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--backend", default="postgres",
+                   help="Data source: 'postgres' (default) or 'snapshot:PATH' (built by mb-snapshot)")
+    p.add_argument("--validate", action="store_true", help="Validate every record against the schema")
+    p.add_argument("--with-cover", action="store_true", help="Fetch one best cover (Front preferred)")
+    p.add_argument("--all-covers", action="store_true",
+                   help="Also list every cover-art image under images.all (implies --with-cover)")
+    p.add_argument("--resolve-range", action="store_true",
+                   help="Resolve every member of range inputs and report range_resolution")
+    p.add_argument("--schema", default=None)
+    p.add_argument("--label-alias", default=None)
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                   help="Catalogs resolved per bulk SQL round trip")
+    p.add_argument("--pool-min", type=int, default=2, help="Pooled DB connections opened at startup")
+    p.add_argument("--pool-max", type=int, default=8, help="Max pooled DB connections (concurrent requests)")
+    p.add_argument("--cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES,
+                   help="In-memory LRU size (catalog results, releases and records each)")
+    p.add_argument("--sequence-check", type=float, default=60.0,
+                   help="Seconds between replication-sequence checks; a new sequence drops cached results")
+    p.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                   help="Max catalogs per POST /lookup request")
+    args = p.parse_args()
+    if not _is_loopback(args.host):
+        raise SystemExit(f"[SERVE] refusing to bind non-loopback address {args.host!r}")
+    if args.all_covers:
+        args.with_cover = COVER_ALL
+    # process_chunk 读取的 mb-lookup 参数
+    args.out = None
+    args.chunk_size = max(1, args.chunk_size)
+
+    if args.schema is None:
+        args.schema = resolve_pkg_file("data/schemas/mb-album-v1.json")
+    if args.label_alias is None:
+        args.label_alias = resolve_pkg_file("data/label_alias.json")
+    schema = None
+    if args.validate:
+        schema = load_schema(Path(args.schema))
+        get_validator(schema)
+    # 常驻进程：别名 / 格式映射启动时就读入，第一个请求不必等
+    ctx = NormalizationContext(label_alias_path=args.label_alias or None)
+    _ = ctx.label_lookup
+    _ = ctx.format_map
+
+    # 常驻进程：直方图按桶计数，分位数样本每阶段至多 METRIC_SAMPLES 个
+    metrics.enable(max_samples=METRIC_SAMPLES)
+    configure_pool(args.pool_min, max(args.pool_min, args.pool_max))
+    try:
+        backend = open_backend(args.backend)
+    except (ValueError, FileNotFoundError) as ex:
+        raise SystemExit(f"[BACKEND ERROR] {ex}") from None
+    # 构造时会取一次复制序号，连接池随之建立
+    service = LookupService(backend, args, schema, ctx)
+    server = LookupServer((args.host, args.port), service)
+    log.info("mb-serve listening on http://%s:%d (backend=%s, sequence=%s)",
+             args.host, server.server_address[1], args.backend, service._sequence)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        backend.close()
@@ -0,0 +1,361 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import psycopg2.extras
+
+from . import metrics
+from .catalog import catalog_key
+from .db import connect
+from .log import setup_logging
+from .queries import (
+    _SQL_MAIN_COLUMNS,
+    _SQL_MAIN_JOINS,
+    COVER_ALL,
+    SQL_ARTIST_BULK,
+    SQL_COVER_ALL_BULK,
+    SQL_TRACKS_BULK,
+    _best_release,
+    current_replication_sequence,
+)
+
+SNAPSHOT_FORMAT = 1
+
+# 快照是查询结果形状的去规范化存储：release 行即 SQL_MAIN 中与 release/label 无关的列
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key   TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS release (
+  release_id          INTEGER PRIMARY KEY,
+  release_gid         TEXT,
+  release_title       TEXT,
+  rg_id               INTEGER,
+  rg_gid              TEXT,
+  rg_title            TEXT,
+  barcode             TEXT,
+  release_status      INTEGER,
+  packaging           INTEGER,
+  is_jp               INTEGER,
+  release_date        TEXT,
+  edition_note        TEXT,
+  release_status_name TEXT,
+  packaging_name      TEXT,
+  medium_formats      TEXT,
+  catalog_numbers     TEXT
+);
+CREATE TABLE IF NOT EXISTS label (
+  label_id   INTEGER PRIMARY KEY,
+  label_gid  TEXT,
+  label_name TEXT
+);
+CREATE TABLE IF NOT EXISTS release_label (
+  catalog_key    TEXT    NOT NULL,
+  catalog_number TEXT    NOT NULL,
+  release_id     INTEGER NOT NULL,
+  label_id       INTEGER NOT NULL,
+  PRIMARY KEY (catalog_key, release_id, label_id, catalog_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS artist (
+  release_id   INTEGER NOT NULL,
+  position     INTEGER NOT NULL,
+  join_phrase  TEXT,
+  display_name TEXT,
+  PRIMARY KEY (release_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS track (
+  release_id      INTEGER NOT NULL,
+  disc_no         INTEGER NOT NULL,
+  track_no        INTEGER NOT NULL,
+  track_num_label TEXT,
+  track_title     TEXT,
+  track_length_ms INTEGER,
+  PRIMARY KEY (release_id, disc_no, track_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cover (
+  release_id          INTEGER NOT NULL,
+  id                  INTEGER NOT NULL,
+  mime_type           TEXT,
+  file_suffix         TEXT,
+  filesize            INTEGER,
+  thumb_250_filesize  INTEGER,
+  thumb_500_filesize  INTEGER,
+  thumb_1200_filesize INTEGER,
+  is_front            INTEGER NOT NULL,
+  ordering            INTEGER,
+  PRIMARY KEY (release_id, id)
+) WITHOUT ROWID;
+"""
+
+_RELEASE_COLS = [
+    "release_id", "release_gid", "release_title", "rg_id", "rg_gid", "rg_title", "barcode",
+    "release_status", "packaging", "is_jp", "release_date", "edition_note",
+    "release_status_name", "packaging_name", "medium_formats", "catalog_numbers",
+]
+
+# 构建时按 release 取全部封面（查询时再挑最优），ordering 一并保存
+SQL_JP_FILTER = """
+EXISTS (
+  SELECT 1
+  FROM musicbrainz.release_country rc
+  JOIN musicbrainz.iso_3166_1 i1 ON i1.area = rc.country
+  WHERE rc.release = r.id AND i1.code = 'JP'
+)
+"""
+
+# —— 构建（需要 Postgres） ——
+
+def _insert_chunk(db, sql, rows, cols):
+    db.executemany(sql, [tuple(r[c] for c in cols) for r in rows])
+
+def build_snapshot(out_path: Path, jp_only: bool = False, prefixes=None, catalogs=None,
+                   chunk_size: int = 2000) -> dict:
+    """
+    从 Postgres 镜像抽取 release_label / release / label / artist / track / cover 到单文件 SQLite。
+    过滤条件可组合：仅 JP 发行、品番前缀、指定品番清单。
+    """
+    where = ["rl.catalog_number IS NOT NULL"]
+    params = []
+    if jp_only:
+        where.append(SQL_JP_FILTER)
+    if prefixes:
+        where.append("rl.catalog_number ILIKE ANY(%s)")
+        params.append([f"{p}%" for p in prefixes])
+    if catalogs:
+        where.append("rl.catalog_number ILIKE ANY(%s)")
+        params.append(list(catalogs))
+    sql = (f"SELECT\n{_SQL_MAIN_COLUMNS}\nFROM musicbrainz.release_label rl\n{_SQL_MAIN_JOINS}\n"
+           f"WHERE {' AND '.join(where)}")
+
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    db = sqlite3.connect(tmp_path, isolation_level=None)
+    db.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + _SCHEMA)
+    db.execute("BEGIN")
+
+    started = time.time()
+    release_ids = set()
+    n_rl = 0
+    conn = connect()
+    try:
+        # 命名游标 = 服务端游标，流式拉取，不会把全部 release_label 读进内存
+        with conn.cursor(name="vgmmb_snapshot", cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql, params)
+            for row in cur:
+                rid = row["release_id"]
+                if rid not in release_ids:
+                    release_ids.add(rid)
+                    rel = dict(row)
+                    rel["release_gid"] = str(rel["release_gid"]) if rel["release_gid"] else None
+                    rel["rg_gid"] = str(rel["rg_gid"]) if rel["rg_gid"] else None
+                    rel["release_date"] = rel["release_date"].isoformat() if rel["release_date"] else None
+                    rel["catalog_numbers"] = json.dumps(rel["catalog_numbers"] or [], ensure_ascii=False)
+                    db.execute(f"INSERT OR IGNORE INTO release VALUES ({', '.join('?' * len(_RELEASE_COLS))})",
+                               tuple(rel[c] for c in _RELEASE_COLS))
+                db.execute("INSERT OR IGNORE INTO label VALUES (?, ?, ?)",
+                           (row["label_id"], str(row["label_gid"]) if row["label_gid"] else None,
+                            row["label_name"]))
+                db.execute("INSERT OR IGNORE INTO release_label VALUES (?, ?, ?, ?)",
+                           (catalog_key(row["catalog_number"]), row["catalog_number"], rid, row["label_id"]))
+                n_rl += 1
+        conn.rollback()
+
+        rids = sorted(release_ids)
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            for i in range(0, len(rids), chunk_size):
+                chunk = rids[i:i + chunk_size]
+                cur.execute(SQL_ARTIST_BULK, (chunk,))
+                _insert_chunk(db, "INSERT OR IGNORE INTO artist VALUES (?, ?, ?, ?)", cur.fetchall(),
+                              ["release_id", "position", "join_phrase", "display_name"])
+                cur.execute(SQL_TRACKS_BULK, (chunk,))
+                _insert_chunk(db, "INSERT OR IGNORE INTO track VALUES (?, ?, ?, ?, ?, ?)", cur.fetchall(),
+                              ["release_id", "disc_no", "track_no", "track_num_label", "track_title",
+                               "track_length_ms"])
+                cur.execute(SQL_COVER_ALL_BULK, (chunk,))
+                _insert_chunk(db, "INSERT OR IGNORE INTO cover VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              cur.fetchall(),
+                              ["release_id", "id", "mime_type", "file_suffix", "filesize",
+                               "thumb_250_filesize", "thumb_500_filesize", "thumb_1200_filesize",
+                               "is_front", "ordering"])
+        conn.rollback()
+    finally:
+        conn.close()
+
+    seq = current_replication_sequence()
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "replication_sequence": "" if seq is None else seq,
+        "filters": json.dumps({"jp_only": jp_only, "prefixes": prefixes or [],
+                               "catalogs": len(catalogs or [])}),
+        "releases": len(release_ids),
+        "release_labels": n_rl,
+    }
+    db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+    db.execute("COMMIT")
+    db.execute("ANALYZE")
+    db.execute("VACUUM")
+    db.close()
+    tmp_path.replace(out_path)
+    meta["seconds"] = round(time.time() - started, 1)
+    return meta
+
+# —— 查询 ——
+
+class SnapshotBackend:
+    """
+    只读快照后端：与 queries.query_by_catalogs 同样的返回形状，按归一化品番键匹配。
+    每个线程一个只读 SQLite 连接，可直接用于 --workers；close() 关闭所有线程打开的连接。
+    """
+
+    name = "snapshot"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"snapshot not found: {self.path}")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+        meta = dict(self._db().execute("SELECT key, value FROM meta").fetchall())
+        if int(meta.get("format", 0)) != SNAPSHOT_FORMAT:
+            raise ValueError(f"unsupported snapshot format in {self.path}: {meta.get('format')}")
+        self.meta = meta
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+            with self._lock:
+                self._conns.append(db)
+        return db
+
+    def replication_sequence(self):
+        seq = self.meta.get("replication_sequence")
+        return int(seq) if seq else None
+
+    @property
+    def cache_source(self) -> str:
+        return f"snapshot:{self.path.resolve()}"
+
+    @property
+    def cache_generation(self) -> str:
+        # 同一路径重新 build（筛选条件可能不同）时复制序号未必变化，以构建时间区分
+        return self.meta.get("built_at", "")
+
+    def match_mode(self) -> str:
+        return "key"  # 快照始终按归一化品番键匹配
+
+    @staticmethod
+    def match_key(catalog: str) -> str:
+        return catalog_key(catalog)
+
+    def iter_catalog_numbers(self):
+        for (catalog_number,) in self._db().execute("SELECT DISTINCT catalog_number FROM release_label"):
+            yield catalog_number
+
+    @staticmethod
+    def _main_row(row) -> dict:
+        d = dict(row)
+        d["is_jp"] = bool(d["is_jp"])
+        d["release_date"] = date.fromisoformat(d["release_date"]) if d["release_date"] else None
+        d["catalog_numbers"] = json.loads(d["catalog_numbers"]) if d["catalog_numbers"] else None
+        return d
+
+    def _lookup_one(self, db, catalog: str, with_cover: bool, releases=None):
+        with metrics.timer("sql_main"):
+            rows = db.execute(
+                "SELECT rl.catalog_number, l.label_id, l.label_gid, l.label_name, r.* "
+                "FROM release_label rl "
+                "JOIN release r ON r.release_id = rl.release_id "
+                "JOIN label l ON l.label_id = rl.label_id "
+                "WHERE rl.catalog_key = ?",
+                (catalog_key(catalog),),
+            ).fetchall()
+        metrics.add_rows("sql_main", len(rows))
+        if not rows:
+            return None, None, None, None
+        best = _best_release(self._main_row(r) for r in rows)
+        rid = best["release_id"]
+        known = releases.get(rid) if releases is not None else None
+        if known is not None:
+            return (best, *known)
+        with metrics.timer("sql_artist"):
+            artists = [dict(r) for r in db.execute(
+                "SELECT position, join_phrase, display_name FROM artist WHERE release_id = ? ORDER BY position",
+                (rid,))]
+        metrics.add_rows("sql_artist", len(artists))
+        with metrics.timer("sql_tracks"):
+            tracks = [dict(r) for r in db.execute(
+                "SELECT disc_no, track_no, track_num_label, track_title, track_length_ms "
+                "FROM track WHERE release_id = ? ORDER BY disc_no, track_no", (rid,))]
+        metrics.add_rows("sql_tracks", len(tracks))
+        cover = None
+        if with_cover:
+            with metrics.timer("sql_cover"):
+                rows = db.execute(
+                    "SELECT id, mime_type, file_suffix, filesize, thumb_250_filesize, thumb_500_filesize, "
+                    "thumb_1200_filesize, is_front FROM cover WHERE release_id = ? "
+                    "ORDER BY is_front DESC, ordering ASC" + ("" if with_cover == COVER_ALL else " LIMIT 1"),
+                    (rid,)).fetchall()
+            metrics.add_rows("sql_cover", len(rows))
+            images = [dict(r, is_front=bool(r["is_front"])) for r in rows]
+            if with_cover == COVER_ALL:
+                cover = images or None
+            elif images:
+                cover = images[0]
+        if releases is not None:
+            releases[rid] = (artists, tracks, cover)
+        return best, artists, tracks, cover
+
+    def query_by_catalogs(self, catalogs, with_cover: bool = False, chunk_size: int | None = None,
+                          releases=None) -> dict:
+        db = self._db()
+        return {cat: self._lookup_one(db, cat, with_cover, releases)
+                for cat in dict.fromkeys(c for c in catalogs if c)}
+
+    def close(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+            # 其它线程里留下的引用一并作废，之后再用会重新打开
+            self._local = threading.local()
+        for db in conns:
+            db.close()
+
+def main():
+    setup_logging()
+    p = argparse.ArgumentParser(
+        prog="mb-snapshot",
+        description="Build a compact offline SQLite snapshot from the MusicBrainz mirror"
+    )
+    sub = p.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Extract releases into a snapshot file")
+    p_build.add_argument("--out", required=True, help="Snapshot file to write (e.g. mb-snapshot.sqlite)")
+    p_build.add_argument("--jp-only", action="store_true", help="Only releases with a JP release country")
+    p_build.add_argument("--prefix", action="append", default=[],
+                         help="Catalog-number prefix to include (repeatable, e.g. --prefix SECL)")
+    p_build.add_argument("--catalogs", help="File with catalog numbers to include (one per line)")
+    p_info = sub.add_parser("info", help="Show snapshot metadata")
+    p_info.add_argument("path")
+    args = p.parse_args()
+
+    if args.cmd == "info":
+        for k, v in SnapshotBackend(Path(args.path)).meta.items():
+            print(f"{k}: {v}")
+        return
+
+    catalogs = None
+    if args.catalogs:
+        from .catalog import first_from_catalog_ranges
+        from .io import read_lines
+        catalogs = first_from_catalog_ranges(read_lines(Path(args.catalogs)))
+    meta = build_snapshot(Path(args.out), jp_only=args.jp_only, prefixes=args.prefix, catalogs=catalogs)
+    print("[SNAPSHOT] " + " ".join(f"{k}={v}" for k, v in meta.items()))
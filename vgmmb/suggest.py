@@ -0,0 +1,169 @@
+import gzip
+import pickle
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from .catalog import catalog_key
+
+INDEX_FORMAT = 1
+INDEX_NAME = "catalog_index.pkl.gz"
+MAX_POSTING = 20000
+
+# 易混字符：比较 n-gram 时折叠成同一个字符，计算编辑距离时替换代价减半
+_CONFUSABLE = {"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "S": "5", "B": "8", "Z": "2"}
+_FOLD = str.maketrans(_CONFUSABLE)
+_CONFUSABLE_PAIRS = {frozenset(p) for p in _CONFUSABLE.items()}
+
+def _fold(key: str) -> str:
+    return key.translate(_FOLD)
+
+def _grams(folded: str) -> set:
+    s = f"^{folded}$"
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _sub_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    return 0.5 if frozenset((a, b)) in _CONFUSABLE_PAIRS else 1.0
+
+def edit_distance(a: str, b: str, limit: float = float("inf")) -> float:
+    """
+    OSA 编辑距离（含相邻换位），易混字符替换记 0.5。
+    整行都已超过 limit 时提前返回（结果只保证 > limit）。
+    """
+    prev2 = None
+    prev = [float(j) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        cur = [float(i)] + [0.0] * len(b)
+        for j in range(1, len(b) + 1):
+            cb = b[j - 1]
+            sub = prev[j - 1] if ca == cb else prev[j - 1] + _sub_cost(ca, cb)
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, sub)
+            if (prev2 is not None and j > 1
+                    and ca == b[j - 2] and a[i - 2] == cb):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return min(cur)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+class CatalogIndex:
+    """
+    品番近似检索：对归一化键（catalog_key + 易混字符折叠）建 trigram 倒排索引，
+    先按共享 gram 数取候选，再按编辑距离排序。可 pickle 到磁盘快速重载。
+    """
+
+    def __init__(self, catalogs=(), meta=None):
+        self.meta = dict(meta or {})
+        self.catalogs = []           # id -> 原始品番（同一键保留第一个写法）
+        self.keys = []               # id -> catalog_key
+        self.grams = {}              # gram -> array('I') of ids
+        seen = set()
+        for raw in catalogs:
+            key = catalog_key(raw)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            idx = len(self.keys)
+            self.catalogs.append(raw)
+            self.keys.append(key)
+            for g in _grams(_fold(key)):
+                self.grams.setdefault(g, array("I")).append(idx)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def suggest(self, catalog: str, limit: int = 5, max_distance: float = 2.0,
+                candidates: int = 50) -> list[tuple[str, float]]:
+        """返回 [(品番, 距离)]，按距离升序；距离超过 max_distance 的丢弃。"""
+        key = catalog_key(catalog)
+        if not key:
+            return []
+        # 先用短倒排表；极常见的 gram（如 "^SE"）倒排表过长时跳过，除非没有别的可用
+        postings = sorted((ids for g in _grams(_fold(key)) if (ids := self.grams.get(g)) is not None),
+                          key=len)
+        counts = Counter()
+        used = 0
+        for ids in postings:
+            if counts and len(ids) > MAX_POSTING:
+                break
+            counts.update(ids)
+            used += 1
+        # q-gram 下界：插入 / 删除 / 替换最多破坏 3 个 trigram，相邻换位最多 4 个；
+        # 共享数不足的候选不可能在距离内（易混字符已折叠，不破坏 gram）
+        min_shared = max(1, used - 4 * int(max_distance + 0.5))
+        scored = []
+        for idx, shared in counts.most_common(candidates):
+            if shared < min_shared:
+                break
+            other = self.keys[idx]
+            if abs(len(other) - len(key)) > max_distance:
+                continue
+            d = edit_distance(key, other, max_distance)
+            if d <= max_distance:
+                scored.append((d, self.catalogs[idx]))
+        scored.sort()
+        return [(cat, d) for d, cat in scored[:limit]]
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with gzip.open(tmp, "wb", compresslevel=1) as f:
+            pickle.dump((INDEX_FORMAT, self.meta, self.catalogs, self.keys, self.grams), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        with gzip.open(path, "rb") as f:
+            fmt, meta, catalogs, keys, grams = pickle.load(f)
+        if fmt != INDEX_FORMAT:
+            raise ValueError(f"unsupported catalog index format: {fmt}")
+        obj = cls.__new__(cls)
+        obj.meta, obj.catalogs, obj.keys, obj.grams = meta, catalogs, keys, grams
+        return obj
+
+class Suggester:
+    """
+    懒加载的“您是不是要找”：第一次需要时从磁盘载入索引；索引不存在、数据源不同或
+    镜像 replication 序号已变化时，从后端（backend.iter_catalog_numbers）重建并落盘。
+    """
+
+    def __init__(self, backend, index_path: Path, source: str = "", limit: int = 3):
+        self.backend = backend
+        self.source = source
+        self.index_path = Path(index_path)
+        self.limit = limit
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load_or_build(self) -> CatalogIndex:
+        seq = self.backend.replication_sequence()
+        if self.index_path.exists():
+            try:
+                index = CatalogIndex.load(self.index_path)
+                if (index.meta.get("replication_sequence") == seq
+                        and index.meta.get("source") == self.source):
+                    return index
+            except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+                pass
+        index = CatalogIndex(self.backend.iter_catalog_numbers(), meta={"replication_sequence": seq, "source": self.source})
+        index.save(self.index_path)
+        return index
+
+    @property
+    def index(self) -> CatalogIndex:
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_or_build()
+            return self._index
+
+    def __call__(self, catalog: str) -> list[tuple[str, float]]:
+        return self.index.suggest(catalog, limit=self.limit)
+
+def format_suggestions(suggestions) -> str:
+    return ", ".join(f"{cat} (d={d:g})" for cat, d in suggestions)